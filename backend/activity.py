@@ -0,0 +1,69 @@
+"""Write-behind tracking of when users were last seen
+
+Authenticated requests only note the time in memory; a background thread
+writes every pending timestamp in one batched UPDATE every
+settings.activity_flush_seconds, instead of one write transaction per
+request.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import DateTime, bindparam, text
+from config import settings
+from database import engine
+
+
+class ActivityTracker:
+    """Buffer of last-seen times per user ID (at most one pending entry per user)"""
+
+    def __init__(self):
+        self._pending: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._flusher_started = False
+
+    def touch(self, user_id: int):
+        """Note that the user made a request now"""
+        with self._lock:
+            self._pending[user_id] = datetime.utcnow()
+
+    def flush(self) -> int:
+        """Write the pending timestamps; returns how many users were updated"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            with engine.begin() as conn:
+                # Never move a newer value (written by another worker) back
+                conn.execute(
+                    text(
+                        "UPDATE users SET last_seen_at = :seen_at WHERE id = :user_id "
+                        "AND (last_seen_at IS NULL OR last_seen_at < :seen_at)"
+                    ).bindparams(bindparam("seen_at", type_=DateTime)),
+                    [{"user_id": user_id, "seen_at": seen_at} for user_id, seen_at in pending.items()]
+                )
+        except Exception as e:
+            print(f"⚠ Could not write last-seen times, retrying later: {e}")
+            with self._lock:
+                for user_id, seen_at in pending.items():
+                    if user_id not in self._pending:
+                        self._pending[user_id] = seen_at
+            return 0
+        return len(pending)
+
+    def start_flusher(self):
+        """Flush periodically in a daemon thread (call once per worker)"""
+        if self._flusher_started:
+            return
+        self._flusher_started = True
+
+        def loop():
+            while True:
+                time.sleep(settings.activity_flush_seconds)
+                self.flush()
+
+        threading.Thread(target=loop, name="activity-flush", daemon=True).start()
+
+
+activity_tracker = ActivityTracker()
@@ -0,0 +1,174 @@
+"""Write-behind recording of chat analytics
+
+Chat handlers only queue the interaction; a background thread per worker
+inserts queued interactions in batches and adds their document usage and
+their hourly/daily rollups (see rollups.py) with atomic upserts (INSERT ...
+ON CONFLICT DO UPDATE SET times_used = times_used + n), so concurrent
+workers never lose increments and answers never wait on SQLite.
+"""
+import re
+import threading
+import unicodedata
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from config import settings
+from database import engine, ChatInteraction, DocumentUsageStats
+from metrics import metrics
+from rollups import add_to_rollups
+
+# Longer questions are grouped by their beginning
+NORMALIZED_QUESTION_MAX_CHARS = 500
+
+
+def normalize_question(question: str) -> str:
+    """Fold case, accents, punctuation and whitespace so rephrasings of a question group together"""
+    folded = unicodedata.normalize("NFKD", (question or "").lower())
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    folded = re.sub(r'[\W_]+', ' ', folded).strip()
+    return folded[:NORMALIZED_QUESTION_MAX_CHARS]
+
+
+def _is_lock_error(error: Exception) -> bool:
+    # Another worker holds the write lock: worth retrying the same rows later
+    return "database is locked" in str(error)
+
+
+class AnalyticsWriter:
+    """Bounded buffer of chat interactions, flushed in batches"""
+
+    def __init__(self):
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # One flush at a time (timer, batch size, shutdown)
+        self._wake = threading.Event()
+        self._flusher_started = False
+
+    def record_chat(self, interaction: Dict, document_ids: List[int]) -> bool:
+        """Queue a chat interaction (ChatInteraction column values) and the entries it used
+
+        Returns False if the buffer is full and the interaction was dropped.
+        """
+        interaction.setdefault("created_at", datetime.utcnow())
+        interaction.setdefault("normalized_question", normalize_question(interaction["question"]))
+        with self._lock:
+            if len(self._buffer) >= settings.analytics_buffer_size:
+                metrics.inc("analytics_records_dropped_total")
+                print("⚠ Analytics buffer full, dropping a chat interaction")
+                return False
+            self._buffer.append((interaction, document_ids))
+            if len(self._buffer) >= settings.analytics_batch_size:
+                self._wake.set()
+        return True
+
+    def flush(self) -> int:
+        """Write everything queued; returns the number of interactions written
+
+        A batch SQLite refused because it was locked goes back to the queue.
+        Any other failure is retried one interaction at a time, and the ones
+        that still fail are dropped, so a bad row never blocks later writes.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._buffer)
+                self._buffer.clear()
+            if not batch:
+                return 0
+            try:
+                with metrics.time("analytics_flush_duration_seconds"):
+                    self._write(batch)
+            except Exception as e:
+                if _is_lock_error(e):
+                    print(f"⚠ Could not write {len(batch)} chat interactions, retrying later: {e}")
+                    self._requeue(batch)
+                    return 0
+                print(f"⚠ Could not write {len(batch)} chat interactions, writing them one by one: {e}")
+                return self._write_each(batch)
+            return len(batch)
+
+    def _write_each(self, batch: List) -> int:
+        written = 0
+        locked = []
+        for item in batch:
+            try:
+                self._write([item])
+                written += 1
+            except Exception as e:
+                if _is_lock_error(e):
+                    locked.append(item)
+                    continue
+                metrics.inc("analytics_records_dropped_total")
+                print(f"❌ Dropping a chat interaction that cannot be written: {e}")
+        if locked:
+            self._requeue(locked)
+        return written
+
+    def _requeue(self, batch: List):
+        with self._lock:
+            # Oldest first, keeping the buffer bounded
+            room = max(0, settings.analytics_buffer_size - len(self._buffer))
+            self._buffer.extendleft(reversed(batch[-room:] if room else []))
+            if len(batch) > room:
+                metrics.inc("analytics_records_dropped_total", value=len(batch) - room)
+
+    @staticmethod
+    def _write(batch: List):
+        usage = Counter()
+        last_used = {}
+        for interaction, document_ids in batch:
+            for doc_id in document_ids:
+                usage[doc_id] += 1
+                last_used[doc_id] = max(last_used.get(doc_id, interaction["created_at"]), interaction["created_at"])
+
+        stats = DocumentUsageStats.__table__
+        upsert = sqlite_insert(stats)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[stats.c.knowledge_entry_id],
+            set_={
+                "times_used": func.coalesce(stats.c.times_used, 0) + upsert.excluded.times_used,
+                "last_used_at": func.coalesce(
+                    func.max(stats.c.last_used_at, upsert.excluded.last_used_at),
+                    upsert.excluded.last_used_at
+                )
+            }
+        )
+
+        # One transaction per batch
+        with engine.begin() as conn:
+            interactions = [interaction for interaction, _ in batch]
+            conn.execute(ChatInteraction.__table__.insert(), interactions)
+            add_to_rollups(conn, interactions)
+            if usage:
+                now = datetime.utcnow()
+                conn.execute(upsert, [
+                    {
+                        "knowledge_entry_id": doc_id,
+                        "times_used": count,
+                        "last_used_at": last_used[doc_id],
+                        "created_at": now
+                    }
+                    for doc_id, count in usage.items()
+                ])
+
+    def start_flusher(self):
+        """Flush every settings.analytics_flush_seconds, or as soon as a batch is full"""
+        if self._flusher_started:
+            return
+        self._flusher_started = True
+
+        def loop():
+            while True:
+                self._wake.wait(timeout=settings.analytics_flush_seconds)
+                self._wake.clear()
+                self.flush()
+
+        threading.Thread(target=loop, name="analytics-flush", daemon=True).start()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+
+analytics_writer = AnalyticsWriter()
@@ -0,0 +1,299 @@
+"""Answer cache for RAGService.chat, keyed by question and corpus version"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from cache import TTLCache
+from config import settings
+from vector_store import normalize_query
+
+
+class MemoryAnswerStore:
+    """Per-process answer store (each uvicorn worker has its own)"""
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self._cache = TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self._cache.get(key)
+
+    def set(self, key: str, corpus_version: int, value: Dict):
+        self._cache.set(key, value)
+
+    def clear(self):
+        self._cache.clear()
+
+    def size(self) -> int:
+        return len(self._cache)
+
+
+class SQLiteAnswerStore:
+    """On-disk answer store shared by every worker on the host"""
+
+    # Trim the table every N writes instead of on each one
+    PRUNE_EVERY = 50
+
+    def __init__(self, path: str, max_size: int, ttl_seconds: int):
+        self.max_size = max(1, max_size)
+        self.ttl_seconds = ttl_seconds or None
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answer_cache (
+                key TEXT PRIMARY KEY,
+                corpus_version INTEGER NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_hit_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answer_cache_last_hit ON answer_cache(last_hit_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM answer_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl_seconds and row[1] < now - self.ttl_seconds:
+                self._conn.execute("DELETE FROM answer_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE answer_cache SET last_hit_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key: str, corpus_version: int, value: Dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answer_cache (key, corpus_version, value, created_at, last_hit_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, corpus_version, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(corpus_version, now)
+            self._conn.commit()
+
+    def _prune(self, corpus_version: int, now: float):
+        """Drop answers of older corpus versions, expired and least recently used ones"""
+        self._conn.execute("DELETE FROM answer_cache WHERE corpus_version < ?", (corpus_version,))
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM answer_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM answer_cache WHERE key IN ("
+            "SELECT key FROM answer_cache ORDER BY last_hit_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,)
+        )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answer_cache")
+            self._conn.commit()
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM answer_cache").fetchone()[0]
+
+
+class AnswerCache:
+    """Cache of complete chat results for repeated questions
+
+    Keys combine the normalized question and search filters with the corpus
+    version, so any change to the knowledge base makes older answers
+    unreachable.
+    """
+
+    def __init__(self):
+        if settings.answer_cache_backend == "sqlite":
+            self.store = SQLiteAnswerStore(
+                settings.answer_cache_path,
+                max_size=settings.answer_cache_size,
+                ttl_seconds=settings.answer_cache_ttl_seconds
+            )
+        else:
+            self.store = MemoryAnswerStore(
+                max_size=settings.answer_cache_size,
+                ttl_seconds=settings.answer_cache_ttl_seconds
+            )
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(question: str, corpus_version: int, scope: str = "") -> str:
+        """Build the cache key of a question for a corpus version
+        
+        scope identifies the search filters the answer was produced with.
+        """
+        digest = hashlib.sha256(f"{scope}\n{normalize_query(question)}".encode("utf-8")).hexdigest()
+        return f"{corpus_version}:{digest}"
+
+    def get(self, question: str, corpus_version: int, scope: str = "") -> Optional[Dict]:
+        """Get a cached chat result (response, sources, context_count)"""
+        try:
+            value = self.store.get(self.make_key(question, corpus_version, scope))
+        except Exception as e:
+            print(f"⚠ Error reading answer cache: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(value)
+
+    def set(self, question: str, corpus_version: int, result: Dict, scope: str = ""):
+        """Store a chat result"""
+        try:
+            self.store.set(self.make_key(question, corpus_version, scope), corpus_version, result)
+        except Exception as e:
+            print(f"⚠ Error writing answer cache: {e}")
+
+    def clear(self):
+        """Drop every cached answer"""
+        self.store.clear()
+
+    def stats(self) -> Dict:
+        """Get hit/miss counters (this worker) and store size"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": settings.answer_cache_backend,
+            "size": self.store.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class SemanticAnswerCache:
+    """Near-duplicate question cache backed by a small in-memory vector index
+
+    Answers are reused when a new question's embedding is within
+    settings.semantic_cache_threshold (cosine distance) of an answered one
+    and the corpus version is the same. Each worker keeps its own index.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: int, threshold: float):
+        self.max_size = max(1, max_size)
+        self.ttl_seconds = ttl_seconds or None
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._items: List[Dict] = []
+        self._matrix = None  # Normalized embeddings, rebuilt lazily
+        self.hits = 0
+        self.misses = 0
+        self._lookup_ms_total = 0.0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding, corpus_version: int, scope: str = "") -> Optional[Dict]:
+        """Get the answer of the closest cached question, if close enough
+        
+        Only answers produced with the same search filters (scope) match.
+        """
+        started = time.perf_counter()
+        result = None
+        with self._lock:
+            if self._items:
+                if self._matrix is None:
+                    self._matrix = np.vstack([item["vector"] for item in self._items])
+                similarities = self._matrix @ self._normalize(embedding)
+                now = time.time()
+                for index in np.argsort(-similarities):
+                    distance = 1.0 - float(similarities[index])
+                    if distance > self.threshold:
+                        break
+                    item = self._items[index]
+                    if item["corpus_version"] != corpus_version or item["scope"] != scope:
+                        continue
+                    if self.ttl_seconds and item["created_at"] < now - self.ttl_seconds:
+                        continue
+                    item["last_hit_at"] = now
+                    result = dict(item["result"], matched_question=item["question"], semantic_distance=round(distance, 4))
+                    break
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._lookup_ms_total += (time.perf_counter() - started) * 1000
+        return result
+
+    def add(self, question: str, embedding, corpus_version: int, result: Dict, scope: str = ""):
+        """Remember an answered question"""
+        now = time.time()
+        with self._lock:
+            # Answers from older corpus versions can never match again
+            self._items = [
+                item for item in self._items
+                if item["corpus_version"] == corpus_version
+                and not (self.ttl_seconds and item["created_at"] < now - self.ttl_seconds)
+            ]
+            self._items.append({
+                "question": question,
+                "vector": self._normalize(embedding),
+                "corpus_version": corpus_version,
+                "scope": scope,
+                "result": result,
+                "created_at": now,
+                "last_hit_at": now
+            })
+            if len(self._items) > self.max_size:
+                self._items.sort(key=lambda item: item["last_hit_at"])
+                self._items = self._items[-self.max_size:]
+            self._matrix = None
+
+    def clear(self):
+        """Drop every cached answer"""
+        with self._lock:
+            self._items = []
+            self._matrix = None
+
+    def stats(self) -> Dict:
+        """Get hit rate and lookup latency (this worker)"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "avg_lookup_ms": round(self._lookup_ms_total / lookups, 3) if lookups else 0.0
+            }
+
+
+# Global answer cache instance (lazy initialization)
+_answer_cache_instance = None
+
+def get_answer_cache() -> AnswerCache:
+    """Get answer cache instance (lazy initialization)"""
+    global _answer_cache_instance
+    if _answer_cache_instance is None:
+        _answer_cache_instance = AnswerCache()
+    return _answer_cache_instance
+
+
+_semantic_cache_instance = None
+
+def get_semantic_cache() -> SemanticAnswerCache:
+    """Get semantic answer cache instance (lazy initialization)"""
+    global _semantic_cache_instance
+    if _semantic_cache_instance is None:
+        _semantic_cache_instance = SemanticAnswerCache(
+            max_size=settings.semantic_cache_size,
+            ttl_seconds=settings.answer_cache_ttl_seconds,
+            threshold=settings.semantic_cache_threshold
+        )
+    return _semantic_cache_instance
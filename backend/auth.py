@@ -7,6 +7,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from database import get_db, User
+from activity import activity_tracker
 from config import settings
 
 security = HTTPBearer()
@@ -80,9 +81,8 @@ def get_current_user(
     if user is None:
         raise credentials_exception
     
-    # Update last login
-    user.last_login = datetime.utcnow()
-    db.commit()
+    # Last-seen time is written behind in batches (login time only on /api/auth/login)
+    activity_tracker.touch(user.id)
     
     return user
 
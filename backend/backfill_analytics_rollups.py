@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Script para (re)construir los resúmenes horarios y diarios de analytics
+
+Recalcula las tablas de resumen a partir de chat_interactions. Hay que
+ejecutarlo una vez tras actualizar (para incluir el historial anterior);
+después el backend las mantiene al registrar cada interacción. No hace
+falta detener el backend.
+"""
+
+import sys
+import os
+import argparse
+import time
+from datetime import datetime
+
+# Añadir el directorio actual al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import init_db
+from rollups import rebuild
+
+
+def reconstruir(since=None, batch_size: int = 5000) -> bool:
+    init_db()
+
+    if since:
+        print(f"Reconstruyendo resúmenes desde el {since:%Y-%m-%d}...")
+    else:
+        print("Reconstruyendo todos los resúmenes...")
+
+    started = time.perf_counter()
+    try:
+        processed = rebuild(since=since, batch_size=batch_size)
+    except Exception as e:
+        print(f"❌ Error durante la reconstrucción: {e}")
+        return False
+
+    print(f"✓ {processed} interacciones resumidas en {time.perf_counter() - started:.1f}s")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruir los resúmenes de analytics desde chat_interactions")
+    parser.add_argument("--since", type=lambda value: datetime.strptime(value, "%Y-%m-%d"), default=None,
+                        help="Reconstruir solo desde este día (AAAA-MM-DD, UTC)")
+    parser.add_argument("--batch-size", type=int, default=5000,
+                        help="Interacciones leídas por lote")
+    args = parser.parse_args()
+
+    sys.exit(0 if reconstruir(since=args.since, batch_size=args.batch_size) else 1)
@@ -0,0 +1,119 @@
+"""Local stand-in for the Gemini API, for offline load tests
+
+Replaces google.generativeai.GenerativeModel with a model that waits a
+configurable latency, then produces a fixed-length answer at a configurable
+token rate. Configured through environment variables so every uvicorn
+worker picks it up:
+
+- GEMINI_STUB_LATENCY_MS: time to first token (default 800)
+- GEMINI_STUB_TOKENS_PER_SECOND: generation speed after that (default 60)
+- GEMINI_STUB_OUTPUT_TOKENS: answer length (default 200)
+"""
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Streamed chunks carry about this many tokens each
+TOKENS_PER_CHUNK = 8
+
+ANSWER_WORDS = (
+    "Según la base de conocimiento el procedimiento consiste en revisar la configuración "
+    "de la cuenta y seguir los pasos indicados en el artículo correspondiente"
+).split()
+
+
+class StubConfig:
+    def __init__(self, latency_ms=None, tokens_per_second=None, output_tokens=None):
+        self.latency_ms = float(os.getenv("GEMINI_STUB_LATENCY_MS", 800) if latency_ms is None else latency_ms)
+        self.tokens_per_second = float(
+            os.getenv("GEMINI_STUB_TOKENS_PER_SECOND", 60) if tokens_per_second is None else tokens_per_second
+        )
+        self.output_tokens = int(os.getenv("GEMINI_STUB_OUTPUT_TOKENS", 200) if output_tokens is None else output_tokens)
+
+
+class StubResponse:
+    """Mimics the parts of GenerateContentResponse the backend reads"""
+
+    def __init__(self, text: str, prompt: str):
+        self.text = text
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=max(1, len(prompt) // 4),
+            candidates_token_count=len(text.split())
+        )
+
+
+class StubStream:
+    """Async iterator of StubResponse chunks, paced at the configured token rate"""
+
+    def __init__(self, model: "StubGenerativeModel", prompt: str, max_tokens: int):
+        self._model = model
+        self._prompt = prompt
+        self._remaining = max_tokens
+        self._first = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._remaining <= 0:
+            raise StopAsyncIteration
+        count = min(TOKENS_PER_CHUNK, self._remaining)
+        self._remaining -= count
+        if not self._first:
+            await asyncio.sleep(count / self._model.config.tokens_per_second)
+        self._first = False
+        return StubResponse(self._model.words(count) + " ", self._prompt)
+
+
+class StubGenerativeModel:
+    """Drop-in for genai.GenerativeModel (generate_content and generate_content_async)"""
+
+    def __init__(self, model_name: str = "gemini-stub", config: StubConfig = None, **kwargs):
+        self.model_name = model_name
+        self.config = config or StubConfig()
+
+    def words(self, count: int) -> str:
+        return " ".join(ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(count))
+
+    def _max_tokens(self, generation_config) -> int:
+        limit = None
+        if isinstance(generation_config, dict):
+            limit = generation_config.get("max_output_tokens")
+        elif generation_config is not None:
+            limit = getattr(generation_config, "max_output_tokens", None)
+        return min(self.config.output_tokens, limit) if limit else self.config.output_tokens
+
+    def _generation_seconds(self, tokens: int) -> float:
+        return self.config.latency_ms / 1000 + tokens / self.config.tokens_per_second
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        tokens = self._max_tokens(generation_config)
+        time.sleep(self._generation_seconds(tokens))
+        return StubResponse(self.words(tokens), str(prompt))
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False, **kwargs):
+        tokens = self._max_tokens(generation_config)
+        if stream:
+            await asyncio.sleep(self.config.latency_ms / 1000)
+            return StubStream(self, str(prompt), tokens)
+        await asyncio.sleep(self._generation_seconds(tokens))
+        return StubResponse(self.words(tokens), str(prompt))
+
+
+def install():
+    """Route every GenerativeModel created from now on to the stub"""
+    import google.generativeai as genai
+    genai.configure = lambda *args, **kwargs: None
+    genai.GenerativeModel = StubGenerativeModel
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+
+
+def create_app():
+    """uvicorn factory: the backend app with Gemini stubbed out"""
+    install()
+    from main import app
+    return app
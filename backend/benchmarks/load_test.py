@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""Prueba de carga de extremo a extremo de /api/chat, sin red
+
+Crea en un directorio temporal una base de conocimiento sintética, arranca
+el backend real (uvicorn, FastAPI, SQLite, ChromaDB, caché) con Gemini
+sustituido por un modelo local de latencia y velocidad configurables
+(benchmarks/gemini_stub.py) y lanza peticiones a concurrencia creciente.
+
+Para cada nivel muestra peticiones por segundo, latencias p50/p95/p99,
+tiempo hasta el primer token (--stream), rechazos 503 y la mediana de cada
+etapa (cola, caché, embedding, búsqueda, prompt, generación, registro)
+según el campo "timing" de la respuesta.
+
+Uso:
+    python benchmarks/load_test.py --docs 2000 --concurrency 1,4,8,16,32
+    python benchmarks/load_test.py --stream --json resultados.json --max-p95-ms 4000
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import json
+import math
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+BENCHMARK_USER = "loadtest"
+
+TOPICS = [
+    "factura", "contraseña", "suscripción", "pedido", "envío", "devolución", "tarjeta",
+    "usuario", "informe", "integración", "calendario", "notificación", "exportación",
+    "importación", "permiso", "equipo", "plantilla", "etiqueta", "almacén", "tarifa"
+]
+ACTIONS = [
+    "crear", "editar", "eliminar", "configurar", "descargar", "compartir", "restaurar",
+    "validar", "programar", "cancelar", "duplicar", "sincronizar"
+]
+CONTEXTS = [
+    "desde la aplicación móvil", "en el panel de administración", "con la API",
+    "para varios clientes", "en una cuenta de prueba", "desde el navegador"
+]
+
+
+def build_corpus(docs: int, seed: int = 42):
+    """Artículos sintéticos con títulos, encabezados y pasos, y una pregunta por artículo"""
+    rng = random.Random(seed)
+    items = []
+    questions = []
+    for index in range(docs):
+        topic = TOPICS[index % len(TOPICS)]
+        action = ACTIONS[(index // len(TOPICS)) % len(ACTIONS)]
+        context = CONTEXTS[(index // (len(TOPICS) * len(ACTIONS))) % len(CONTEXTS)]
+        code = f"{topic[:3].upper()}-{index:05d}"
+        title = f"Cómo {action} {topic} {context} ({code})"
+        steps = "\n".join(
+            f"{step}. {rng.choice(['Abre', 'Selecciona', 'Revisa', 'Confirma', 'Pulsa'])} "
+            f"{rng.choice(['el menú', 'la sección', 'el botón', 'la opción'])} de {topic} "
+            f"y {rng.choice(['guarda los cambios', 'comprueba el resultado', 'espera la confirmación'])}."
+            for step in range(1, rng.randint(4, 9))
+        )
+        troubleshooting = (
+            f"Si no puedes {action} {topic}, revisa los permisos del equipo y vuelve a intentarlo "
+            f"pasados unos minutos. "
+        ) * rng.randint(1, 3)
+        content = (
+            f"{title}\n\n"
+            f"Este artículo explica cómo {action} {topic} {context}. "
+            f"La referencia interna de este procedimiento es {code}.\n\n"
+            f"Requisitos\n"
+            f"Necesitas permisos de {rng.choice(['administrador', 'supervisor', 'editor'])} "
+            f"y una cuenta con {topic} activo.\n\n"
+            f"Pasos\n{steps}\n\n"
+            f"Problemas frecuentes\n{troubleshooting.strip()}"
+        )
+        items.append({
+            "title": title,
+            "content": content,
+            "url": f"https://ayuda.example.com/articulos/{index}",
+            "source_id": f"loadtest-{index}",
+            "metadata": {"locale": "es", "section_id": topic}
+        })
+        questions.append(f"¿Cómo puedo {action} {topic} {context}?")
+    return items, questions
+
+
+def seed(docs: int) -> dict:
+    """Cargar el corpus y el usuario de prueba en la base de datos del directorio actual"""
+    sys.path.insert(0, BACKEND_DIR)
+    import sqlite_patch  # noqa: F401  Patch SQLite antes de chromadb
+
+    from database import SessionLocal, User, init_db
+    from auth import get_password_hash, create_access_token
+    from services.knowledge_service import KnowledgeService
+
+    init_db()
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == BENCHMARK_USER).first()
+        if user is None:
+            user = User(
+                username=BENCHMARK_USER,
+                email=f"{BENCHMARK_USER}@example.com",
+                hashed_password=get_password_hash(BENCHMARK_USER),
+                role="user"
+            )
+            db.add(user)
+            db.commit()
+            db.refresh(user)
+
+        items, questions = build_corpus(docs)
+        started = time.perf_counter()
+        result = KnowledgeService(db).bulk_upsert_entries(items, source="loadtest", created_by=user.id)
+        return {
+            "token": create_access_token({"sub": BENCHMARK_USER}),
+            "questions": questions,
+            "seed_seconds": round(time.perf_counter() - started, 1),
+            "added": result.get("added", 0)
+        }
+    finally:
+        db.close()
+
+
+def percentile(values, fraction: float):
+    """Percentil por rango más cercano (None sin valores)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def chat_request(session, url: str, token: str, question: str, stream: bool) -> dict:
+    """Una petición: latencia, estado, primer token y tiempos por etapa del servidor"""
+    headers = {"Authorization": f"Bearer {token}"}
+    started = time.perf_counter()
+    sample = {"status": None, "latency_ms": None, "first_token_ms": None, "timing": {}, "context_count": None}
+    try:
+        async with session.post(url, json={"message": question}, headers=headers) as response:
+            sample["status"] = response.status
+            if not stream:
+                body = await response.json(content_type=None)
+                if response.status == 200:
+                    sample["timing"] = body.get("timing") or {}
+                    sample["context_count"] = body.get("context_count")
+            else:
+                event = None
+                async for raw_line in response.content:
+                    line = raw_line.decode("utf-8").rstrip("\n")
+                    if line.startswith("event: "):
+                        event = line[len("event: "):]
+                    elif line.startswith("data: "):
+                        if event == "token" and sample["first_token_ms"] is None:
+                            sample["first_token_ms"] = (time.perf_counter() - started) * 1000
+                        elif event == "done":
+                            data = json.loads(line[len("data: "):])
+                            sample["timing"] = data.get("timing") or {}
+                            sample["context_count"] = data.get("context_count")
+                        elif event == "error":
+                            data = json.loads(line[len("data: "):])
+                            sample["status"] = 503 if data.get("busy") else 500
+    except Exception as e:
+        sample["error"] = str(e)
+    sample["latency_ms"] = (time.perf_counter() - started) * 1000
+    return sample
+
+
+async def run_level(base_url: str, token: str, questions, concurrency: int, requests: int, stream: bool) -> dict:
+    """Lanzar `requests` peticiones con `concurrency` clientes simultáneos"""
+    import aiohttp
+
+    url = f"{base_url}/api/chat/stream" if stream else f"{base_url}/api/chat"
+    pending = list(range(requests))
+    samples = []
+
+    async def client(session):
+        while pending:
+            index = pending.pop()
+            samples.append(await chat_request(session, url, token, questions[index % len(questions)], stream))
+
+    timeout = aiohttp.ClientTimeout(total=600)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ok = [sample for sample in samples if sample["status"] == 200]
+    latencies = [sample["latency_ms"] for sample in ok]
+    first_tokens = [sample["first_token_ms"] for sample in ok if sample["first_token_ms"] is not None]
+
+    def stage(name):
+        values = [sample["timing"][name] for sample in ok if sample["timing"].get(name) is not None]
+        return percentile(values, 0.5)
+
+    def rounded(value):
+        return None if value is None else round(value, 1)
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "ok": len(ok),
+        "busy": sum(1 for sample in samples if sample["status"] == 503),
+        "errors": sum(1 for sample in samples if sample["status"] not in (200, 503)),
+        "no_context": sum(1 for sample in ok if sample["context_count"] == 0),
+        "rps": round(len(ok) / elapsed, 2) if elapsed > 0 else None,
+        "p50_ms": rounded(percentile(latencies, 0.50)),
+        "p95_ms": rounded(percentile(latencies, 0.95)),
+        "p99_ms": rounded(percentile(latencies, 0.99)),
+        "first_token_p50_ms": rounded(percentile(first_tokens, 0.50)),
+        "stages_p50_ms": {
+            name: stage(name)
+            for name in (
+                "queue_ms", "cache_ms", "embedding_ms", "search_ms", "prompt_ms",
+                "generation_ms", "record_ms", "first_token_ms", "total_ms"
+            )
+            if stage(name) is not None
+        }
+    }
+
+
+def start_server(workdir: str, env: dict, port: int, workers: int) -> subprocess.Popen:
+    """Arrancar el backend con Gemini sustituido (gemini_stub.create_app)"""
+    command = [
+        sys.executable, "-m", "uvicorn", "gemini_stub:create_app", "--factory",
+        "--app-dir", BENCHMARKS_DIR,
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers),
+        "--log-level", "warning"
+    ]
+    return subprocess.Popen(command, cwd=workdir, env=env)
+
+
+async def wait_for_server(base_url: str, process: subprocess.Popen, timeout: float = 120):
+    import aiohttp
+
+    deadline = time.time() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.time() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"El servidor terminó con código {process.returncode}")
+            try:
+                async with session.get(f"{base_url}/api/health") as response:
+                    if response.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError("El servidor no respondió a tiempo")
+
+
+def mostrar_resultados(results):
+    print(f"\n{'conc':>5} {'ok':>6} {'503':>5} {'err':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'1er tok':>8}  etapas p50 (ms)")
+    for level in results:
+        stages = ", ".join(f"{name[:-3]}={value}" for name, value in level["stages_p50_ms"].items())
+        print(
+            f"{level['concurrency']:>5} {level['ok']:>6} {level['busy']:>5} {level['errors']:>5} "
+            f"{level['rps'] or 0:>8} {level['p50_ms'] or '-':>8} {level['p95_ms'] or '-':>8} "
+            f"{level['p99_ms'] or '-':>8} {level['first_token_p50_ms'] or '-':>8}  {stages}"
+        )
+        if level["no_context"]:
+            print(f"      ⚠️  {level['no_context']} respuestas sin contexto (no llamaron al modelo)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga de /api/chat con Gemini simulado")
+    parser.add_argument("--docs", type=int, default=500, help="Artículos del corpus sintético")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32",
+                        help="Niveles de concurrencia separados por comas")
+    parser.add_argument("--requests", type=int, default=100, help="Peticiones por nivel")
+    parser.add_argument("--stream", action="store_true", help="Usar /api/chat/stream (mide el primer token)")
+    parser.add_argument("--latency-ms", type=float, default=800, help="Latencia del modelo hasta el primer token")
+    parser.add_argument("--tokens-per-second", type=float, default=60, help="Velocidad de generación del modelo")
+    parser.add_argument("--output-tokens", type=int, default=200, help="Longitud de cada respuesta")
+    parser.add_argument("--workers", type=int, default=1, help="Workers de uvicorn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="Mantener activa la caché de respuestas (por defecto se desactiva para medir el peor caso)")
+    parser.add_argument("--relevance-gate", action="store_true",
+                        help="Mantener activo el filtro de relevancia (los embeddings sintéticos lo disparan a menudo)")
+    parser.add_argument("--json", dest="json_path", help="Guardar los resultados en este fichero JSON")
+    parser.add_argument("--max-p95-ms", type=float, default=None,
+                        help="Terminar con código 1 si algún nivel supera este p95 (regresión)")
+    parser.add_argument("--keep", action="store_true", help="No borrar el directorio temporal")
+    args = parser.parse_args()
+
+    levels = [int(value) for value in args.concurrency.split(",") if value.strip()]
+
+    workdir = tempfile.mkdtemp(prefix="knowledge-bot-loadtest-")
+    env = dict(
+        os.environ,
+        GEMINI_API_KEY="stub",
+        JWT_SECRET="loadtest-secret",
+        EMBEDDING_PROVIDER="hashing",
+        EMBEDDING_MODEL="384",
+        ZENDESK_AUTO_SYNC="false",
+        ZENDESK_SUBDOMAIN="",
+        ANSWER_CACHE_ENABLED="true" if args.answer_cache else "false",
+        SEMANTIC_CACHE_ENABLED="true" if args.answer_cache else "false",
+        RELEVANCE_GATE_ENABLED="true" if args.relevance_gate else "false",
+        GEMINI_STUB_LATENCY_MS=str(args.latency_ms),
+        GEMINI_STUB_TOKENS_PER_SECOND=str(args.tokens_per_second),
+        GEMINI_STUB_OUTPUT_TOKENS=str(args.output_tokens)
+    )
+
+    server = None
+    try:
+        print(f"Creando corpus sintético de {args.docs} artículos en {workdir}...")
+        seeded = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--seed-only", "--docs", str(args.docs)],
+            cwd=workdir, env=env, check=True, capture_output=True, text=True
+        )
+        seed_result = json.loads(seeded.stdout.strip().splitlines()[-1])
+        print(f"✓ {seed_result['added']} artículos indexados en {seed_result['seed_seconds']}s")
+
+        base_url = f"http://127.0.0.1:{args.port}"
+        server = start_server(workdir, env, args.port, args.workers)
+        asyncio.run(wait_for_server(base_url, server))
+        print(f"✓ Backend en {base_url} ({args.workers} workers), modelo simulado: "
+              f"{args.latency_ms:.0f} ms + {args.output_tokens} tokens a {args.tokens_per_second:.0f} tokens/s")
+
+        results = []
+        for concurrency in levels:
+            print(f"  Concurrencia {concurrency}...")
+            results.append(asyncio.run(run_level(
+                base_url, seed_result["token"], seed_result["questions"],
+                concurrency, args.requests, args.stream
+            )))
+
+        mostrar_resultados(results)
+
+        if args.json_path:
+            with open(args.json_path, "w") as f:
+                json.dump({"config": vars(args), "results": results}, f, indent=2, ensure_ascii=False)
+            print(f"\nResultados guardados en {args.json_path}")
+
+        if args.max_p95_ms is not None:
+            slow = [level for level in results if level["p95_ms"] is None or level["p95_ms"] > args.max_p95_ms]
+            if slow:
+                print(f"\n❌ p95 por encima de {args.max_p95_ms:.0f} ms en concurrencia "
+                      f"{', '.join(str(level['concurrency']) for level in slow)}")
+                return 1
+        return 0
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Error creando el corpus:\n{e.stderr}")
+        return 1
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if args.keep:
+            print(f"Directorio conservado: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if "--seed-only" in sys.argv:
+        seed_parser = argparse.ArgumentParser()
+        seed_parser.add_argument("--seed-only", action="store_true")
+        seed_parser.add_argument("--docs", type=int, default=500)
+        seed_args = seed_parser.parse_args()
+        print(json.dumps(seed(seed_args.docs), ensure_ascii=False))
+        sys.exit(0)
+    sys.exit(main())
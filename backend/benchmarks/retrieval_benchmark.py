@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""Micro-benchmark de la búsqueda vectorial de ChromaDB y ajuste de HNSW
+
+Para cada tamaño de corpus y cada combinación de parámetros HNSW (M,
+construction_ef, search_ef) construye una colección con vectores
+sintéticos agrupados (como los embeddings de artículos parecidos), mide la
+latencia de las consultas, el recall@k frente a la búsqueda exacta (fuerza
+bruta con numpy), la velocidad de indexación y la memoria, y recomienda la
+combinación más rápida que alcanza el recall objetivo.
+
+Las colecciones se crean con los mismos metadatos que VectorStore
+(vector_store.hnsw_metadata), en un directorio temporal.
+
+Uso:
+    python benchmarks/retrieval_benchmark.py
+    python benchmarks/retrieval_benchmark.py --sizes 1000,10000 --m 8,16,32 --search-ef 10,40,100
+"""
+
+import sys
+import os
+import argparse
+import json
+import math
+import shutil
+import tempfile
+import time
+from itertools import product
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Patch SQLite antes de importar chromadb
+import sqlite_patch  # noqa: F401
+
+import chromadb
+import numpy as np
+from chromadb.config import Settings as ChromaSettings
+from vector_store import hnsw_metadata
+from metrics import rss_bytes
+
+# Vectores por llamada a collection.add
+ADD_BATCH_SIZE = 5000
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Vectores unitarios agrupados alrededor de `clusters` centros"""
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignment = rng.integers(0, clusters, size=count)
+    vectors = centers[assignment] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def synthetic_queries(corpus: np.ndarray, count: int, rng: np.random.Generator) -> np.ndarray:
+    """Consultas cercanas (pero no iguales) a documentos del corpus"""
+    picks = corpus[rng.integers(0, len(corpus), size=count)]
+    queries = picks + 0.5 * rng.standard_normal(picks.shape).astype(np.float32) / math.sqrt(corpus.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def exact_neighbors(corpus: np.ndarray, queries: np.ndarray, k: int) -> list:
+    """Top-k exacto por similitud coseno (vectores ya normalizados)"""
+    neighbors = []
+    for start in range(0, len(queries), 256):
+        scores = queries[start:start + 256] @ corpus.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        neighbors.extend(set(row) for row in top)
+    return neighbors
+
+
+def directory_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def percentile(values, fraction: float):
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def run_config(corpus, queries, truth, k, m, construction_ef, search_ef, workdir) -> dict:
+    """Construir una colección con estos parámetros y medirla"""
+    path = tempfile.mkdtemp(dir=workdir)
+    client = chromadb.PersistentClient(path=path, settings=ChromaSettings(anonymized_telemetry=False))
+    rss_before = rss_bytes()
+    try:
+        collection = client.create_collection(
+            name="benchmark",
+            metadata=hnsw_metadata(m, construction_ef, search_ef),
+            embedding_function=None
+        )
+        ids = [str(index) for index in range(len(corpus))]
+        batch_size = min(ADD_BATCH_SIZE, getattr(client, "max_batch_size", ADD_BATCH_SIZE) or ADD_BATCH_SIZE)
+
+        started = time.perf_counter()
+        for start in range(0, len(corpus), batch_size):
+            collection.add(
+                ids=ids[start:start + batch_size],
+                embeddings=corpus[start:start + batch_size].tolist()
+            )
+        build_seconds = time.perf_counter() - started
+
+        collection.query(query_embeddings=[queries[0].tolist()], n_results=k)  # Carga el índice
+        latencies = []
+        hits = 0
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len(expected.intersection(int(found) for found in result["ids"][0]))
+
+        return {
+            "size": len(corpus),
+            "m": m,
+            "construction_ef": construction_ef,
+            "search_ef": search_ef,
+            "recall": round(hits / (k * len(queries)), 4),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "index_vectors_per_second": round(len(corpus) / build_seconds) if build_seconds > 0 else None,
+            "disk_mb": round(directory_bytes(path) / 1024 / 1024, 1),
+            "rss_growth_mb": round(max(0, rss_bytes() - rss_before) / 1024 / 1024, 1)
+        }
+    finally:
+        try:
+            client.delete_collection("benchmark")
+        except Exception:
+            pass
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def recommend(results, target_recall: float) -> dict:
+    """Por tamaño: la combinación con menor p95 que alcanza el recall objetivo"""
+    recommendations = {}
+    for size in sorted({result["size"] for result in results}):
+        candidates = [result for result in results if result["size"] == size]
+        good = [result for result in candidates if result["recall"] >= target_recall]
+        best = min(good, key=lambda result: (result["p95_ms"], result["disk_mb"])) if good \
+            else max(candidates, key=lambda result: result["recall"])
+        recommendations[size] = dict(best, meets_target=bool(good))
+    return recommendations
+
+
+def parse_ints(value: str):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de la búsqueda vectorial y ajuste de HNSW")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Vectores por colección")
+    parser.add_argument("--dim", type=int, default=384, help="Dimensión (384 = all-MiniLM-L6-v2)")
+    parser.add_argument("--queries", type=int, default=200, help="Consultas por combinación")
+    parser.add_argument("--k", type=int, default=20,
+                        help="Vecinos por consulta (VectorStore pide n_results × search_chunk_oversample)")
+    parser.add_argument("--m", default="16,32", help="Valores de hnsw:M")
+    parser.add_argument("--construction-ef", default="100,200", help="Valores de hnsw:construction_ef")
+    parser.add_argument("--search-ef", default="10,50,100", help="Valores de hnsw:search_ef")
+    parser.add_argument("--target-recall", type=float, default=0.95, help="Recall@k mínimo aceptable")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", dest="json_path", help="Guardar los resultados en este fichero JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    grid = list(product(parse_ints(args.m), parse_ints(args.construction_ef), parse_ints(args.search_ef)))
+    workdir = tempfile.mkdtemp(prefix="knowledge-bot-hnsw-")
+
+    results = []
+    try:
+        for size in parse_ints(args.sizes):
+            corpus = synthetic_vectors(size, args.dim, clusters=max(10, size // 100), rng=rng)
+            queries = synthetic_queries(corpus, args.queries, rng)
+            k = min(args.k, size)
+            started = time.perf_counter()
+            truth = exact_neighbors(corpus, queries, k)
+            exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+            print(f"\n{size} vectores de {args.dim} dimensiones (búsqueda exacta: {exact_ms:.2f} ms/consulta)")
+            print(f"{'M':>4} {'c_ef':>5} {'s_ef':>5} {'recall':>7} {'p50':>8} {'p95':>8} {'p99':>8} "
+                  f"{'vec/s':>8} {'disco':>8} {'RSS':>8}")
+
+            for m, construction_ef, search_ef in grid:
+                result = run_config(corpus, queries, truth, k, m, construction_ef, search_ef, workdir)
+                result["exact_ms"] = round(exact_ms, 2)
+                results.append(result)
+                print(
+                    f"{m:>4} {construction_ef:>5} {search_ef:>5} {result['recall']:>7.3f} "
+                    f"{result['p50_ms']:>8} {result['p95_ms']:>8} {result['p99_ms']:>8} "
+                    f"{result['index_vectors_per_second'] or '-':>8} {result['disk_mb']:>7}M "
+                    f"{result['rss_growth_mb']:>7}M"
+                )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    recommendations = recommend(results, args.target_recall)
+    print(f"\nRecomendación (recall@k ≥ {args.target_recall}, menor p95):")
+    for size, best in recommendations.items():
+        warning = "" if best["meets_target"] else "  ⚠️  ninguna combinación alcanza el objetivo"
+        print(f"  {size:>7} vectores: HNSW_M={best['m']} HNSW_CONSTRUCTION_EF={best['construction_ef']} "
+              f"HNSW_SEARCH_EF={best['search_ef']} (recall {best['recall']}, p95 {best['p95_ms']} ms){warning}")
+    print("  Los cambios se aplican al reconstruir el índice: python reindex.py --reset")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({
+                "config": vars(args),
+                "results": results,
+                "recommendations": {str(size): best for size, best in recommendations.items()}
+            }, f, indent=2)
+        print(f"\nResultados guardados en {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
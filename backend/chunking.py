@@ -0,0 +1,223 @@
+"""Heading/paragraph-aware text chunking for the vector store"""
+import re
+from typing import List, Dict, Optional, Tuple
+from config import settings
+
+# Markdown headings ("## Envíos") or short standalone lines without closing
+# punctuation ("Plazos de entrega", "Devoluciones:") are treated as headings
+MARKDOWN_HEADING = re.compile(r'^#{1,6}\s+\S')
+SENTENCE_END = re.compile(r'(?<=[.!?…])\s+')
+MAX_HEADING_LENGTH = 80
+
+
+def is_heading(line: str) -> bool:
+    """Guess whether a line of plain text is a section heading"""
+    stripped = line.strip()
+    if not stripped:
+        return False
+    if MARKDOWN_HEADING.match(stripped):
+        return True
+    if len(stripped) > MAX_HEADING_LENGTH:
+        return False
+    if stripped[-1] in ".,;!?)»\"'":
+        return False
+    if stripped[0] in "-*•·" or re.match(r'^\d+[.)]\s', stripped):
+        return False  # List items, not headings
+    return stripped[0].isupper() or stripped.endswith(":")
+
+
+def _split_long_span(text: str, start: int, end: int, max_size: int) -> List[Tuple[int, int]]:
+    """Split a span longer than max_size at sentence boundaries, then hard-cut"""
+    spans = []
+    piece_start = start
+    boundaries = [start + m.end() for m in SENTENCE_END.finditer(text[start:end])] + [end]
+    last_boundary = start
+
+    for boundary in boundaries:
+        if boundary - piece_start > max_size and last_boundary > piece_start:
+            spans.append((piece_start, last_boundary))
+            piece_start = last_boundary
+        last_boundary = boundary
+
+    # Whatever is left may still be a single huge "sentence"
+    while end - piece_start > max_size:
+        cut = text.rfind(" ", piece_start, piece_start + max_size)
+        if cut <= piece_start:
+            cut = piece_start + max_size
+        spans.append((piece_start, cut))
+        piece_start = cut
+    if piece_start < end:
+        spans.append((piece_start, end))
+
+    return spans
+
+
+def _tail_start(text: str, start: int, end: int, max_size: int) -> Optional[int]:
+    """Start of the longest tail of text[start:end] of at most max_size characters
+
+    The tail begins at a sentence boundary if there is one in range, else at
+    a word boundary; None if no such tail exists.
+    """
+    if max_size <= 0:
+        return None
+    window_start = max(start, end - max_size)
+    if window_start == start:
+        return start
+    window = text[window_start:end]
+    sentence = SENTENCE_END.search(window)
+    if sentence and sentence.end() < len(window):
+        return window_start + sentence.end()
+    space = re.search(r'\s+', window)
+    if space and space.end() < len(window):
+        return window_start + space.end()
+    return None
+
+
+def _split_blocks(text: str, max_size: int, piece_size: Optional[int] = None) -> List[Dict]:
+    """Split text into atomic blocks (headings, paragraphs or lines) with offsets
+
+    Lines longer than max_size are cut into pieces of at most piece_size
+    (default max_size), leaving room for the overlap carried into the
+    next chunk.
+    """
+    blocks = []
+
+    # Paragraphs are separated by blank lines; fall back to lines when too long
+    for paragraph in re.finditer(r'\S(?:.*?\S)?(?=\n\s*\n|\s*$)', text, re.S):
+        p_start, p_end = paragraph.start(), paragraph.end()
+        if p_end - p_start <= max_size and not is_heading(text[p_start:p_end].split("\n", 1)[0]):
+            blocks.append({"start": p_start, "end": p_end, "heading": False})
+            continue
+
+        for line in re.finditer(r'[^\n]+', text[p_start:p_end]):
+            l_start = p_start + line.start()
+            l_end = p_start + line.end()
+            # Trim surrounding whitespace so offsets point at real text
+            while l_start < l_end and text[l_start].isspace():
+                l_start += 1
+            while l_end > l_start and text[l_end - 1].isspace():
+                l_end -= 1
+            if l_start == l_end:
+                continue
+
+            if is_heading(text[l_start:l_end]):
+                blocks.append({"start": l_start, "end": l_end, "heading": True})
+            elif l_end - l_start <= max_size:
+                blocks.append({"start": l_start, "end": l_end, "heading": False})
+            else:
+                for s, e in _split_long_span(text, l_start, l_end, piece_size or max_size):
+                    blocks.append({"start": s, "end": e, "heading": False})
+
+    return blocks
+
+
+def chunk_text(
+    text: str,
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None
+) -> List[Dict]:
+    """Split text into overlapping chunks that respect headings and paragraphs
+
+    Args:
+        text: Full text of the knowledge entry
+        chunk_size: Maximum chunk length in characters (defaults to settings)
+        chunk_overlap: Characters of trailing context repeated at the start
+            of the next chunk within the same section (defaults to settings)
+
+    Returns:
+        List of dicts with "text", "start", "end", "index" and "heading";
+        "text" is always text[start:end]
+    """
+    chunk_size = chunk_size or settings.chunk_size
+    chunk_overlap = settings.chunk_overlap if chunk_overlap is None else chunk_overlap
+    chunk_overlap = max(0, min(chunk_overlap, chunk_size // 2))
+
+    if not text or not text.strip():
+        return []
+
+    blocks = _split_blocks(text, chunk_size, chunk_size - chunk_overlap)
+    if not blocks:
+        return []
+
+    chunks = []
+    current: List[Dict] = []
+    heading = ""
+
+    def flush():
+        if not current:
+            return
+        start, end = current[0]["start"], current[-1]["end"]
+        chunks.append({
+            "text": text[start:end],
+            "start": start,
+            "end": end,
+            "index": len(chunks),
+            "heading": heading
+        })
+
+    for block in blocks:
+        if block["heading"]:
+            # A new section starts a new chunk; runs of headings stay together
+            if any(not previous["heading"] for previous in current):
+                flush()
+                current = []
+            current.append(block)
+            heading = text[block["start"]:block["end"]].lstrip("# ").rstrip(":").strip()
+            continue
+
+        # Headings stick to the first block of their section even if that
+        # makes the chunk slightly longer than chunk_size
+        has_body = any(not previous["heading"] for previous in current)
+        if has_body and block["end"] - current[0]["start"] > chunk_size:
+            flush()
+            # Carry trailing blocks over as overlap, keeping the section heading
+            carried = []
+            carried_size = 0
+            for previous in reversed(current):
+                if previous["heading"]:
+                    break
+                size = previous["end"] - previous["start"]
+                if carried_size + size > chunk_overlap:
+                    # Too long to carry whole (e.g. a piece of a long
+                    # paragraph): carry its last sentences or words instead
+                    tail_start = _tail_start(text, previous["start"], previous["end"], chunk_overlap - carried_size)
+                    if tail_start is not None:
+                        carried.insert(0, {"start": tail_start, "end": previous["end"], "heading": False})
+                    break
+                carried.insert(0, previous)
+                carried_size += size
+            if carried and block["end"] - carried[0]["start"] > chunk_size:
+                carried = []
+            current = carried
+
+        current.append(block)
+
+    flush()
+    return chunks
+
+
+def merge_chunk_texts(chunks: List[Dict]) -> str:
+    """Rebuild readable text from chunks of one entry, removing overlaps
+
+    Chunks must carry "text", "start" and "end"; they are ordered by offset
+    and overlapping regions are only emitted once.
+    """
+    merged = ""
+    last_end = None
+    last_index = None
+
+    for chunk in sorted(chunks, key=lambda c: c["start"]):
+        if last_end is None:
+            merged = chunk["text"]
+        elif chunk["start"] >= last_end:
+            # Consecutive chunks only have whitespace between them
+            adjacent = last_index is not None and chunk.get("index") == last_index + 1
+            merged += ("\n\n" if adjacent else "\n[...]\n") + chunk["text"]
+        elif chunk["end"] > last_end:
+            merged += chunk["text"][last_end - chunk["start"]:]
+        else:
+            continue  # Fully contained in what we already have
+        last_end = chunk["end"] if last_end is None else max(last_end, chunk["end"])
+        last_index = chunk.get("index")
+
+    return merged
@@ -35,6 +35,61 @@ class Settings(BaseSettings):
     
     # ChromaDB
     chroma_db_path: str = "./chroma_db"
+    collection_pointer_check_seconds: float = 2.0  # How often workers look for a swapped collection
+    # HNSW index parameters, fixed when a collection is created: changes take
+    # effect on the next rebuild (reindex.py --reset). Measure with
+    # benchmarks/retrieval_benchmark.py before changing them.
+    hnsw_m: int = 16  # Graph links per vector (more = better recall, more memory)
+    hnsw_construction_ef: int = 100  # Candidate list while building (more = better graph, slower indexing)
+    hnsw_search_ef: int = 10  # Candidate list per query (more = better recall, slower search)
+    
+    # Embeddings ("default" = ChromaDB's bundled ONNX model, "sentence-transformers", "gemini",
+    # "hashing" = model-free feature hashing for offline benchmarks, model = vector size).
+    # Changing the model requires a full reindex.
+    embedding_provider: str = "default"
+    embedding_model: str = "all-MiniLM-L6-v2"
+    embedding_batch_size: int = 64  # Chunks per embedding call
+    embedding_workers: int = 0  # Processes for bulk embedding (0 = one per CPU core, 1 = in-process)
+    
+    # Chunking (sizes in characters)
+    chunk_size: int = 1500
+    chunk_overlap: int = 200
+    search_chunk_oversample: int = 4  # Chunks fetched per requested entry before collapsing
+    search_max_chunks_per_entry: int = 3  # Chunks of one entry passed on to the prompt
+    vector_upsert_batch_size: int = 256  # Chunks per ChromaDB upsert in bulk sync/reindex
+    
+    # Hybrid search (BM25 fused with vector hits by reciprocal rank)
+    hybrid_search_enabled: bool = True
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+    rrf_k: int = 60
+    
+    # Relevance gate: when even the best hit is farther than this (cosine
+    # distance), keep only hits BM25 matched on at least this fraction of the
+    # question's terms; with none left, answer "No tengo información..."
+    # without calling Gemini
+    relevance_gate_enabled: bool = True
+    relevance_max_distance: float = 0.65
+    relevance_min_term_coverage: float = 0.6
+    
+    # Prompt context and generation (token counts are estimated from characters)
+    context_max_tokens: int = 3000  # Budget for retrieved passages in the prompt
+    context_chars_per_token: float = 3.5
+    max_output_tokens: int = 1024  # Gemini generation cap
+    
+    # Query embedding cache
+    query_embedding_cache_size: int = 2000
+    query_embedding_cache_ttl_seconds: int = 24 * 3600
+    
+    # Answer cache (invalidated whenever the knowledge base changes)
+    answer_cache_enabled: bool = True
+    answer_cache_backend: str = "memory"  # "memory" (per worker) or "sqlite" (shared by workers)
+    answer_cache_path: str = "./answer_cache.db"
+    answer_cache_size: int = 1000
+    answer_cache_ttl_seconds: int = 6 * 3600
+    semantic_cache_enabled: bool = True
+    semantic_cache_size: int = 500
+    semantic_cache_threshold: float = 0.08  # Max cosine distance between equivalent questions
     
     # CORS
     cors_origins: str = "http://localhost:3000,http://localhost:8000"
@@ -45,6 +100,28 @@ class Settings(BaseSettings):
             return [origin.strip() for origin in self.cors_origins.split(",") if origin.strip()]
         return ["http://localhost:3000", "http://localhost:8000"]
     
+    # Chat concurrency (per uvicorn worker)
+    max_concurrent_chats: int = 8
+    chat_queue_timeout_seconds: float = 30.0
+    
+    # Seconds between batched writes of users' last-seen times
+    activity_flush_seconds: float = 30.0
+    
+    # Chat analytics are queued and written in batches (write-behind)
+    analytics_flush_seconds: float = 5.0
+    analytics_batch_size: int = 200  # Flush early once this many interactions are queued
+    analytics_buffer_size: int = 10000  # Interactions kept when SQLite is unavailable before dropping
+    analytics_dashboard_cache_seconds: int = 60  # Also refreshed as soon as new interactions are written
+    
+    # Share of chat interactions that store their per-stage timing (0-1)
+    stage_timing_sample_rate: float = 1.0
+    
+    # Prometheus metrics: each worker writes a snapshot here, /metrics merges them
+    metrics_dir: str = "./metrics"
+    metrics_flush_seconds: float = 5.0
+    metrics_retention_hours: int = 7 * 24  # Snapshots of exited workers are dropped after this
+    metrics_token: str = ""  # If set, /metrics requires "Authorization: Bearer <token>"
+    
     # Files
     upload_dir: str = "./uploads"
     max_upload_size: int = 10 * 1024 * 1024  # 10MB
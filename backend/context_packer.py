@@ -0,0 +1,155 @@
+"""Token-budgeted assembly of retrieved documents into prompt context"""
+import math
+import re
+from typing import Dict, List, Optional
+from config import settings
+from chunking import is_heading
+from lexical_index import tokenize
+
+# Passages are paragraphs; merged chunks are separated by blank lines or "[...]"
+PASSAGE_SEPARATOR = re.compile(r'\n\s*\n|\n\[\.\.\.\]\n')
+
+# Passages group lines up to about this many characters
+PASSAGE_TARGET_CHARS = 500
+
+# Passages sharing this fraction of their terms with a kept one are duplicates
+# (only checked for passages with enough terms; headings must stay)
+DUPLICATE_OVERLAP = 0.8
+DUPLICATE_MIN_TERMS = 8
+
+
+def count_tokens(text: str) -> int:
+    """Estimate the Gemini token count of a text
+
+    Gemini's count_tokens is a network call, too slow for every passage;
+    a characters-per-token ratio is close enough to keep within budget.
+    """
+    if not text:
+        return 0
+    return int(math.ceil(len(text) / max(0.5, settings.context_chars_per_token)))
+
+
+def _split_passages(document: str) -> List[str]:
+    """Split a document into passages of about PASSAGE_TARGET_CHARS
+    
+    Consecutive lines are grouped (Zendesk text has one line per HTML
+    block); a heading starts a new passage and stays with its body.
+    """
+    passages = []
+    for block in PASSAGE_SEPARATOR.split(document or ""):
+        lines = []
+        size = 0
+        has_body = False
+        for line in block.split("\n"):
+            line = line.strip()
+            if not line:
+                continue
+            heading = is_heading(line)
+            if lines and has_body and (heading or size >= PASSAGE_TARGET_CHARS):
+                passages.append("\n".join(lines))
+                lines, size, has_body = [], 0, False
+            lines.append(line)
+            size += len(line) + 1
+            has_body = has_body or not heading
+        if lines:
+            passages.append("\n".join(lines))
+    return passages
+
+
+def pack_context(query: str, documents: List[str], max_tokens: Optional[int] = None) -> Dict:
+    """Select the most query-relevant passages of ranked documents within a token budget
+
+    Every document first gets its best passage (in rank order), then the
+    remaining budget goes to the next best passages overall. Passages that
+    repeat one already chosen (chunk overlaps, copied articles) are skipped,
+    and chosen passages keep their original order inside each document.
+
+    Args:
+        query: User question
+        documents: Retrieved documents, best first
+        max_tokens: Context budget (defaults to settings.context_max_tokens)
+
+    Returns:
+        Dict with the packed "documents" (documents left without any passage
+        are dropped), "document_ranks" (the position in documents of each
+        packed one), "context_tokens", "passages_used", "passages_total"
+        and "duplicates_skipped"
+    """
+    max_tokens = max_tokens or settings.context_max_tokens
+    query_terms = set(tokenize(query))
+
+    passages = []
+    for doc_rank, document in enumerate(documents):
+        for position, text in enumerate(_split_passages(document)):
+            terms = set(tokenize(text))
+            passages.append({
+                "doc": doc_rank,
+                "position": position,
+                "text": text,
+                "terms": terms,
+                "tokens": count_tokens(text)
+            })
+
+    # Rarer query terms (in fewer passages) weigh more
+    document_frequency = {
+        term: sum(1 for passage in passages if term in passage["terms"])
+        for term in query_terms
+    }
+    total = len(passages) or 1
+    for passage in passages:
+        matched = query_terms & passage["terms"]
+        relevance = sum(math.log(1 + total / document_frequency[term]) for term in matched)
+        # Shorter passages with the same matches are denser; earlier documents rank higher
+        passage["score"] = relevance / math.sqrt(max(1, passage["tokens"])) - 0.001 * passage["doc"]
+
+    by_score = sorted(passages, key=lambda passage: passage["score"], reverse=True)
+    best_per_doc = {}
+    for passage in by_score:
+        best_per_doc.setdefault(passage["doc"], passage)
+    candidates = sorted(best_per_doc.values(), key=lambda passage: passage["doc"])
+    candidates += [passage for passage in by_score if best_per_doc[passage["doc"]] is not passage]
+
+    chosen = []
+    used_tokens = 0
+    duplicates = 0
+    for passage in candidates:
+        if used_tokens + passage["tokens"] > max_tokens:
+            if chosen:
+                continue
+            # Even the best passage alone is over budget: keep its beginning
+            cut = int(max_tokens * settings.context_chars_per_token)
+            passage = dict(passage, text=passage["text"][:cut], tokens=count_tokens(passage["text"][:cut]))
+        if any(_is_duplicate(passage, kept) for kept in chosen):
+            duplicates += 1
+            continue
+        chosen.append(passage)
+        used_tokens += passage["tokens"]
+
+    packed = []
+    packed_ranks = []
+    for doc_rank in range(len(documents)):
+        doc_passages = sorted(
+            (passage for passage in chosen if passage["doc"] == doc_rank),
+            key=lambda passage: passage["position"]
+        )
+        if doc_passages:
+            packed.append("\n\n".join(passage["text"] for passage in doc_passages))
+            packed_ranks.append(doc_rank)
+
+    return {
+        "documents": packed,
+        "document_ranks": packed_ranks,
+        "context_tokens": used_tokens,
+        "passages_used": len(chosen),
+        "passages_total": len(passages),
+        "duplicates_skipped": duplicates
+    }
+
+
+def _is_duplicate(passage: Dict, kept: Dict) -> bool:
+    if passage["text"] == kept["text"]:
+        return True
+    smaller = min(len(passage["terms"]), len(kept["terms"]))
+    if smaller < DUPLICATE_MIN_TERMS:
+        return False
+    return len(passage["terms"] & kept["terms"]) / smaller >= DUPLICATE_OVERLAP
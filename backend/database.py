@@ -1,10 +1,15 @@
 """Database setup and models"""
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text, ForeignKey, UniqueConstraint
+from sqlalchemy import create_engine, Column, Integer, Float, String, Boolean, DateTime, Text, ForeignKey, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import event
+from contextlib import contextmanager
 from datetime import datetime
+from typing import Iterator, Optional, Tuple
+from metrics import metrics
 import os
+import time
 
 # SQLite database for users
 DATABASE_URL = "sqlite:///./knowledge_bot.db"
@@ -19,6 +24,27 @@ engine = create_engine(
     pool_recycle=3600  # Recycle connections after 1 hour
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+# Lock waits are not reported by SQLite: they show up as slow commits, or
+# as "database is locked" once the timeout above runs out
+@event.listens_for(SessionLocal, "before_commit")
+def _commit_started(session):
+    session.info["commit_started"] = time.perf_counter()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _commit_finished(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        metrics.observe("sqlite_commit_duration_seconds", time.perf_counter() - started)
+
+
+@event.listens_for(engine, "handle_error")
+def _count_lock_errors(context):
+    if "database is locked" in str(context.original_exception):
+        metrics.inc("sqlite_lock_errors_total")
+
 Base = declarative_base()
 
 
@@ -33,7 +59,8 @@ class User(Base):
     is_admin = Column(Boolean, default=False)  # Kept for backward compatibility
     role = Column(String, default="user")  # Options: "admin", "supervisor", "user"
     created_at = Column(DateTime, default=datetime.utcnow)
-    last_login = Column(DateTime, nullable=True)
+    last_login = Column(DateTime, nullable=True)  # Set on /api/auth/login
+    last_seen_at = Column(DateTime, nullable=True)  # Last authenticated request (written behind, see activity.py)
     
     @property
     def is_admin_role(self):
@@ -44,6 +71,11 @@ class User(Base):
 class KnowledgeEntry(Base):
     """Knowledge base entry model"""
     __tablename__ = "knowledge_entries"
+    __table_args__ = (
+        # Covers the list columns of the unused documents report, so paging
+        # through it never reads the (possibly large) content
+        Index("ix_knowledge_entries_listing", "id", "source", "created_at", "title"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True, nullable=False)
@@ -55,6 +87,8 @@ class KnowledgeEntry(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     extra_metadata = Column(Text, nullable=True)  # JSON string for additional metadata (renamed from 'metadata' which is reserved in SQLAlchemy)
+    content_hash = Column(String, nullable=True)  # SHA-256 of the indexed title/content/url and filterable metadata
+    source_updated_at = Column(String, nullable=True)  # updated_at reported by the source (e.g. Zendesk)
 
 
 class ImageEntry(Base):
@@ -73,14 +107,23 @@ class ImageEntry(Base):
 class ChatInteraction(Base):
     """Chat interaction model for analytics"""
     __tablename__ = "chat_interactions"
+    __table_args__ = (
+        # Top questions: range over created_at, grouped by the normalized text
+        Index("ix_chat_interactions_created_normalized", "created_at", "normalized_question"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=False, index=True)
     question = Column(Text, nullable=False)
+    normalized_question = Column(Text, nullable=True)  # Case/accent/punctuation-folded (analytics_writer.normalize_question)
     response_preview = Column(Text, nullable=True)  # First 200 chars of response
     documents_used = Column(Text, nullable=True)  # JSON array of document IDs
     response_time_ms = Column(Integer, nullable=True)  # Response time in milliseconds
     context_count = Column(Integer, default=0)  # Number of documents used in context
+    cache_status = Column(String, nullable=True)  # "exact" / "semantic" answer cache hit, None if generated
+    prompt_tokens = Column(Integer, nullable=True)  # Gemini prompt size (None for cached answers)
+    context_tokens = Column(Integer, nullable=True)  # Part of the prompt taken by retrieved passages
+    stage_timings = Column(Text, nullable=True)  # JSON {"<stage>_ms": ms, "total_ms": ms} (sampled)
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
 
@@ -95,6 +138,176 @@ class DocumentUsageStats(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class AnalyticsRollup(Base):
+    """Chat interaction totals per hour or day (maintained by rollups.py)"""
+    __tablename__ = "analytics_rollups"
+    __table_args__ = (UniqueConstraint("granularity", "bucket_start", name="uq_analytics_rollups_bucket"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String, nullable=False)  # "hour" or "day"
+    bucket_start = Column(DateTime, nullable=False)  # UTC start of the hour/day
+    questions = Column(Integer, nullable=False, default=0)
+    no_context_questions = Column(Integer, nullable=False, default=0)
+    cached_questions = Column(Integer, nullable=False, default=0)
+    response_time_sum_ms = Column(Integer, nullable=False, default=0)
+    response_time_count = Column(Integer, nullable=False, default=0)
+    cached_response_time_sum_ms = Column(Integer, nullable=False, default=0)
+    cached_response_time_count = Column(Integer, nullable=False, default=0)
+    semantic_cache_questions = Column(Integer, nullable=False, default=0)  # Part of cached_questions
+    semantic_response_time_sum_ms = Column(Integer, nullable=False, default=0)
+    semantic_response_time_count = Column(Integer, nullable=False, default=0)
+    prompt_tokens_sum = Column(Integer, nullable=False, default=0)
+    context_tokens_sum = Column(Integer, nullable=False, default=0)
+    prompt_tokens_count = Column(Integer, nullable=False, default=0)  # Generated answers (with a prompt)
+    prompt_tokens_max = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UserActivityRollup(Base):
+    """Questions per user and hour or day (maintained by rollups.py)"""
+    __tablename__ = "user_activity_rollups"
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", "user_id", name="uq_user_activity_rollups_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    user_id = Column(Integer, nullable=False, index=True)
+    questions = Column(Integer, nullable=False, default=0)
+    last_question_at = Column(DateTime, nullable=True)
+
+
+class LatencyRollup(Base):
+    """Response time histogram per hour or day (buckets of timing.HISTOGRAM_BUCKETS_MS)"""
+    __tablename__ = "latency_rollups"
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", "le", name="uq_latency_rollups_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    le = Column(String, nullable=False)  # "<=<ms>" or "+Inf"
+    count = Column(Integer, nullable=False, default=0)
+
+
+class StageLatencyRollup(Base):
+    """Chat pipeline stage timing histograms per hour or day (maintained by rollups.py)
+
+    Built from the sampled stage_timings of chat_interactions, split by
+    cache hits and generated answers.
+    """
+    __tablename__ = "stage_latency_rollups"
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", "cached", "metric", "le", name="uq_stage_latency_rollups_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    cached = Column(Boolean, nullable=False)
+    metric = Column(String, nullable=False)  # One of timing.STAGE_METRICS
+    le = Column(String, nullable=False)  # "<=<ms>" or "+Inf"
+    count = Column(Integer, nullable=False, default=0)
+
+
+class CorpusVersion(Base):
+    """Single-row counter bumped on every knowledge base change (cache invalidation)"""
+    __tablename__ = "corpus_version"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ReindexJob(Base):
+    """Progress checkpoint of a full vector store reindex (resumable)"""
+    __tablename__ = "reindex_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, nullable=False, default="running")  # running, completed, failed, interrupted
+    reset = Column(Boolean, default=False)  # Vector store was wiped before the first batch
+    total = Column(Integer, default=0)  # Entries to index when the job (re)started
+    processed = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    failed_ids = Column(Text, nullable=True)  # JSON array of entry IDs that could not be indexed
+    last_entry_id = Column(Integer, default=0)  # Checkpoint: every entry up to this ID is done
+    target_collection = Column(String, nullable=True)  # Shadow collection being built (None = in place)
+    docs_per_second = Column(Float, nullable=True)
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class ActiveCollection(Base):
+    """Single-row pointer to the ChromaDB collection serving searches
+    
+    Full rebuilds write into a new collection and switch this pointer when
+    done; the previous collection is kept for rollback.
+    """
+    __tablename__ = "active_collection"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    previous_name = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+def get_corpus_version() -> int:
+    """Get the current knowledge base version (shared by all workers)"""
+    with engine.connect() as conn:
+        version = conn.execute(text("SELECT version FROM corpus_version WHERE id = 1")).scalar()
+    return version or 0
+
+
+def bump_corpus_version(db) -> None:
+    """Mark the knowledge base as changed so cached answers are not reused"""
+    db.execute(text("INSERT OR IGNORE INTO corpus_version (id, version) VALUES (1, 0)"))
+    db.execute(text(
+        "UPDATE corpus_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1"
+    ))
+    db.commit()
+
+
+def get_active_collection() -> Tuple[Optional[str], Optional[str]]:
+    """Get the (active, previous) vector store collection names (shared by all workers)"""
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT name, previous_name FROM active_collection WHERE id = 1")).first()
+    return (row[0], row[1]) if row else (None, None)
+
+
+def set_active_collection(db, name: str, previous_name: Optional[str]) -> None:
+    """Point every worker at another vector store collection"""
+    db.execute(text("INSERT OR IGNORE INTO active_collection (id, name) VALUES (1, :name)"), {"name": name})
+    db.execute(
+        text(
+            "UPDATE active_collection SET name = :name, previous_name = :previous_name, "
+            "updated_at = CURRENT_TIMESTAMP WHERE id = 1"
+        ),
+        {"name": name, "previous_name": previous_name}
+    )
+    db.commit()
+
+
+@contextmanager
+def read_snapshot() -> Iterator[Session]:
+    """Session whose queries all see one consistent snapshot of the database
+
+    pysqlite only opens a transaction before writes, so every SELECT of a
+    regular session sees the latest data. This one runs on its own
+    autocommit connection inside an explicit BEGIN ... ROLLBACK.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("BEGIN")
+        try:
+            with Session(bind=conn) as session:
+                yield session
+        finally:
+            conn.exec_driver_sql("ROLLBACK")
+
+
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
@@ -0,0 +1,246 @@
+"""Embedding providers for the vector store (documents and queries)"""
+# Patch SQLite antes de importar chromadb
+import sqlite_patch
+import hashlib
+import math
+import multiprocessing
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils import embedding_functions
+from config import settings
+
+# Model ChromaDB uses when a collection has no explicit embedding function;
+# collections created before the model was recorded are assumed to use it
+DEFAULT_EMBEDDING_MODEL_ID = "default:all-MiniLM-L6-v2"
+
+
+class EmbeddingProvider(EmbeddingFunction, ABC):
+    """ChromaDB embedding function with explicit document/query helpers"""
+
+    name = "base"
+    # Whether large batches are worth spreading over a process pool
+    # (CPU-bound local models yes, remote APIs no)
+    parallel = True
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def model_id(self) -> str:
+        """Identifier stored in the collection metadata"""
+        return f"{self.name}:{self.model}"
+
+    @abstractmethod
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of document chunks"""
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a search query"""
+        return self.embed_documents([text])[0]
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self.embed_documents(list(input))
+
+
+class DefaultEmbeddingProvider(EmbeddingProvider):
+    """ChromaDB's bundled ONNX all-MiniLM-L6-v2 model"""
+
+    name = "default"
+    bundled_model = "all-MiniLM-L6-v2"
+
+    def __init__(self, model: str = bundled_model):
+        if model != self.bundled_model:
+            raise ValueError(
+                f"The default embedding provider only ships '{self.bundled_model}' "
+                f"(got '{model}'); use the sentence-transformers provider for other models"
+            )
+        super().__init__(model)
+        self._function = embedding_functions.DefaultEmbeddingFunction()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [[float(value) for value in vector] for vector in self._function(texts)]
+
+
+class SentenceTransformerEmbeddingProvider(EmbeddingProvider):
+    """Any sentence-transformers model (requires the sentence-transformers package)"""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model: str):
+        super().__init__(model)
+        try:
+            self._function = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model)
+        except ValueError as e:
+            raise ValueError(f"sentence-transformers is not installed: {e}")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [[float(value) for value in vector] for vector in self._function(texts)]
+
+
+class GeminiEmbeddingProvider(EmbeddingProvider):
+    """Gemini embedding API (documents and queries use their own task types)"""
+
+    name = "gemini"
+    parallel = False
+
+    def __init__(self, model: str):
+        super().__init__(model)
+        import google.generativeai as genai
+        if not settings.gemini_api_key:
+            raise ValueError("GEMINI_API_KEY is required for the gemini embedding provider")
+        genai.configure(api_key=settings.gemini_api_key)
+        self._genai = genai
+
+    def _embed(self, texts: List[str], task_type: str) -> List[List[float]]:
+        result = self._genai.embed_content(
+            model=self.model if self.model.startswith("models/") else f"models/{self.model}",
+            content=texts,
+            task_type=task_type
+        )
+        return [[float(value) for value in vector] for vector in result["embedding"]]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, "retrieval_document")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "retrieval_query")[0]
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Feature-hashed bag of words: no model download, for offline benchmarks only
+
+    embedding_model is the vector size (e.g. "384").
+    """
+
+    name = "hashing"
+    parallel = False
+
+    def __init__(self, model: str = "384"):
+        super().__init__(model if str(model).isdigit() else "384")
+        self.dimensions = int(self.model)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        from lexical_index import tokenize
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dimensions
+            for token in tokenize(text):
+                digest = hashlib.md5(token.encode("utf-8")).digest()
+                index = int.from_bytes(digest[:4], "little") % self.dimensions
+                vector[index] += 1.0 if digest[4] & 1 else -1.0
+            norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+            vectors.append([value / norm for value in vector])
+        return vectors
+
+
+EMBEDDING_PROVIDERS = {
+    provider.name: provider
+    for provider in (
+        DefaultEmbeddingProvider,
+        SentenceTransformerEmbeddingProvider,
+        GeminiEmbeddingProvider,
+        HashingEmbeddingProvider
+    )
+}
+
+
+def create_embedding_provider(name: Optional[str] = None, model: Optional[str] = None) -> EmbeddingProvider:
+    """Build the provider configured in settings (or the given one)"""
+    name = (name or settings.embedding_provider).strip().lower()
+    model = model or settings.embedding_model
+    if name not in EMBEDDING_PROVIDERS:
+        raise ValueError(
+            f"Unknown embedding provider '{name}' "
+            f"(expected one of: {', '.join(sorted(EMBEDDING_PROVIDERS))})"
+        )
+    return EMBEDDING_PROVIDERS[name](model)
+
+
+# Provider of each pool worker process, built once by the initializer
+_worker_provider = None
+
+def _init_worker(name: str, model: str):
+    global _worker_provider
+    _worker_provider = create_embedding_provider(name, model)
+
+def _embed_in_worker(texts: List[str]) -> List[List[float]]:
+    return _worker_provider.embed_documents(texts)
+
+
+class BatchEmbedder:
+    """Embed large document sets in batches, across processes when worthwhile
+
+    Used as a context manager around a bulk job (sync, reindex) so the pool,
+    whose workers each load the model once, is shut down afterwards.
+    """
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        batch_size: Optional[int] = None,
+        workers: Optional[int] = None
+    ):
+        self.provider = provider
+        self.batch_size = max(1, batch_size or settings.embedding_batch_size)
+        workers = settings.embedding_workers if workers is None else workers
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self._pool = None
+        self._pool_failed = False
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self._pool is None and not self._pool_failed:
+            try:
+                # Spawned (not forked) workers: the parent holds ONNX sessions,
+                # SQLite connections and threads that must not be copied
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.provider.name, self.provider.model)
+                )
+            except Exception as e:
+                print(f"⚠ Could not start embedding process pool, embedding in-process: {e}")
+                self._pool_failed = True
+        return self._pool
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, keeping their order"""
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+
+        if len(batches) > 1 and self.workers > 1 and self.provider.parallel:
+            pool = self._get_pool()
+            if pool is not None:
+                try:
+                    return [vector for batch in pool.map(_embed_in_worker, batches) for vector in batch]
+                except Exception as e:
+                    print(f"⚠ Embedding process pool failed, embedding in-process: {e}")
+                    self.close()
+                    self._pool_failed = True
+
+        return [vector for batch in batches for vector in self.provider.embed_documents(batch)]
+
+    def close(self):
+        """Shut the process pool down"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Global embedding provider instance (lazy initialization)
+_embedding_provider_instance = None
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Get embedding provider instance (lazy initialization)"""
+    global _embedding_provider_instance
+    if _embedding_provider_instance is None:
+        _embedding_provider_instance = create_embedding_provider()
+    return _embedding_provider_instance
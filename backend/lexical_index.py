@@ -0,0 +1,227 @@
+"""In-process BM25 index over knowledge entry chunks (lexical half of hybrid search)"""
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from config import settings
+from chunking import chunk_text
+from database import SessionLocal, KnowledgeEntry, get_corpus_version
+
+# Product codes and tracking numbers ("ABC-123", "ES.45/2") are kept whole
+# and also split into their parts
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:[-_./][a-z0-9]+)*')
+
+STOPWORDS = {
+    "a", "al", "como", "con", "de", "del", "el", "en", "es", "la", "las", "le",
+    "lo", "los", "me", "mi", "no", "o", "para", "por", "que", "se", "si", "su",
+    "sus", "un", "una", "uno", "y", "ya", "the", "and", "of", "to", "in", "is"
+}
+
+# Max values per SQL IN (...) list when loading changed entries
+SQL_IN_BATCH_SIZE = 500
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, accent-fold and split text into search terms"""
+    folded = unicodedata.normalize("NFKD", (text or "").lower())
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(folded):
+        token = match.group(0)
+        parts = re.split(r'[-_./]', token)
+        if len(parts) > 1:
+            tokens.append(token)
+        for part in parts:
+            if not part or part in STOPWORDS:
+                continue
+            # Light plural folding ("envios" -> "envio") on plain words
+            if len(part) > 3 and part.endswith("s") and part.isalpha():
+                part = part[:-1]
+            tokens.append(part)
+    return tokens
+
+
+def term_coverage(query: str, text: str) -> float:
+    """Fraction of the query's distinct terms that appear in text (0 without terms)"""
+    query_terms = set(tokenize(query))
+    if not query_terms:
+        return 0.0
+    return len(query_terms & set(tokenize(text))) / len(query_terms)
+
+
+class BM25Index:
+    """Okapi BM25 inverted index keyed by vector store chunk ids
+
+    Chunk ids and boundaries match VectorStore ("<entry_id>#<index>"), so
+    lexical and dense hits can be fused chunk by chunk. The index is built
+    and kept in step with SQLite by a background thread, never by a search.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._chunk_terms: Dict[str, List[str]] = {}
+        self._chunk_lengths: Dict[str, int] = {}
+        self._entry_chunks: Dict[int, List[str]] = {}
+        self._entry_updated_at: Dict[int, object] = {}
+        self._total_length = 0
+        self._corpus_version: Optional[int] = None
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """Whether the index has been built at least once"""
+        return self._corpus_version is not None
+
+    def index_entry(self, entry_id: int, content: str, updated_at=None):
+        """Add or replace the chunks of an entry"""
+        chunks = chunk_text(content)
+        with self._lock:
+            self._remove_entry(entry_id)
+            chunk_ids = []
+            for chunk in chunks:
+                chunk_id = f"{entry_id}#{chunk['index']}"
+                term_counts = Counter(tokenize(chunk["text"]))
+                for term, count in term_counts.items():
+                    self._postings.setdefault(term, {})[chunk_id] = count
+                length = sum(term_counts.values())
+                self._chunk_terms[chunk_id] = list(term_counts)
+                self._chunk_lengths[chunk_id] = length
+                self._total_length += length
+                chunk_ids.append(chunk_id)
+            self._entry_chunks[entry_id] = chunk_ids
+            self._entry_updated_at[entry_id] = updated_at
+
+    def remove_entry(self, entry_id: int):
+        """Remove every chunk of an entry"""
+        with self._lock:
+            self._remove_entry(entry_id)
+            self._entry_updated_at.pop(entry_id, None)
+
+    def _remove_entry(self, entry_id: int):
+        for chunk_id in self._entry_chunks.pop(entry_id, []):
+            for term in self._chunk_terms.pop(chunk_id, []):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._total_length -= self._chunk_lengths.pop(chunk_id, 0)
+
+    def refresh(self):
+        """Bring the index up to date with SQLite when the corpus version moved
+
+        Writes made by other workers are picked up here: entries whose
+        updated_at changed are re-tokenized and deleted entries dropped.
+        """
+        version = get_corpus_version()
+        if version == self._corpus_version:
+            return
+
+        with self._refresh_lock:
+            if version == self._corpus_version:
+                return  # Another thread refreshed meanwhile
+            self._refresh(version)
+
+    def refresh_in_background(self):
+        """Run refresh() in a daemon thread, unless one is already running"""
+        with self._thread_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(
+                target=self._background_refresh, name="bm25-refresh", daemon=True
+            )
+            self._refresh_thread.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"⚠ Could not refresh the BM25 index: {e}")
+
+    def _refresh(self, version: int):
+        db = SessionLocal()
+        try:
+            current = dict(db.query(KnowledgeEntry.id, KnowledgeEntry.updated_at).all())
+            with self._lock:
+                changed = [
+                    entry_id for entry_id, updated_at in current.items()
+                    if entry_id not in self._entry_updated_at
+                    or self._entry_updated_at[entry_id] != updated_at
+                ]
+                removed = [entry_id for entry_id in self._entry_updated_at if entry_id not in current]
+
+            for entry_id in removed:
+                self.remove_entry(entry_id)
+
+            for start in range(0, len(changed), SQL_IN_BATCH_SIZE):
+                rows = db.query(KnowledgeEntry.id, KnowledgeEntry.content, KnowledgeEntry.updated_at)\
+                    .filter(KnowledgeEntry.id.in_(changed[start:start + SQL_IN_BATCH_SIZE]))\
+                    .all()
+                for entry_id, content, updated_at in rows:
+                    self.index_entry(entry_id, content or "", updated_at)
+
+            self._corpus_version = version
+        finally:
+            db.close()
+
+    def search(self, query: str, n_results: int = 20) -> List[Tuple[str, float]]:
+        """Get the best (chunk_id, score) pairs for a query
+
+        When the corpus changed, the index is brought up to date in the
+        background and this search uses the current one; until the first
+        build is done there are no lexical hits (searches are vector-only).
+        """
+        if get_corpus_version() != self._corpus_version:
+            self.refresh_in_background()
+            if not self.ready:
+                return []
+
+        terms = set(tokenize(query))
+        with self._lock:
+            total_chunks = len(self._chunk_lengths)
+            if not terms or not total_chunks:
+                return []
+            avg_length = self._total_length / total_chunks or 1.0
+
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (total_chunks - df + 0.5) / (df + 0.5))
+                for chunk_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._chunk_lengths[chunk_id] / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+    def stats(self) -> Dict:
+        """Get index size"""
+        with self._lock:
+            return {
+                "entries": len(self._entry_chunks),
+                "chunks": len(self._chunk_lengths),
+                "terms": len(self._postings),
+                "corpus_version": self._corpus_version
+            }
+
+
+# Global lexical index instance (lazy initialization)
+_lexical_index_instance = None
+
+def get_lexical_index() -> BM25Index:
+    """Get lexical index instance (lazy initialization)"""
+    global _lexical_index_instance
+    if _lexical_index_instance is None:
+        _lexical_index_instance = BM25Index(k1=settings.bm25_k1, b=settings.bm25_b)
+    return _lexical_index_instance
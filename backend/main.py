@@ -2,23 +2,23 @@
 # Patch SQLite antes de cualquier otra importación
 import sqlite_patch
 
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, Request, status, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 from pydantic import BaseModel, EmailStr
 import os
-from datetime import datetime, timedelta
-import shutil
+from datetime import datetime
 from pathlib import Path
 import json
-from sqlalchemy import func, desc, and_, Integer, cast
-from collections import Counter
+import random
+import time
 
 from config import settings
-from database import init_db, get_db, User, KnowledgeEntry, ImageEntry, ChatInteraction, DocumentUsageStats
+from database import init_db, get_db, User, KnowledgeEntry, ImageEntry
 from auth import (
     get_current_user, 
     get_current_admin_user,
@@ -28,7 +28,13 @@ from auth import (
     verify_password
 )
 from services.knowledge_service import KnowledgeService
-from rag_service import get_rag_service
+from services.analytics_service import AnalyticsService
+from rag_service import get_rag_service, ChatBusyError
+from timing import StageTimer
+from metrics import metrics, render as render_metrics, start_metrics_flusher
+from activity import activity_tracker
+from analytics_writer import analytics_writer
+from lexical_index import get_lexical_index
 from slugify import slugify
 from scheduler import setup_zendesk_scheduler, get_scheduler_status
 
@@ -55,9 +61,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count requests and their latency per route template (not per raw path)"""
+    start_time = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", None) or "unmatched"
+        metrics.inc("http_requests_total", {
+            "route": route_path,
+            "method": request.method,
+            "status": status_code
+        })
+        metrics.observe("http_request_duration_seconds", time.perf_counter() - start_time, {"route": route_path})
+
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
+    start_metrics_flusher()
+    activity_tracker.start_flusher()
+    analytics_writer.start_flusher()
     try:
         init_db()
         print("✓ Database initialized successfully")
@@ -66,6 +94,10 @@ async def startup_event():
         import traceback
         traceback.print_exc()
     
+    # Build the BM25 index off the request path (searches are vector-only until ready)
+    if settings.hybrid_search_enabled:
+        get_lexical_index().refresh_in_background()
+    
     # Setup Zendesk automatic sync if enabled
     if settings.zendesk_auto_sync and settings.zendesk_subdomain:
         setup_zendesk_scheduler(enabled=True, hour=settings.zendesk_sync_hour, minute=settings.zendesk_sync_minute)
@@ -78,6 +110,12 @@ async def startup_event():
             reason.append("ZENDESK_SUBDOMAIN is not configured")
         print(f"ℹ Zendesk automatic sync is disabled: {', '.join(reason)}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Write buffered analytics and last-seen times before the worker exits
+    analytics_writer.flush()
+    activity_tracker.flush()
+
 # Pydantic models
 class UserCreate(BaseModel):
     username: str
@@ -98,13 +136,26 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ChatFilters(BaseModel):
+    """Narrow the knowledge searched for an answer (values or lists of values)"""
+    source: Optional[Union[str, List[str]]] = None  # manual, zendesk, url
+    locale: Optional[Union[str, List[str]]] = None  # Zendesk locale, e.g. "es"
+    section_id: Optional[Union[str, List[str]]] = None  # Zendesk section
+    updated_since: Optional[datetime] = None
+
 class ChatMessage(BaseModel):
     message: str
+    filters: Optional[ChatFilters] = None
+    
+    def get_filters(self) -> Optional[dict]:
+        return self.filters.model_dump(exclude_none=True) if self.filters else None
 
 class ChatResponse(BaseModel):
     response: str
     sources: List[dict] = []
     context_count: int = 0
+    cached: bool = False
+    timing: Optional[dict] = None  # Milliseconds per stage (see timing.STAGES) and total_ms
 
 class KnowledgeEntryCreate(BaseModel):
     title: str
@@ -181,6 +232,20 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
 
 # Analytics endpoints (admin + supervisor)
+@app.get("/api/analytics/dashboard")
+def get_analytics_dashboard(
+    days: int = 30,
+    limit: int = 10,
+    current_user: User = Depends(get_current_supervisor_user),
+    db: Session = Depends(get_db)
+):
+    """Get every panel of the analytics page in one response
+    
+    Computed from one database snapshot and cached per (days, limit) until
+    new interactions are recorded (see AnalyticsService.dashboard).
+    """
+    return AnalyticsService(db).dashboard(days=days, limit=limit)
+
 @app.get("/api/analytics/overview")
 async def get_analytics_overview(
     days: int = 30,
@@ -188,52 +253,7 @@ async def get_analytics_overview(
     db: Session = Depends(get_db)
 ):
     """Get analytics overview (supervisor/admin only)"""
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=days)
-    
-    # Total questions
-    total_questions = db.query(ChatInteraction).filter(
-        ChatInteraction.created_at >= start_date
-    ).count()
-    
-    # Active users (users who asked at least one question)
-    active_users = db.query(func.count(func.distinct(ChatInteraction.user_id))).filter(
-        ChatInteraction.created_at >= start_date
-    ).scalar()
-    
-    # Average questions per user
-    avg_questions_per_user = total_questions / active_users if active_users > 0 else 0
-    
-    # Total users
-    total_users = db.query(User).count()
-    
-    # Questions with no documents (no context found)
-    questions_no_context = db.query(ChatInteraction).filter(
-        and_(
-            ChatInteraction.created_at >= start_date,
-            ChatInteraction.context_count == 0
-        )
-    ).count()
-    
-    # Total knowledge entries
-    total_documents = db.query(KnowledgeEntry).count()
-    
-    # Average response time
-    avg_response_time = db.query(func.avg(ChatInteraction.response_time_ms)).filter(
-        ChatInteraction.created_at >= start_date,
-        ChatInteraction.response_time_ms.isnot(None)
-    ).scalar() or 0
-    
-    return {
-        "total_questions": total_questions,
-        "active_users": active_users,
-        "total_users": total_users,
-        "avg_questions_per_user": round(avg_questions_per_user, 2),
-        "questions_no_context": questions_no_context,
-        "total_documents": total_documents,
-        "avg_response_time_ms": round(float(avg_response_time), 2),
-        "period_days": days
-    }
+    return AnalyticsService(db).overview(days)
 
 @app.get("/api/analytics/questions-by-day")
 async def get_questions_by_day(
@@ -242,35 +262,7 @@ async def get_questions_by_day(
     db: Session = Depends(get_db)
 ):
     """Get questions count by day"""
-    end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    start_date = end_date - timedelta(days=days)
-    
-    # SQLite uses strftime for date extraction
-    results = db.query(
-        func.strftime('%Y-%m-%d', ChatInteraction.created_at).label('date'),
-        func.count(ChatInteraction.id).label('count')
-    ).filter(
-        ChatInteraction.created_at >= start_date
-    ).group_by(
-        func.strftime('%Y-%m-%d', ChatInteraction.created_at)
-    ).order_by(
-        func.strftime('%Y-%m-%d', ChatInteraction.created_at)
-    ).all()
-    
-    # Fill in missing days with 0
-    date_dict = {str(row.date): row.count for row in results}
-    filled_results = []
-    current = start_date
-    
-    while current <= end_date:
-        date_str = current.strftime('%Y-%m-%d')
-        filled_results.append({
-            "date": date_str,
-            "count": date_dict.get(date_str, 0)
-        })
-        current += timedelta(days=1)
-    
-    return filled_results
+    return AnalyticsService(db).questions_by_day(days)
 
 @app.get("/api/analytics/top-questions")
 async def get_top_questions(
@@ -280,30 +272,7 @@ async def get_top_questions(
     db: Session = Depends(get_db)
 ):
     """Get most frequently asked questions"""
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    # Get all questions in the period
-    questions = db.query(ChatInteraction.question).filter(
-        ChatInteraction.created_at >= start_date
-    ).all()
-    
-    # Count occurrences (case-insensitive, normalized)
-    question_counter = Counter()
-    for (question,) in questions:
-        # Normalize: lowercase and strip
-        normalized = question.lower().strip()
-        question_counter[normalized] += 1
-    
-    # Get top questions
-    top_questions = question_counter.most_common(limit)
-    
-    return [
-        {
-            "question": question,
-            "count": count
-        }
-        for question, count in top_questions
-    ]
+    return AnalyticsService(db).top_questions(days, limit)
 
 @app.get("/api/analytics/top-documents")
 async def get_top_documents(
@@ -312,27 +281,7 @@ async def get_top_documents(
     db: Session = Depends(get_db)
 ):
     """Get most consulted documents"""
-    stats = db.query(DocumentUsageStats).order_by(
-        desc(DocumentUsageStats.times_used)
-    ).limit(limit).all()
-    
-    result = []
-    for stat in stats:
-        entry = db.query(KnowledgeEntry).filter(
-            KnowledgeEntry.id == stat.knowledge_entry_id
-        ).first()
-        
-        if entry:
-            result.append({
-                "id": entry.id,
-                "title": entry.title,
-                "source": entry.source,
-                "url": entry.url,
-                "times_used": stat.times_used,
-                "last_used_at": stat.last_used_at.isoformat() if stat.last_used_at else None
-            })
-    
-    return result
+    return AnalyticsService(db).top_documents(limit)
 
 @app.get("/api/analytics/top-users")
 async def get_top_users(
@@ -342,39 +291,7 @@ async def get_top_users(
     db: Session = Depends(get_db)
 ):
     """Get most active users"""
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    results = db.query(
-        ChatInteraction.user_id,
-        func.count(ChatInteraction.id).label('question_count')
-    ).filter(
-        ChatInteraction.created_at >= start_date
-    ).group_by(
-        ChatInteraction.user_id
-    ).order_by(
-        desc('question_count')
-    ).limit(limit).all()
-    
-    top_users = []
-    for user_id, question_count in results:
-        user = db.query(User).filter(User.id == user_id).first()
-        if user:
-            last_activity = db.query(
-                func.max(ChatInteraction.created_at)
-            ).filter(
-                ChatInteraction.user_id == user_id
-            ).scalar()
-            
-            top_users.append({
-                "id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "role": getattr(user, 'role', 'user'),
-                "question_count": question_count,
-                "last_activity": last_activity.isoformat() if last_activity else None
-            })
-    
-    return top_users
+    return AnalyticsService(db).top_users(days, limit)
 
 @app.get("/api/analytics/peak-hours")
 async def get_peak_hours(
@@ -383,31 +300,7 @@ async def get_peak_hours(
     db: Session = Depends(get_db)
 ):
     """Get questions by hour of day (peak hours)"""
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    # SQLite uses strftime('%H', datetime_column) to extract hour
-    results = db.query(
-        cast(func.strftime('%H', ChatInteraction.created_at), Integer).label('hour'),
-        func.count(ChatInteraction.id).label('count')
-    ).filter(
-        ChatInteraction.created_at >= start_date
-    ).group_by(
-        func.strftime('%H', ChatInteraction.created_at)
-    ).order_by(
-        func.strftime('%H', ChatInteraction.created_at)
-    ).all()
-    
-    # Fill in all 24 hours
-    hour_dict = {int(row.hour): row.count for row in results}
-    filled_results = []
-    
-    for hour in range(24):
-        filled_results.append({
-            "hour": hour,
-            "count": hour_dict.get(hour, 0)
-        })
-    
-    return filled_results
+    return AnalyticsService(db).peak_hours(days)
 
 @app.get("/api/analytics/document-sources")
 async def get_document_sources_stats(
@@ -415,42 +308,79 @@ async def get_document_sources_stats(
     db: Session = Depends(get_db)
 ):
     """Get statistics by document source"""
-    results = db.query(
-        KnowledgeEntry.source,
-        func.count(KnowledgeEntry.id).label('count')
-    ).group_by(
-        KnowledgeEntry.source
-    ).all()
-    
-    return [
-        {
-            "source": source,
-            "count": count
-        }
-        for source, count in results
-    ]
+    return AnalyticsService(db).document_sources()
 
 @app.get("/api/analytics/unused-documents")
 async def get_unused_documents(
+    after_id: int = 0,
+    limit: int = 50,
+    not_used_since_days: Optional[int] = None,
     current_user: User = Depends(get_current_supervisor_user),
     db: Session = Depends(get_db)
 ):
-    """Get documents that have never been used"""
-    used_ids = {stat.knowledge_entry_id for stat in db.query(DocumentUsageStats.knowledge_entry_id).all()}
-    all_entries = db.query(KnowledgeEntry).all()
-    
-    unused = [
-        {
-            "id": entry.id,
-            "title": entry.title,
-            "source": entry.source,
-            "created_at": entry.created_at.isoformat()
-        }
-        for entry in all_entries
-        if entry.id not in used_ids
-    ]
+    """Get documents that have never been used (or not in the last not_used_since_days)
+    
+    Paginated by id: pass the returned next_after_id as after_id for the
+    next page (total is only returned with the first page).
+    """
+    return AnalyticsService(db).unused_documents(
+        after_id=after_id,
+        limit=limit,
+        not_used_since_days=not_used_since_days
+    )
+
+@app.get("/api/analytics/cache")
+async def get_cache_stats(
+    current_user: User = Depends(get_current_supervisor_user)
+):
+    """Get hit/miss counters of the in-process caches (per worker)"""
+    from vector_store import get_vector_store
+    from answer_cache import get_answer_cache, get_semantic_cache
     
-    return unused
+    return {
+        "query_embeddings": get_vector_store().get_cache_stats(),
+        "answers": get_answer_cache().stats(),
+        "semantic_answers": get_semantic_cache().stats()
+    }
+
+@app.get("/api/analytics/cache-by-day")
+async def get_cache_hits_by_day(
+    days: int = 7,
+    current_user: User = Depends(get_current_supervisor_user),
+    db: Session = Depends(get_db)
+):
+    """Get answer cache hits (exact/semantic) and latency by day"""
+    return AnalyticsService(db).cache_by_day(days)
+
+@app.get("/api/analytics/stage-latency")
+def get_stage_latency(
+    days: int = 7,
+    bucket: str = "day",
+    cached: Optional[bool] = None,
+    current_user: User = Depends(get_current_supervisor_user),
+    db: Session = Depends(get_db)
+):
+    """Get p50/p95 per chat pipeline stage over time, with latency histograms
+    
+    Served from the stage latency rollups of the timing sampled into
+    chat_interactions (percentiles are estimated from histogram buckets).
+    bucket is "hour" or "day"; cached restricts to cache hits (True) or
+    generated answers (False).
+    """
+    if bucket not in ("hour", "day"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bucket must be 'hour' or 'day'"
+        )
+    return AnalyticsService(db).stage_latency(days, bucket, cached)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """Prometheus metrics, merged across all workers"""
+    if settings.metrics_token and request.headers.get("Authorization") != f"Bearer {settings.metrics_token}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    content = await run_in_threadpool(render_metrics)
+    return PlainTextResponse(content, media_type="text/plain; version=0.0.4")
 
 @app.get("/api/health")
 async def health_check():
@@ -567,12 +497,66 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
         role=user_role
     )
 
+def record_chat_interaction(
+    user_id: int,
+    question: str,
+    result: dict,
+    response_time_ms: int,
+    timer: Optional[StageTimer] = None
+):
+    """Queue a chat interaction and its document usage for the analytics writer (never raises)
+    
+    Queueing is the "record" stage of the request's timer; the per-stage
+    timing is kept for a settings.stage_timing_sample_rate share of the
+    interactions.
+    """
+    timer = timer or StageTimer()
+    try:
+        with timer.stage("record"):
+            # Extract document IDs from sources
+            document_ids = []
+            for source in result.get("sources", []):
+                entry_id = source.get("entry_id")
+                if entry_id:
+                    try:
+                        # Ensure entry_id is an integer
+                        entry_id_int = int(entry_id) if entry_id else None
+                        if entry_id_int and entry_id_int not in document_ids:
+                            document_ids.append(entry_id_int)
+                    except (ValueError, TypeError):
+                        continue
+            
+            interaction = {
+                "user_id": user_id,
+                "question": question,
+                "response_preview": result["response"][:200] if result["response"] else "",
+                "documents_used": json.dumps(document_ids) if document_ids else None,
+                "response_time_ms": response_time_ms,
+                "context_count": result.get("context_count", 0),
+                "cache_status": result.get("cache_status"),
+                "prompt_tokens": result.get("prompt_tokens"),
+                "context_tokens": result.get("context_tokens"),
+                "stage_timings": None,
+                "created_at": datetime.utcnow()
+            }
+        
+        if random.random() < settings.stage_timing_sample_rate:
+            # Streamed answers also keep their time to first token
+            first_token = {
+                key: value for key, value in (result.get("timing") or {}).items() if key == "first_token_ms"
+            }
+            interaction["stage_timings"] = json.dumps(timer.as_dict(first_token))
+        
+        analytics_writer.record_chat(interaction, document_ids)
+    except Exception as stats_error:
+        # Don't fail the chat if stats recording fails
+        print(f"Error recording chat statistics: {stats_error}")
+
 # Chat endpoints
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(
     message: ChatMessage,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """Chat with the knowledge bot"""
     if not message.message.strip():
@@ -581,8 +565,8 @@ async def chat(
             detail="Message cannot be empty"
         )
     
-    import time
     start_time = time.time()
+    timer = StageTimer()
     
     try:
         logging.info(f"Processing chat request from user {current_user.username}: {message.message[:100]}")
@@ -596,62 +580,27 @@ async def chat(
             )
         
         rag_service = get_rag_service()
-        result = rag_service.chat(message.message)
+        async with rag_service.chat_slot(timer):
+            result = await rag_service.achat(message.message, filters=message.get_filters(), timer=timer)
         
         response_time_ms = int((time.time() - start_time) * 1000)
         
-        # Extract document IDs from sources
-        document_ids = []
-        for source in result.get("sources", []):
-            entry_id = source.get("entry_id")
-            if entry_id:
-                try:
-                    # Ensure entry_id is an integer
-                    entry_id_int = int(entry_id) if entry_id else None
-                    if entry_id_int and entry_id_int not in document_ids:
-                        document_ids.append(entry_id_int)
-                except (ValueError, TypeError):
-                    continue
-        
-        # Store interaction in database
-        try:
-            interaction = ChatInteraction(
-                user_id=current_user.id,
-                question=message.message,
-                response_preview=result["response"][:200] if result["response"] else "",
-                documents_used=json.dumps(document_ids) if document_ids else None,
-                response_time_ms=response_time_ms,
-                context_count=result.get("context_count", 0)
-            )
-            db.add(interaction)
-            
-            # Update document usage stats
-            for doc_id in document_ids:
-                stats = db.query(DocumentUsageStats).filter(
-                    DocumentUsageStats.knowledge_entry_id == doc_id
-                ).first()
-                
-                if stats:
-                    stats.times_used += 1
-                    stats.last_used_at = datetime.utcnow()
-                else:
-                    stats = DocumentUsageStats(
-                        knowledge_entry_id=doc_id,
-                        times_used=1,
-                        last_used_at=datetime.utcnow()
-                    )
-                    db.add(stats)
-            
-            db.commit()
-        except Exception as stats_error:
-            # Don't fail the chat if stats recording fails
-            print(f"Error recording chat statistics: {stats_error}")
-            db.rollback()
+        # Only queued: the analytics writer stores it in the background
+        record_chat_interaction(current_user.id, message.message, result, response_time_ms, timer)
         
         return ChatResponse(
             response=result["response"],
             sources=result.get("sources", []),
-            context_count=result.get("context_count", 0)
+            context_count=result.get("context_count", 0),
+            cached=result.get("cached", False),
+            timing=timer.as_dict()
+        )
+    except ChatBusyError as e:
+        logging.warning(f"Chat rejected for user {current_user.username}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"}
         )
     except Exception as e:
         import traceback
@@ -664,6 +613,62 @@ async def chat(
             detail=f"Error processing chat: {str(e)}"
         )
 
+@app.post("/api/chat/stream")
+async def chat_stream(
+    message: ChatMessage,
+    current_user: User = Depends(get_current_user)
+):
+    """Chat with the knowledge bot, streaming the answer as server-sent events
+    
+    Events: "sources" (retrieved documents), "token" (answer text as Gemini
+    produces it), "done" (full result with timing) or "error".
+    """
+    if not message.message.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Message cannot be empty"
+        )
+    
+    if not settings.gemini_api_key:
+        logging.error("GEMINI_API_KEY is not configured")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="GEMINI_API_KEY is not configured. Please configure it in the .env file."
+        )
+    
+    rag_service = get_rag_service()
+    user_id = current_user.id
+    logging.info(f"Processing streaming chat request from user {current_user.username}: {message.message[:100]}")
+    
+    def format_event(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+    
+    async def event_stream():
+        start_time = time.time()
+        timer = StageTimer()
+        try:
+            async with rag_service.chat_slot(timer):
+                async for item in rag_service.achat_stream(message.message, filters=message.get_filters(), timer=timer):
+                    if item["event"] == "done":
+                        response_time_ms = int((time.time() - start_time) * 1000)
+                        record_chat_interaction(user_id, message.message, item["data"], response_time_ms, timer)
+                    yield format_event(item["event"], item["data"])
+        except ChatBusyError as e:
+            logging.warning(f"Streaming chat rejected for user {user_id}: {str(e)}")
+            yield format_event("error", {"detail": str(e), "busy": True})
+        except Exception as e:
+            logging.error(f"Error processing streaming chat: {str(e)}")
+            yield format_event("error", {"detail": f"Error processing chat: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering
+        }
+    )
+
 # Knowledge base endpoints
 @app.get("/api/knowledge", response_model=List[KnowledgeEntryResponse])
 async def get_knowledge_entries(
@@ -804,6 +809,54 @@ async def get_zendesk_sync_status(
     })
     return status
 
+@app.get("/api/knowledge/embedding")
+async def get_embedding_info(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Get the configured embedding model and the one the index was built with"""
+    from vector_store import get_vector_store
+    return get_vector_store().get_embedding_info()
+
+@app.post("/api/knowledge/reindex")
+async def start_reindex(
+    reset: bool = False,
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Start (or resume) a full reindex of the vector store in the background
+    
+    With reset=true everything is re-embedded into a new collection that
+    replaces the live one when complete (the old one is kept for rollback).
+    Progress is available at GET /api/knowledge/reindex/status.
+    """
+    from services.reindex_service import run_reindex_in_background, ReindexInProgressError
+    try:
+        return await run_in_threadpool(run_reindex_in_background, reset)
+    except ReindexInProgressError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+@app.get("/api/knowledge/reindex/status")
+async def get_reindex_status(
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Get progress (docs/s, ETA) of the latest reindex"""
+    from services.reindex_service import ReindexService
+    from vector_store import get_vector_store
+    status_info = ReindexService(db).get_status() or {"status": "never_run"}
+    status_info["collections"] = get_vector_store().get_collection_info()
+    return status_info
+
+@app.post("/api/knowledge/reindex/rollback")
+async def rollback_reindex(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Switch back to the vector store collection that was active before the last rebuild"""
+    from vector_store import get_vector_store
+    try:
+        return await run_in_threadpool(get_vector_store().rollback_collection)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 # URL scraping endpoint
 @app.post("/api/knowledge/from-url", response_model=KnowledgeEntryResponse)
 async def add_knowledge_from_url(
@@ -0,0 +1,253 @@
+"""Prometheus metrics aggregated across uvicorn workers
+
+Each process counts into an in-memory registry and a background thread
+writes it to its own snapshot file in settings.metrics_dir every few
+seconds. /metrics merges every snapshot: counters and histograms are
+summed over all processes (including exited ones, so totals do not drop
+when pm2 restarts a worker), gauges only over processes that are still
+writing.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from config import settings
+
+# Latency buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SYNC_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+# name: (type, help, histogram buckets or gauge aggregation)
+# Gauge aggregation: "sum" over live processes, "max", or "pid" (one series per process)
+METRICS = {
+    "http_requests_total": ("counter", "HTTP requests by route, method and status", None),
+    "http_request_duration_seconds": (
+        "histogram", "HTTP request latency by route (until the response starts)", LATENCY_BUCKETS
+    ),
+    "chats_in_flight": ("gauge", "Chats being answered", "sum"),
+    "gemini_request_duration_seconds": ("histogram", "Gemini generation latency by mode", LATENCY_BUCKETS),
+    "gemini_errors_total": ("counter", "Failed Gemini generations by mode", None),
+    "vector_search_duration_seconds": ("histogram", "Vector store search latency", LATENCY_BUCKETS),
+    "cache_requests_total": ("counter", "Cache lookups by cache and result (hit/miss)", None),
+    "zendesk_sync_duration_seconds": ("histogram", "Automatic Zendesk sync duration", SYNC_BUCKETS),
+    "zendesk_sync_total": ("counter", "Automatic Zendesk syncs by outcome", None),
+    "zendesk_sync_last_success_timestamp_seconds": (
+        "gauge", "Unix time of the last successful automatic Zendesk sync", "max"
+    ),
+    "sqlite_commit_duration_seconds": (
+        "histogram", "SQLite flush and commit time (lock waits show up here)", LATENCY_BUCKETS
+    ),
+    "sqlite_lock_errors_total": ("counter", "SQLite operations that gave up waiting for a lock", None),
+    "analytics_flush_duration_seconds": ("histogram", "Batched chat analytics write time", LATENCY_BUCKETS),
+    "analytics_records_dropped_total": ("counter", "Chat interactions dropped because the buffer was full", None),
+    "process_resident_memory_bytes": ("gauge", "Resident memory of each backend process", "pid"),
+}
+
+# Snapshots not rewritten for this long belong to exited processes: their
+# gauges are ignored (counters still count)
+LIVE_SNAPSHOT_FACTOR = 3
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict]) -> LabelKey:
+    return tuple(sorted((str(key), str(value)) for key, value in (labels or {}).items()))
+
+
+def rss_bytes() -> int:
+    """Resident memory of this process (0 where /proc is not available)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms of one process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._gauges: Dict[Tuple[str, LabelKey], float] = {}
+        self._histograms: Dict[Tuple[str, LabelKey], List] = {}  # [bucket counts, sum, count]
+
+    def inc(self, name: str, labels: Optional[Dict] = None, value: float = 1):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict] = None):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name: str, seconds: float, labels: Optional[Dict] = None):
+        buckets = METRICS[name][2]
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for index, bound in enumerate(buckets):
+                if seconds <= bound:
+                    histogram[0][index] += 1
+                    break
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    @contextmanager
+    def time(self, name: str, labels: Optional[Dict] = None):
+        """Observe the duration of the block (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, labels)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "updated_at": time.time(),
+                "counters": [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                "gauges": [[name, dict(labels), value] for (name, labels), value in self._gauges.items()],
+                "histograms": [
+                    [name, dict(labels), list(counts), total, count]
+                    for (name, labels), (counts, total, count) in self._histograms.items()
+                ]
+            }
+
+
+metrics = MetricsRegistry()
+
+_flusher_started = False
+
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(settings.metrics_dir, f"{pid}.json")
+
+
+def flush():
+    """Write this process's snapshot (atomically replacing the previous one)"""
+    metrics.set_gauge("process_resident_memory_bytes", rss_bytes())
+    os.makedirs(settings.metrics_dir, exist_ok=True)
+    path = _snapshot_path(os.getpid())
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(metrics.snapshot(), f)
+    os.replace(temporary, path)
+
+
+def start_metrics_flusher():
+    """Flush this process's metrics periodically and at exit (call once per worker)"""
+    global _flusher_started
+    if _flusher_started:
+        return
+    _flusher_started = True
+
+    def loop():
+        while True:
+            time.sleep(settings.metrics_flush_seconds)
+            try:
+                flush()
+            except Exception as e:
+                print(f"⚠ Could not write metrics snapshot: {e}")
+
+    threading.Thread(target=loop, name="metrics-flush", daemon=True).start()
+    atexit.register(flush)
+
+
+def _read_snapshots() -> List[Dict]:
+    snapshots = []
+    expire_before = time.time() - settings.metrics_retention_hours * 3600
+    for path in glob.glob(os.path.join(settings.metrics_dir, "*.json")):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue  # Being replaced or corrupt
+        if snapshot.get("updated_at", 0) < expire_before:
+            # Long-gone process: dropping it reads as a counter reset to Prometheus
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        snapshots.append(snapshot)
+    return snapshots
+
+
+def _format_labels(labels: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (
+        key + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    """Merge every process's snapshot into the Prometheus text format"""
+    flush()
+    live_after = time.time() - LIVE_SNAPSHOT_FACTOR * settings.metrics_flush_seconds
+
+    counters: Dict[Tuple[str, LabelKey], float] = {}
+    gauges: Dict[Tuple[str, LabelKey], float] = {}
+    histograms: Dict[Tuple[str, LabelKey], List] = {}
+    for snapshot in _read_snapshots():
+        for name, labels, value in snapshot.get("counters", []):
+            key = (name, _label_key(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total, count in snapshot.get("histograms", []):
+            key = (name, _label_key(labels))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0, 0])
+            if len(merged[0]) != len(counts):
+                continue  # Buckets changed between versions
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+            merged[2] += count
+        if snapshot.get("updated_at", 0) < live_after:
+            continue
+        for name, labels, value in snapshot.get("gauges", []):
+            if name not in METRICS:
+                continue
+            aggregation = METRICS[name][2]
+            if aggregation == "pid":
+                labels = dict(labels, pid=snapshot["pid"])
+            key = (name, _label_key(labels))
+            if aggregation == "max":
+                gauges[key] = max(gauges.get(key, value), value)
+            else:
+                gauges[key] = gauges.get(key, 0) + value
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "histogram":
+            for (series, labels), (counts, total, count) in sorted(histograms.items()):
+                if series != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        else:
+            series_values = counters if kind == "counter" else gauges
+            for (series, labels), value in sorted(series_values.items()):
+                if series == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,49 @@
+"""Script to add cache_status column to chat_interactions table"""
+import sqlite3
+from pathlib import Path
+
+def migrate_cache_status():
+    """Add cache_status column to chat_interactions if it doesn't exist"""
+    db_path = Path(__file__).parent / "knowledge_bot.db"
+    
+    if not db_path.exists():
+        print(f"❌ Base de datos no encontrada en: {db_path}")
+        return False
+    
+    conn = None
+    try:
+        conn = sqlite3.connect(str(db_path))
+        cursor = conn.cursor()
+        
+        cursor.execute("PRAGMA table_info(chat_interactions)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'cache_status' in columns:
+            print("✓ La columna 'cache_status' ya existe en la tabla chat_interactions")
+        else:
+            print("Añadiendo columna 'cache_status' a la tabla chat_interactions...")
+            cursor.execute("ALTER TABLE chat_interactions ADD COLUMN cache_status VARCHAR")
+            print("✓ Columna 'cache_status' añadida")
+        
+        conn.commit()
+        conn.close()
+        
+        print("\n✓ Migración completada exitosamente")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return False
+
+if __name__ == "__main__":
+    print("Ejecutando migración de estado de caché...")
+    print("=" * 50)
+    success = migrate_cache_status()
+    print("=" * 50)
+    if success:
+        print("✓ Todas las columnas están listas")
+    else:
+        print("❌ La migración falló")
@@ -0,0 +1,52 @@
+"""Script to add content hash columns to knowledge_entries table"""
+import sqlite3
+from pathlib import Path
+
+def migrate_content_hash():
+    """Add content_hash and source_updated_at columns if they don't exist"""
+    db_path = Path(__file__).parent / "knowledge_bot.db"
+    
+    if not db_path.exists():
+        print(f"❌ Base de datos no encontrada en: {db_path}")
+        return False
+    
+    conn = None
+    try:
+        conn = sqlite3.connect(str(db_path))
+        cursor = conn.cursor()
+        
+        cursor.execute("PRAGMA table_info(knowledge_entries)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        for column in ("content_hash", "source_updated_at"):
+            if column in columns:
+                print(f"✓ La columna '{column}' ya existe en la tabla knowledge_entries")
+            else:
+                print(f"Añadiendo columna '{column}' a la tabla knowledge_entries...")
+                cursor.execute(f"ALTER TABLE knowledge_entries ADD COLUMN {column} VARCHAR")
+                print(f"✓ Columna '{column}' añadida")
+        
+        conn.commit()
+        conn.close()
+        
+        # Existing entries have no hash yet: the next sync re-embeds them once
+        # and stores the hash, later syncs skip unchanged articles
+        print("\n✓ Migración completada exitosamente")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return False
+
+if __name__ == "__main__":
+    print("Ejecutando migración de hash de contenido...")
+    print("=" * 50)
+    success = migrate_content_hash()
+    print("=" * 50)
+    if success:
+        print("✓ Todas las columnas están listas")
+    else:
+        print("❌ La migración falló")
@@ -0,0 +1,49 @@
+"""Script to add the last_seen_at column to users table"""
+import sqlite3
+from pathlib import Path
+
+def migrate_last_seen():
+    """Add last_seen_at column if it doesn't exist"""
+    db_path = Path(__file__).parent / "knowledge_bot.db"
+
+    if not db_path.exists():
+        print(f"❌ Base de datos no encontrada en: {db_path}")
+        return False
+
+    conn = None
+    try:
+        conn = sqlite3.connect(str(db_path))
+        cursor = conn.cursor()
+
+        cursor.execute("PRAGMA table_info(users)")
+        columns = [column[1] for column in cursor.fetchall()]
+
+        if "last_seen_at" in columns:
+            print("✓ La columna 'last_seen_at' ya existe en la tabla users")
+        else:
+            print("Añadiendo columna 'last_seen_at' a la tabla users...")
+            cursor.execute("ALTER TABLE users ADD COLUMN last_seen_at DATETIME")
+            print("✓ Columna 'last_seen_at' añadida")
+
+        conn.commit()
+        conn.close()
+
+        print("\n✓ Migración completada exitosamente")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return False
+
+if __name__ == "__main__":
+    print("Ejecutando migración de última actividad...")
+    print("=" * 50)
+    success = migrate_last_seen()
+    print("=" * 50)
+    if success:
+        print("✓ La columna está lista")
+    else:
+        print("❌ La migración falló")
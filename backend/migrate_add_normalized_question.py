@@ -0,0 +1,78 @@
+"""Script to add the normalized_question column to chat_interactions table
+
+Also fills it in for existing interactions (in batches, so the backend can
+keep running) and creates the (created_at, normalized_question) index used
+by the top questions report.
+"""
+import sqlite3
+from pathlib import Path
+from analytics_writer import normalize_question
+
+BATCH_SIZE = 5000
+
+def migrate_normalized_question():
+    """Add and backfill normalized_question column if needed"""
+    db_path = Path(__file__).parent / "knowledge_bot.db"
+
+    if not db_path.exists():
+        print(f"❌ Base de datos no encontrada en: {db_path}")
+        return False
+
+    conn = None
+    try:
+        conn = sqlite3.connect(str(db_path), timeout=30.0)
+        conn.create_function("normalize_question", 1, normalize_question, deterministic=True)
+        cursor = conn.cursor()
+
+        cursor.execute("PRAGMA table_info(chat_interactions)")
+        columns = [column[1] for column in cursor.fetchall()]
+
+        if "normalized_question" in columns:
+            print("✓ La columna 'normalized_question' ya existe en la tabla chat_interactions")
+        else:
+            print("Añadiendo columna 'normalized_question' a la tabla chat_interactions...")
+            cursor.execute("ALTER TABLE chat_interactions ADD COLUMN normalized_question TEXT")
+            conn.commit()
+            print("✓ Columna 'normalized_question' añadida")
+
+        print("Normalizando las preguntas existentes...")
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM chat_interactions")
+        max_id = cursor.fetchone()[0]
+        updated = 0
+        for start in range(0, max_id, BATCH_SIZE):
+            cursor.execute(
+                "UPDATE chat_interactions SET normalized_question = normalize_question(question) "
+                "WHERE id > ? AND id <= ? AND normalized_question IS NULL",
+                (start, start + BATCH_SIZE)
+            )
+            updated += cursor.rowcount
+            conn.commit()
+        print(f"✓ {updated} preguntas normalizadas")
+
+        print("Creando índice (created_at, normalized_question)...")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS ix_chat_interactions_created_normalized "
+            "ON chat_interactions(created_at, normalized_question)"
+        )
+        conn.commit()
+        conn.close()
+
+        print("\n✓ Migración completada exitosamente")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return False
+
+if __name__ == "__main__":
+    print("Ejecutando migración de preguntas normalizadas...")
+    print("=" * 50)
+    success = migrate_normalized_question()
+    print("=" * 50)
+    if success:
+        print("✓ La columna está lista")
+    else:
+        print("❌ La migración falló")
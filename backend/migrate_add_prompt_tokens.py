@@ -0,0 +1,50 @@
+"""Script to add prompt size columns to chat_interactions table"""
+import sqlite3
+from pathlib import Path
+
+def migrate_prompt_tokens():
+    """Add prompt_tokens and context_tokens columns if they don't exist"""
+    db_path = Path(__file__).parent / "knowledge_bot.db"
+    
+    if not db_path.exists():
+        print(f"❌ Base de datos no encontrada en: {db_path}")
+        return False
+    
+    conn = None
+    try:
+        conn = sqlite3.connect(str(db_path))
+        cursor = conn.cursor()
+        
+        cursor.execute("PRAGMA table_info(chat_interactions)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        for column in ("prompt_tokens", "context_tokens"):
+            if column in columns:
+                print(f"✓ La columna '{column}' ya existe en la tabla chat_interactions")
+            else:
+                print(f"Añadiendo columna '{column}' a la tabla chat_interactions...")
+                cursor.execute(f"ALTER TABLE chat_interactions ADD COLUMN {column} INTEGER")
+                print(f"✓ Columna '{column}' añadida")
+        
+        conn.commit()
+        conn.close()
+        
+        print("\n✓ Migración completada exitosamente")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return False
+
+if __name__ == "__main__":
+    print("Ejecutando migración de tamaño de prompt...")
+    print("=" * 50)
+    success = migrate_prompt_tokens()
+    print("=" * 50)
+    if success:
+        print("✓ Todas las columnas están listas")
+    else:
+        print("❌ La migración falló")
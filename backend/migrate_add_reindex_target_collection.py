@@ -0,0 +1,51 @@
+"""Script to add target_collection column to reindex_jobs table"""
+import sqlite3
+from pathlib import Path
+
+def migrate_reindex_target_collection():
+    """Add target_collection column to reindex_jobs if it doesn't exist"""
+    db_path = Path(__file__).parent / "knowledge_bot.db"
+    
+    if not db_path.exists():
+        print(f"❌ Base de datos no encontrada en: {db_path}")
+        return False
+    
+    conn = None
+    try:
+        conn = sqlite3.connect(str(db_path))
+        cursor = conn.cursor()
+        
+        cursor.execute("PRAGMA table_info(reindex_jobs)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if not columns:
+            print("✓ La tabla reindex_jobs no existe todavía; se creará completa al iniciar el backend")
+        elif 'target_collection' in columns:
+            print("✓ La columna 'target_collection' ya existe en la tabla reindex_jobs")
+        else:
+            print("Añadiendo columna 'target_collection' a la tabla reindex_jobs...")
+            cursor.execute("ALTER TABLE reindex_jobs ADD COLUMN target_collection VARCHAR")
+            print("✓ Columna 'target_collection' añadida")
+        
+        conn.commit()
+        conn.close()
+        
+        print("\n✓ Migración completada exitosamente")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return False
+
+if __name__ == "__main__":
+    print("Ejecutando migración de colección de reindexación...")
+    print("=" * 50)
+    success = migrate_reindex_target_collection()
+    print("=" * 50)
+    if success:
+        print("✓ Todas las columnas están listas")
+    else:
+        print("❌ La migración falló")
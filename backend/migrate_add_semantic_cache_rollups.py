@@ -0,0 +1,61 @@
+"""Script to add the semantic cache columns to analytics_rollups table
+
+After running it, run backfill_analytics_rollups.py so past days get their
+exact/semantic split.
+"""
+import sqlite3
+from pathlib import Path
+
+COLUMNS = ("semantic_cache_questions", "semantic_response_time_sum_ms", "semantic_response_time_count")
+
+def migrate_semantic_cache_rollups():
+    """Add semantic cache columns if they don't exist"""
+    db_path = Path(__file__).parent / "knowledge_bot.db"
+
+    if not db_path.exists():
+        print(f"❌ Base de datos no encontrada en: {db_path}")
+        return False
+
+    conn = None
+    try:
+        conn = sqlite3.connect(str(db_path))
+        cursor = conn.cursor()
+
+        cursor.execute("PRAGMA table_info(analytics_rollups)")
+        columns = [column[1] for column in cursor.fetchall()]
+        if not columns:
+            print("✓ La tabla analytics_rollups aún no existe (se creará con todas las columnas)")
+
+        for name in COLUMNS:
+            if not columns:
+                break
+            if name in columns:
+                print(f"✓ La columna '{name}' ya existe en la tabla analytics_rollups")
+            else:
+                print(f"Añadiendo columna '{name}' a la tabla analytics_rollups...")
+                cursor.execute(f"ALTER TABLE analytics_rollups ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0")
+                print(f"✓ Columna '{name}' añadida")
+
+        conn.commit()
+        conn.close()
+
+        print("\n✓ Migración completada exitosamente")
+        print("  Ejecuta backfill_analytics_rollups.py para recalcular los días anteriores")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return False
+
+if __name__ == "__main__":
+    print("Ejecutando migración de resúmenes de caché semántica...")
+    print("=" * 50)
+    success = migrate_semantic_cache_rollups()
+    print("=" * 50)
+    if success:
+        print("✓ Las columnas están listas")
+    else:
+        print("❌ La migración falló")
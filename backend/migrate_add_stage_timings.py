@@ -0,0 +1,49 @@
+"""Script to add the stage_timings column to chat_interactions table"""
+import sqlite3
+from pathlib import Path
+
+def migrate_stage_timings():
+    """Add stage_timings column if it doesn't exist"""
+    db_path = Path(__file__).parent / "knowledge_bot.db"
+
+    if not db_path.exists():
+        print(f"❌ Base de datos no encontrada en: {db_path}")
+        return False
+
+    conn = None
+    try:
+        conn = sqlite3.connect(str(db_path))
+        cursor = conn.cursor()
+
+        cursor.execute("PRAGMA table_info(chat_interactions)")
+        columns = [column[1] for column in cursor.fetchall()]
+
+        if "stage_timings" in columns:
+            print("✓ La columna 'stage_timings' ya existe en la tabla chat_interactions")
+        else:
+            print("Añadiendo columna 'stage_timings' a la tabla chat_interactions...")
+            cursor.execute("ALTER TABLE chat_interactions ADD COLUMN stage_timings TEXT")
+            print("✓ Columna 'stage_timings' añadida")
+
+        conn.commit()
+        conn.close()
+
+        print("\n✓ Migración completada exitosamente")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return False
+
+if __name__ == "__main__":
+    print("Ejecutando migración de tiempos por etapa...")
+    print("=" * 50)
+    success = migrate_stage_timings()
+    print("=" * 50)
+    if success:
+        print("✓ La columna está lista")
+    else:
+        print("❌ La migración falló")
@@ -0,0 +1,61 @@
+"""Script to add the index behind the unused documents report
+
+The anti-join against document_usage_stats already probes its unique
+knowledge_entry_id index; the covering index added here lets the report
+page through knowledge_entries without reading their content.
+"""
+import sqlite3
+from pathlib import Path
+
+INDEXES = {
+    "ix_knowledge_entries_listing":
+        "CREATE INDEX IF NOT EXISTS ix_knowledge_entries_listing "
+        "ON knowledge_entries(id, source, created_at, title)",
+}
+
+def migrate_unused_documents_index():
+    """Create the index if it doesn't exist"""
+    db_path = Path(__file__).parent / "knowledge_bot.db"
+
+    if not db_path.exists():
+        print(f"❌ Base de datos no encontrada en: {db_path}")
+        return False
+
+    conn = None
+    try:
+        conn = sqlite3.connect(str(db_path))
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='index'")
+        existing = {row[0] for row in cursor.fetchall()}
+
+        for name, statement in INDEXES.items():
+            if name in existing:
+                print(f"✓ El índice '{name}' ya existe")
+            else:
+                print(f"Creando índice '{name}'...")
+                cursor.execute(statement)
+                print(f"✓ Índice '{name}' creado")
+
+        conn.commit()
+        conn.close()
+
+        print("\n✓ Migración completada exitosamente")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return False
+
+if __name__ == "__main__":
+    print("Ejecutando migración del índice de documentos sin usar...")
+    print("=" * 50)
+    success = migrate_unused_documents_index()
+    print("=" * 50)
+    if success:
+        print("✓ El índice está listo")
+    else:
+        print("❌ La migración falló")
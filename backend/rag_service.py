@@ -1,8 +1,39 @@
 """RAG service using Gemini API"""
 import google.generativeai as genai
-from typing import List, Dict, Optional
+import asyncio
+import functools
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import List, Dict, Optional, Tuple, AsyncIterator
 from config import settings
-from vector_store import get_vector_store
+from vector_store import get_vector_store, build_where
+from database import get_corpus_version
+from answer_cache import get_answer_cache, get_semantic_cache
+from context_packer import pack_context, count_tokens
+from lexical_index import term_coverage
+from timing import StageTimer
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Answer given without calling Gemini when nothing relevant was retrieved
+NO_CONTEXT_ANSWER = (
+    "No tengo información específica sobre esto en la base de conocimiento. "
+    "Te recomiendo contactar con un supervisor o consultar los documentos oficiales "
+    "de procedimientos para obtener la información exacta que necesitas."
+)
+
+
+class ChatBusyError(RuntimeError):
+    """Raised when no chat slot frees up within settings.chat_queue_timeout_seconds"""
+
+
+async def run_blocking(func, *args):
+    """Run blocking work (ChromaDB, ONNX, SQLite) in the default thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args))
 
 
 class RAGService:
@@ -36,14 +67,84 @@ class RAGService:
         
         if self.model is None:
             raise ValueError("No compatible Gemini model found. Please check your API key and available models.")
+        
+        # Created lazily inside the running event loop (one per worker)
+        self._chat_semaphore = None
+        self.in_flight = 0
+    
+    @asynccontextmanager
+    async def chat_slot(self, timer: Optional[StageTimer] = None):
+        """Limit concurrent chats per worker to settings.max_concurrent_chats
+        
+        The wait for a slot is recorded as the "queue" stage of the timer.
+        """
+        if self._chat_semaphore is None:
+            self._chat_semaphore = asyncio.Semaphore(max(1, settings.max_concurrent_chats))
+        try:
+            with (timer or StageTimer()).stage("queue"):
+                await asyncio.wait_for(self._chat_semaphore.acquire(), timeout=settings.chat_queue_timeout_seconds)
+        except asyncio.TimeoutError:
+            raise ChatBusyError("Too many concurrent chats, try again in a moment")
+        self.in_flight += 1
+        metrics.set_gauge("chats_in_flight", self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            metrics.set_gauge("chats_in_flight", self.in_flight)
+            self._chat_semaphore.release()
     
     def generate_response(
         self, 
         query: str, 
         context_documents: List[str] = None,
-        max_tokens: int = 1000
+        max_tokens: Optional[int] = None
     ) -> str:
-        """Generate response using RAG"""
+        """Generate response using RAG
+        
+        Context documents are packed into settings.context_max_tokens and
+        max_tokens caps the answer (defaults to settings.max_output_tokens).
+        """
+        packed = pack_context(query, context_documents or [])
+        response_text, _, _ = self._generate_response(query, packed["documents"], max_tokens)
+        return response_text
+    
+    @staticmethod
+    def _generation_config(max_tokens: Optional[int] = None) -> Dict:
+        return {"max_output_tokens": max_tokens or settings.max_output_tokens}
+    
+    @staticmethod
+    def _prompt_tokens(response, prompt: str) -> int:
+        """Prompt size reported by Gemini, or estimated when not available"""
+        try:
+            return int(response.usage_metadata.prompt_token_count)
+        except (AttributeError, TypeError, ValueError):
+            return count_tokens(prompt)
+    
+    def _generate_response(
+        self,
+        query: str,
+        context_documents: List[str] = None,
+        max_tokens: Optional[int] = None
+    ) -> Tuple[str, bool, int]:
+        """Generate response using RAG, also reporting whether Gemini succeeded
+        and the prompt size in tokens (None when Gemini was not called)"""
+        if not context_documents:
+            return NO_CONTEXT_ANSWER, True, None
+        
+        prompt = self.build_prompt(query, context_documents)
+        
+        try:
+            with metrics.time("gemini_request_duration_seconds", {"mode": "sync"}):
+                response = self.model.generate_content(prompt, generation_config=self._generation_config(max_tokens))
+                text = response.text
+            return text, True, self._prompt_tokens(response, prompt)
+        except Exception as e:
+            metrics.inc("gemini_errors_total", {"mode": "sync"})
+            return f"Lo siento, hubo un error al generar la respuesta: {str(e)}", False, count_tokens(prompt)
+    
+    def build_prompt(self, query: str, context_documents: List[str] = None) -> str:
+        """Build the Gemini prompt from the question and retrieved documents"""
         # Build context from retrieved documents
         if context_documents:
             context = "\n\n".join([
@@ -83,23 +184,149 @@ Debes responder de manera clara y directa:
 
 NO inventes información, NO uses conocimiento general, NO asumas respuestas."""
         
+        return prompt
+    
+    async def _agenerate_response(
+        self,
+        query: str,
+        context_documents: List[str] = None,
+        max_tokens: Optional[int] = None
+    ) -> Tuple[str, bool, int]:
+        """Async variant of _generate_response (does not block the event loop)"""
+        if not context_documents:
+            return NO_CONTEXT_ANSWER, True, None
+        
+        prompt = self.build_prompt(query, context_documents)
+        
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            with metrics.time("gemini_request_duration_seconds", {"mode": "async"}):
+                response = await self.model.generate_content_async(
+                    prompt, generation_config=self._generation_config(max_tokens)
+                )
+                text = response.text
+            return text, True, self._prompt_tokens(response, prompt)
         except Exception as e:
-            return f"Lo siento, hubo un error al generar la respuesta: {str(e)}"
+            metrics.inc("gemini_errors_total", {"mode": "async"})
+            return f"Lo siento, hubo un error al generar la respuesta: {str(e)}", False, count_tokens(prompt)
+    
+    async def astream_response(
+        self,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        usage: Optional[Dict] = None
+    ) -> AsyncIterator[str]:
+        """Yield Gemini's answer text as it is generated
+        
+        When given, usage["prompt_tokens"] is set once the stream ends (or
+        fails) from the usage metadata of the last chunk Gemini sent.
+        """
+        chunk = None
+        with metrics.time("gemini_request_duration_seconds", {"mode": "stream"}):
+            try:
+                response = await self.model.generate_content_async(
+                    prompt, stream=True, generation_config=self._generation_config(max_tokens)
+                )
+                async for chunk in response:
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        continue  # Chunk without text parts (e.g. safety metadata)
+                    if text:
+                        yield text
+            except Exception:
+                metrics.inc("gemini_errors_total", {"mode": "stream"})
+                raise
+            finally:
+                if usage is not None:
+                    usage["prompt_tokens"] = self._prompt_tokens(chunk, prompt)
     
-    def chat(self, query: str, n_results: int = 5) -> Dict:
-        """Chat with RAG - retrieve relevant documents and generate response"""
-        import logging
-        logger = logging.getLogger(__name__)
+    def _lookup_cache(
+        self,
+        query: str,
+        filters: Optional[Dict] = None,
+        timer: Optional[StageTimer] = None
+    ) -> Tuple[Optional[Dict], Dict]:
+        """Look the question up in the exact and semantic answer caches
+        
+        Returns the cached result (or None) and the cache context needed to
+        store the answer once it has been generated.
+        """
+        # Answers depend on the search filters: only reuse them under the same ones
+        where = build_where(filters)
+        ctx = {
+            "answer_cache": None,
+            "semantic_cache": None,
+            "corpus_version": 0,
+            "query_embedding": None,
+            "scope": json.dumps(where, sort_keys=True) if where else ""
+        }
+        if not settings.answer_cache_enabled:
+            return None, ctx
+        
+        # Serve repeated questions from the answer cache while the corpus is unchanged
+        try:
+            ctx["answer_cache"] = get_answer_cache()
+            ctx["corpus_version"] = get_corpus_version()
+            cached = ctx["answer_cache"].get(query, ctx["corpus_version"], ctx["scope"])
+            metrics.inc("cache_requests_total", {"cache": "answer", "result": "miss" if cached is None else "hit"})
+            if cached is not None:
+                logger.info(f"Answer cache hit for query: '{query}'")
+                cached.update({"cached": True, "cache_status": "exact"})
+                return cached, ctx
+        except Exception as e:
+            logger.warning(f"Answer cache unavailable: {e}")
+            ctx["answer_cache"] = None
+            return None, ctx
+        
+        # Near-duplicate questions: compare question embeddings (the vector is
+        # cached, so the search afterwards does not embed the query again)
+        if settings.semantic_cache_enabled:
+            try:
+                ctx["semantic_cache"] = get_semantic_cache()
+                with (timer or StageTimer()).stage("embedding"):
+                    ctx["query_embedding"] = get_vector_store().embed_query(query)
+                cached = ctx["semantic_cache"].lookup(ctx["query_embedding"], ctx["corpus_version"], ctx["scope"])
+                metrics.inc("cache_requests_total", {"cache": "semantic", "result": "miss" if cached is None else "hit"})
+                if cached is not None:
+                    logger.info(
+                        f"Semantic cache hit for query: '{query}' "
+                        f"(matched '{cached.get('matched_question')}', distance={cached.get('semantic_distance')})"
+                    )
+                    cached.update({"cached": True, "cache_status": "semantic"})
+                    return cached, ctx
+            except Exception as e:
+                logger.warning(f"Semantic cache unavailable: {e}")
+                ctx["semantic_cache"] = None
         
+        return None, ctx
+    
+    def _store_in_cache(self, query: str, ctx: Dict, result: Dict):
+        """Remember a generated answer in the answer caches"""
+        if ctx["answer_cache"] is None:
+            return
+        ctx["answer_cache"].set(query, ctx["corpus_version"], result, ctx["scope"])
+        if ctx["semantic_cache"] is not None and ctx["query_embedding"] is not None:
+            ctx["semantic_cache"].add(query, ctx["query_embedding"], ctx["corpus_version"], result, ctx["scope"])
+    
+    def _retrieve(
+        self,
+        query: str,
+        n_results: int,
+        filters: Optional[Dict] = None,
+        timer: Optional[StageTimer] = None
+    ) -> List[Dict]:
+        """Retrieve relevant documents from the vector store (optionally filtered)"""
+        timer = timer or StageTimer()
+        with timer.stage("search"):
+            return self._relevance_gate(query, self._search(query, n_results, filters, timer))
+    
+    def _search(self, query: str, n_results: int, filters: Optional[Dict], timer: StageTimer) -> List[Dict]:
         try:
             # Retrieve relevant documents
             vector_store = get_vector_store()
-            search_results = vector_store.search(query, n_results=n_results)
+            search_results = vector_store.search(query, n_results=n_results, filters=filters, timer=timer)
             
-            logger.info(f"Search query: '{query}' - Found {len(search_results)} results")
+            logger.info(f"Search query: '{query}' (filters={filters}) - Found {len(search_results)} results")
             
             # Check if vector store is empty
             try:
@@ -118,15 +345,47 @@ NO inventes información, NO uses conocimiento general, NO asumas respuestas."""
             print(traceback.format_exc())
             raise ValueError(f"Error retrieving documents: {str(e)}") from e
         
-        # Extract documents
-        context_documents = []
-        sources = []
-        source_urls = []  # Collect unique URLs
-        
         if not search_results:
             logger.warning(f"No search results found for query: '{query}'")
             print(f"⚠️  No search results found for query: '{query}'")
         
+        return search_results
+    
+    def _relevance_gate(self, query: str, search_results: List[Dict]) -> List[Dict]:
+        """Drop the results too far from the question
+        
+        The distance threshold only judges what the vector search alone
+        found: when even the best result is farther than
+        settings.relevance_max_distance, only strong lexical matches are
+        kept, i.e. results BM25 found (see lexical_rank) that contain at
+        least settings.relevance_min_term_coverage of the question's terms
+        (exact terms such as order numbers or product codes); one shared
+        common word is not enough. With no context left the canned answer is
+        returned without calling Gemini (see NO_CONTEXT_ANSWER).
+        """
+        if not settings.relevance_gate_enabled or not search_results:
+            return search_results
+        best_distance = min(result.get("distance", 0.0) for result in search_results)
+        if best_distance <= settings.relevance_max_distance:
+            return search_results
+        lexical_results = [
+            result for result in search_results
+            if result.get("lexical_rank") is not None
+            and term_coverage(query, result.get("document") or "") >= settings.relevance_min_term_coverage
+        ]
+        if not lexical_results:
+            logger.info(
+                f"Relevance gate: best distance {best_distance:.4f} > {settings.relevance_max_distance} "
+                f"for query '{query}', answering without Gemini"
+            )
+        return lexical_results
+    
+    def _extract_context(self, search_results: List[Dict]) -> Tuple[List[str], List[Dict], List[Dict]]:
+        """Split search results into context documents, sources and unique URLs"""
+        context_documents = []
+        sources = []
+        source_urls = []  # Collect unique URLs
+        
         for i, result in enumerate(search_results):
             if result["document"]:
                 context_documents.append(result["document"])
@@ -146,9 +405,63 @@ NO inventes información, NO uses conocimiento general, NO asumas respuestas."""
                             "title": title or "Documento de referencia"
                         })
         
+        return context_documents, sources, source_urls
+    
+    def _pack_context(self, query: str, search_results: List[Dict]) -> Tuple[List[str], List[Dict], List[Dict], Dict]:
+        """Fit the retrieved documents into the prompt's token budget
+        
+        Returns the packed context documents with the sources and URLs of
+        those documents only (results left out of the prompt are not cited
+        nor counted as used).
+        """
+        results = [result for result in search_results if result["document"]]
+        packed = pack_context(query, [result["document"] for result in results])
+        logger.info(
+            f"Context packed: {packed['passages_used']}/{packed['passages_total']} passages, "
+            f"{packed['context_tokens']} tokens, {packed['duplicates_skipped']} duplicates skipped"
+        )
+        _, sources, source_urls = self._extract_context([results[rank] for rank in packed["document_ranks"]])
+        return packed["documents"], sources, source_urls, {"context_tokens": packed["context_tokens"]}
+    
+    def _format_references(self, sources: List[Dict], source_urls: List[Dict]) -> str:
+        """Source links appended to every answer"""
+        references = ""
+        if source_urls:
+            references += "\n\n**Documentos de referencia:**\n"
+            for i, source in enumerate(source_urls, 1):
+                if source["url"]:
+                    references += f"{i}. [{source['title']}]({source['url']})\n"
+        elif sources:
+            # If we have sources but no URLs, still mention them
+            references += "\n\n*Basado en información de la base de conocimiento*"
+        return references
+    
+    def chat(
+        self,
+        query: str,
+        n_results: int = 5,
+        filters: Optional[Dict] = None,
+        timer: Optional[StageTimer] = None
+    ) -> Dict:
+        """Chat with RAG - retrieve relevant documents and generate response
+        
+        The result carries "timing": milliseconds per stage (see timing.STAGES)
+        and total_ms.
+        """
+        timer = timer or StageTimer()
+        with timer.stage("cache"):
+            cached, cache_ctx = self._lookup_cache(query, filters, timer)
+        if cached is not None:
+            return dict(cached, timing=timer.as_dict())
+        
+        search_results = self._retrieve(query, n_results, filters, timer)
+        with timer.stage("prompt"):
+            context_documents, sources, source_urls, prompt_stats = self._pack_context(query, search_results)
+        
         # Generate response
         try:
-            response_text = self.generate_response(query, context_documents)
+            with timer.stage("generation"):
+                response_text, generated, prompt_stats["prompt_tokens"] = self._generate_response(query, context_documents)
         except Exception as e:
             import traceback
             print(f"❌ Error generating response: {str(e)}")
@@ -156,20 +469,143 @@ NO inventes información, NO uses conocimiento general, NO asumas respuestas."""
             raise ValueError(f"Error generating response: {str(e)}") from e
         
         # Append source links to the response
-        if source_urls:
-            response_text += "\n\n**Documentos de referencia:**\n"
-            for i, source in enumerate(source_urls, 1):
-                if source["url"]:
-                    response_text += f"{i}. [{source['title']}]({source['url']})\n"
-        elif sources:
-            # If we have sources but no URLs, still mention them
-            response_text += "\n\n*Basado en información de la base de conocimiento*"
+        response_text += self._format_references(sources, source_urls)
         
-        return {
+        result = {
             "response": response_text,
             "sources": sources,
             "context_count": len(context_documents)
         }
+        
+        # Gemini errors are returned to the user but never cached
+        if generated:
+            with timer.stage("cache"):
+                self._store_in_cache(query, cache_ctx, result)
+        
+        return dict(result, cached=False, cache_status=None, timing=timer.as_dict(), **prompt_stats)
+    
+    async def achat(
+        self,
+        query: str,
+        n_results: int = 5,
+        filters: Optional[Dict] = None,
+        timer: Optional[StageTimer] = None
+    ) -> Dict:
+        """Async chat: blocking retrieval runs in the thread pool, Gemini is awaited
+        
+        The result carries "timing" like chat(); pass the request's timer to
+        include the time spent waiting for a chat slot.
+        """
+        timer = timer or StageTimer()
+        with timer.stage("cache"):
+            cached, cache_ctx = await run_blocking(self._lookup_cache, query, filters, timer)
+        if cached is not None:
+            return dict(cached, timing=timer.as_dict())
+        
+        search_results = await run_blocking(self._retrieve, query, n_results, filters, timer)
+        with timer.stage("prompt"):
+            context_documents, sources, source_urls, prompt_stats = self._pack_context(query, search_results)
+        
+        with timer.stage("generation"):
+            response_text, generated, prompt_stats["prompt_tokens"] = await self._agenerate_response(query, context_documents)
+        response_text += self._format_references(sources, source_urls)
+        
+        result = {
+            "response": response_text,
+            "sources": sources,
+            "context_count": len(context_documents)
+        }
+        
+        # Gemini errors are returned to the user but never cached
+        if generated:
+            with timer.stage("cache"):
+                await run_blocking(self._store_in_cache, query, cache_ctx, result)
+        
+        return dict(result, cached=False, cache_status=None, timing=timer.as_dict(), **prompt_stats)
+    
+    async def achat_stream(
+        self,
+        query: str,
+        n_results: int = 5,
+        filters: Optional[Dict] = None,
+        timer: Optional[StageTimer] = None
+    ) -> AsyncIterator[Dict]:
+        """Chat with RAG, yielding events as the answer is produced
+        
+        Events are dicts with "event" and "data":
+        - "sources": retrieved sources and context_count, before generation
+        - "token": a piece of answer text
+        - "done": the complete result (as returned by chat) plus "timing",
+          which also has first_token_ms
+        """
+        timer = timer or StageTimer()
+        
+        with timer.stage("cache"):
+            cached, cache_ctx = await run_blocking(self._lookup_cache, query, filters, timer)
+        if cached is not None:
+            yield {"event": "sources", "data": {
+                "sources": cached.get("sources", []),
+                "context_count": cached.get("context_count", 0),
+                "cached": True
+            }}
+            yield {"event": "token", "data": {"text": cached["response"]}}
+            timing = timer.as_dict({"first_token_ms": timer.elapsed_ms()})
+            yield {"event": "done", "data": dict(cached, timing=timing)}
+            return
+        
+        search_results = await run_blocking(self._retrieve, query, n_results, filters, timer)
+        with timer.stage("prompt"):
+            context_documents, sources, source_urls, prompt_stats = self._pack_context(query, search_results)
+            prompt = self.build_prompt(query, context_documents) if context_documents else None
+        prompt_stats["prompt_tokens"] = None
+        
+        yield {"event": "sources", "data": {
+            "sources": sources,
+            "context_count": len(context_documents),
+            "cached": False
+        }}
+        
+        pieces = []
+        first_token_ms = None
+        generated = True
+        with timer.stage("generation"):
+            try:
+                if prompt is None:
+                    # Nothing relevant retrieved: canned answer, no Gemini call
+                    first_token_ms = timer.elapsed_ms()
+                    pieces.append(NO_CONTEXT_ANSWER)
+                    yield {"event": "token", "data": {"text": NO_CONTEXT_ANSWER}}
+                else:
+                    async for text in self.astream_response(prompt, usage=prompt_stats):
+                        if first_token_ms is None:
+                            first_token_ms = timer.elapsed_ms()
+                        pieces.append(text)
+                        yield {"event": "token", "data": {"text": text}}
+            except Exception as e:
+                logger.error(f"❌ Error streaming response: {str(e)}")
+                generated = False
+                error_text = f"Lo siento, hubo un error al generar la respuesta: {str(e)}"
+                if not pieces:
+                    pieces.append(error_text)
+                    yield {"event": "token", "data": {"text": error_text}}
+        
+        references = self._format_references(sources, source_urls)
+        if references:
+            yield {"event": "token", "data": {"text": references}}
+        
+        result = {
+            "response": "".join(pieces) + references,
+            "sources": sources,
+            "context_count": len(context_documents)
+        }
+        if generated:
+            with timer.stage("cache"):
+                await run_blocking(self._store_in_cache, query, cache_ctx, result)
+        
+        timing = timer.as_dict({
+            "first_token_ms": first_token_ms if first_token_ms is not None else timer.elapsed_ms()
+        })
+        yield {"event": "done", "data": dict(result, cached=False, cache_status=None, timing=timing, **prompt_stats)}
 
 
 # Global RAG service instance
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Script para reindexar todo el conocimiento de SQLite en ChromaDB
+
+Reanuda automáticamente una reindexación interrumpida. No hace falta
+detener el backend: cada entrada se reemplaza en el sitio.
+"""
+
+import sys
+import os
+import argparse
+
+# Añadir el directorio actual al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Patch SQLite antes de cualquier otra importación
+import sqlite_patch
+
+from database import SessionLocal, init_db
+from vector_store import get_vector_store
+from services.reindex_service import ReindexService, ReindexInProgressError
+
+
+def format_duration(seconds) -> str:
+    """Formatear segundos como 1h 02m 03s"""
+    if seconds is None:
+        return "?"
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m {seconds:02d}s"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
+
+
+def mostrar_progreso(status: dict):
+    print(
+        f"  Progreso: {status['processed']}/{status['total']} ({status['percent']}%) | "
+        f"{status['docs_per_second'] or 0} docs/s | ETA {format_duration(status['eta_seconds'])} | "
+        f"errores: {status['failed']}"
+    )
+
+
+def mostrar_estado():
+    """Mostrar el estado de la última reindexación"""
+    db = SessionLocal()
+    try:
+        status = ReindexService(db).get_status()
+    finally:
+        db.close()
+
+    if status is None:
+        print("No se ha ejecutado ninguna reindexación.")
+        return
+    print(f"Reindexación #{status['id']}: {status['status']}")
+    collections = get_vector_store().get_collection_info()
+    print(f"  Colección activa: {collections['active']} ({collections['count']} fragmentos), "
+          f"anterior: {collections['previous'] or '-'}")
+    hnsw = collections["hnsw"]
+    print(f"  HNSW: {hnsw['current']}" + (
+        f" (configurado {hnsw['configured']}, se aplica con --reset)" if hnsw["pending"] else ""
+    ))
+    mostrar_progreso(status)
+    if status["error"]:
+        print(f"  Error: {status['error']}")
+
+
+def revertir() -> bool:
+    """Volver a la colección activa antes de la última reconstrucción"""
+    init_db()
+    try:
+        result = get_vector_store().rollback_collection()
+    except ValueError as e:
+        print(f"❌ {e}")
+        return False
+    print(f"✓ Colección activa: {result['active']} (anterior: {result['previous']})")
+    return True
+
+
+def reindexar(reset: bool = False, batch_size: int = None) -> bool:
+    """Reindexar (o reanudar) todo el conocimiento"""
+    init_db()
+
+    db = SessionLocal()
+    try:
+        service = ReindexService(db)
+        try:
+            job = service.start(reset=reset)
+        except ReindexInProgressError as e:
+            print(f"❌ {e}")
+            return False
+
+        if job.processed:
+            print(f"Reanudando reindexación #{job.id} desde la entrada {job.last_entry_id} "
+                  f"({job.processed}/{job.total} ya indexadas)")
+        else:
+            print(f"Reindexando {job.total} entradas...")
+        if job.target_collection:
+            print(f"Reconstruyendo en la colección {job.target_collection}; "
+                  f"la actual sigue respondiendo hasta el cambio")
+
+        try:
+            status = service.run(job, batch_size=batch_size, on_progress=mostrar_progreso)
+        except KeyboardInterrupt:
+            print("\n⚠️  Reindexación interrumpida. Ejecuta el script de nuevo para reanudarla.")
+            return False
+
+        if status["status"] != "completed":
+            print(f"❌ Error durante la reindexación: {status['error']}")
+            print("   Ejecuta el script de nuevo para reanudarla.")
+            return False
+
+        print(f"\n✓ Reindexación completada:")
+        if job.target_collection:
+            print(f"  - Colección activa: {job.target_collection}")
+        print(f"  - Indexadas: {status['processed'] - status['failed']}")
+        print(f"  - Errores: {status['failed']}")
+        if status["failed_ids"]:
+            print(f"  - Entradas con error: {', '.join(str(entry_id) for entry_id in status['failed_ids'][:50])}")
+        return True
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reindexar el conocimiento de SQLite en ChromaDB")
+    parser.add_argument("--reset", action="store_true",
+                        help="Reconstruir de cero en una colección nueva y activarla al terminar "
+                             "(necesario al cambiar de modelo de embeddings)")
+    parser.add_argument("--rollback", action="store_true",
+                        help="Volver a la colección anterior a la última reconstrucción")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Fragmentos por escritura en ChromaDB")
+    parser.add_argument("--status", action="store_true",
+                        help="Mostrar el estado de la última reindexación")
+    args = parser.parse_args()
+
+    if args.status:
+        mostrar_estado()
+        sys.exit(0)
+
+    if args.rollback:
+        sys.exit(0 if revertir() else 1)
+
+    sys.exit(0 if reindexar(reset=args.reset, batch_size=args.batch_size) else 1)
@@ -0,0 +1,236 @@
+"""Hourly and daily rollups of chat interactions
+
+The analytics endpoints read these tables instead of scanning
+chat_interactions, so their cost depends on the length of the window, not
+on the amount of history. analytics_writer.py applies each batch of
+interactions in the same transaction that inserts them, with additive
+upserts (safe across workers); backfill_analytics_rollups.py rebuilds them
+from chat_interactions.
+"""
+import json
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import (
+    engine, ChatInteraction, AnalyticsRollup, UserActivityRollup, LatencyRollup, StageLatencyRollup
+)
+from timing import STAGE_METRICS, histogram_bucket
+
+ROLLUP_MODELS = (AnalyticsRollup, UserActivityRollup, LatencyRollup, StageLatencyRollup)
+
+GRANULARITIES = ("hour", "day")
+
+ROLLUP_SUMS = (
+    "questions",
+    "no_context_questions",
+    "cached_questions",
+    "response_time_sum_ms",
+    "response_time_count",
+    "cached_response_time_sum_ms",
+    "cached_response_time_count",
+    "semantic_cache_questions",
+    "semantic_response_time_sum_ms",
+    "semantic_response_time_count",
+    "prompt_tokens_sum",
+    "context_tokens_sum",
+    "prompt_tokens_count"
+)
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Start of the hour or day (UTC) that moment falls in"""
+    if granularity == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _max(column, value):
+    # SQLite's scalar max() is NULL if either side is
+    return func.coalesce(func.max(column, value), column, value)
+
+
+def aggregate(interactions: Iterable[Dict]):
+    """Fold interactions (ChatInteraction column values) into rollup rows
+
+    Returns (totals, users, latency, stage_latency): totals by (granularity,
+    bucket_start), [questions, last_question_at] by (granularity,
+    bucket_start, user_id), counts by (granularity, bucket_start, histogram
+    bucket) and counts by (granularity, bucket_start, cached, stage metric,
+    histogram bucket) of the interactions with stage_timings.
+    """
+    totals: Dict[tuple, Dict] = {}
+    users: Dict[tuple, list] = {}
+    latency: Counter = Counter()
+    stage_latency: Counter = Counter()
+    for interaction in interactions:
+        created_at = interaction["created_at"]
+        response_time = interaction.get("response_time_ms")
+        cached = interaction.get("cache_status") is not None
+        semantic = interaction.get("cache_status") == "semantic"
+        prompt_tokens = interaction.get("prompt_tokens")
+        try:
+            stage_timings = json.loads(interaction.get("stage_timings") or "{}")
+        except (TypeError, ValueError):
+            stage_timings = {}
+        stage_buckets = [
+            (metric, histogram_bucket(stage_timings[metric]))
+            for metric in STAGE_METRICS if stage_timings.get(metric) is not None
+        ]
+        for granularity in GRANULARITIES:
+            start = bucket_start(created_at, granularity)
+            row = totals.get((granularity, start))
+            if row is None:
+                row = totals[(granularity, start)] = dict.fromkeys(ROLLUP_SUMS, 0)
+                row["prompt_tokens_max"] = None
+            row["questions"] += 1
+            if not interaction.get("context_count"):
+                row["no_context_questions"] += 1
+            if cached:
+                row["cached_questions"] += 1
+            if semantic:
+                row["semantic_cache_questions"] += 1
+            if response_time is not None:
+                row["response_time_sum_ms"] += response_time
+                row["response_time_count"] += 1
+                if cached:
+                    row["cached_response_time_sum_ms"] += response_time
+                    row["cached_response_time_count"] += 1
+                if semantic:
+                    row["semantic_response_time_sum_ms"] += response_time
+                    row["semantic_response_time_count"] += 1
+                latency[(granularity, start, histogram_bucket(response_time))] += 1
+            for metric, le in stage_buckets:
+                stage_latency[(granularity, start, cached, metric, le)] += 1
+            if prompt_tokens is not None:
+                row["prompt_tokens_sum"] += prompt_tokens
+                row["context_tokens_sum"] += interaction.get("context_tokens") or 0
+                row["prompt_tokens_count"] += 1
+                row["prompt_tokens_max"] = max(row["prompt_tokens_max"] or 0, prompt_tokens)
+
+            user = users.setdefault((granularity, start, interaction["user_id"]), [0, created_at])
+            user[0] += 1
+            user[1] = max(user[1], created_at)
+    return totals, users, latency, stage_latency
+
+
+def add_to_rollups(conn, interactions: Iterable[Dict]):
+    """Add interactions to the rollups (call inside the transaction that inserts them)"""
+    totals, users, latency, stage_latency = aggregate(interactions)
+    if not totals:
+        return
+    now = datetime.utcnow()
+
+    table = AnalyticsRollup.__table__
+    upsert = sqlite_insert(table)
+    set_ = {name: table.c[name] + upsert.excluded[name] for name in ROLLUP_SUMS}
+    set_["prompt_tokens_max"] = _max(table.c.prompt_tokens_max, upsert.excluded.prompt_tokens_max)
+    set_["updated_at"] = upsert.excluded.updated_at
+    conn.execute(
+        upsert.on_conflict_do_update(index_elements=[table.c.granularity, table.c.bucket_start], set_=set_),
+        [
+            dict(row, granularity=granularity, bucket_start=start, updated_at=now)
+            for (granularity, start), row in totals.items()
+        ]
+    )
+
+    table = UserActivityRollup.__table__
+    upsert = sqlite_insert(table)
+    conn.execute(
+        upsert.on_conflict_do_update(
+            index_elements=[table.c.granularity, table.c.bucket_start, table.c.user_id],
+            set_={
+                "questions": table.c.questions + upsert.excluded.questions,
+                "last_question_at": _max(table.c.last_question_at, upsert.excluded.last_question_at)
+            }
+        ),
+        [
+            {
+                "granularity": granularity,
+                "bucket_start": start,
+                "user_id": user_id,
+                "questions": questions,
+                "last_question_at": last_question_at
+            }
+            for (granularity, start, user_id), (questions, last_question_at) in users.items()
+        ]
+    )
+
+    if latency:
+        table = LatencyRollup.__table__
+        upsert = sqlite_insert(table)
+        conn.execute(
+            upsert.on_conflict_do_update(
+                index_elements=[table.c.granularity, table.c.bucket_start, table.c.le],
+                set_={"count": table.c.count + upsert.excluded.count}
+            ),
+            [
+                {"granularity": granularity, "bucket_start": start, "le": le, "count": count}
+                for (granularity, start, le), count in latency.items()
+            ]
+        )
+
+    if stage_latency:
+        table = StageLatencyRollup.__table__
+        upsert = sqlite_insert(table)
+        conn.execute(
+            upsert.on_conflict_do_update(
+                index_elements=[table.c.granularity, table.c.bucket_start, table.c.cached, table.c.metric, table.c.le],
+                set_={"count": table.c.count + upsert.excluded.count}
+            ),
+            [
+                {
+                    "granularity": granularity,
+                    "bucket_start": start,
+                    "cached": cached,
+                    "metric": metric,
+                    "le": le,
+                    "count": count
+                }
+                for (granularity, start, cached, metric, le), count in stage_latency.items()
+            ]
+        )
+
+
+def rebuild(since: Optional[datetime] = None, batch_size: int = 5000) -> int:
+    """Recompute the rollups from chat_interactions (from the day of since, or everything)
+
+    Runs in one write transaction, so interactions recorded meanwhile wait
+    (the analytics writer retries) and are counted exactly once. Returns the
+    number of interactions rolled up.
+    """
+    since = bucket_start(since, "day") if since else None
+    chats = ChatInteraction.__table__
+    query = select(
+        chats.c.id,
+        chats.c.user_id,
+        chats.c.response_time_ms,
+        chats.c.context_count,
+        chats.c.cache_status,
+        chats.c.prompt_tokens,
+        chats.c.context_tokens,
+        chats.c.stage_timings,
+        chats.c.created_at
+    ).where(chats.c.created_at.isnot(None)).order_by(chats.c.id).limit(batch_size)
+    if since:
+        query = query.where(chats.c.created_at >= since)
+
+    processed = 0
+    last_id = 0
+    with engine.begin() as conn:
+        # Deleting first takes the write lock before anything is read
+        for model in ROLLUP_MODELS:
+            delete = model.__table__.delete()
+            if since:
+                delete = delete.where(model.__table__.c.bucket_start >= since)
+            conn.execute(delete)
+
+        while True:
+            batch = conn.execute(query.where(chats.c.id > last_id)).mappings().all()
+            if not batch:
+                break
+            add_to_rollups(conn, batch)
+            processed += len(batch)
+            last_id = batch[-1]["id"]
+    return processed
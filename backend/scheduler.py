@@ -6,7 +6,9 @@ from datetime import datetime
 from database import SessionLocal, User
 from services.knowledge_service import KnowledgeService
 from config import settings
+from metrics import metrics
 import logging
+import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,6 +20,8 @@ def sync_zendesk_automatic():
     """Automatic Zendesk synchronization task"""
     logger.info(f"Starting automatic Zendesk sync at {datetime.utcnow()}")
     
+    started = time.perf_counter()
+    outcome = "error"
     db = SessionLocal()
     try:
         # Get first admin user or create a system user
@@ -27,10 +31,13 @@ def sync_zendesk_automatic():
         service = KnowledgeService(db)
         result = service.sync_zendesk(created_by=admin_user_id)
         
+        outcome = "success" if result.get("success") else "failed"
         if result.get("success"):
+            metrics.set_gauge("zendesk_sync_last_success_timestamp_seconds", time.time())
             logger.info(
                 f"Zendesk sync completed: {result.get('added')} added, "
-                f"{result.get('updated')} updated, {result.get('errors')} errors"
+                f"{result.get('updated')} updated, {result.get('unchanged')} unchanged, "
+                f"{result.get('errors')} errors"
             )
         else:
             logger.error(f"Zendesk sync failed: {result.get('error')}")
@@ -41,6 +48,8 @@ def sync_zendesk_automatic():
         traceback.print_exc()
     finally:
         db.close()
+        metrics.observe("zendesk_sync_duration_seconds", time.perf_counter() - started)
+        metrics.inc("zendesk_sync_total", {"outcome": outcome})
 
 def setup_zendesk_scheduler(enabled: bool = False, hour: int = 2, minute: int = 0):
     """Setup automatic Zendesk synchronization scheduler
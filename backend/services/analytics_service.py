@@ -0,0 +1,454 @@
+"""Analytics dashboard service (supervisor/admin reports)"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func, desc, and_, or_, select, text, Integer, cast
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from config import settings
+from cache import TTLCache
+from database import (
+    read_snapshot, User, KnowledgeEntry, ChatInteraction, DocumentUsageStats,
+    AnalyticsRollup, UserActivityRollup, LatencyRollup, StageLatencyRollup
+)
+from rollups import bucket_start
+from timing import histogram, histogram_percentile
+
+# Days shown by the questions-by-day chart of the dashboard
+DASHBOARD_TREND_DAYS = 7
+
+# Largest page of the unused documents report
+UNUSED_DOCUMENTS_MAX_LIMIT = 500
+
+# Dashboards per (days, limit), shared by the requests of this worker
+_dashboard_cache = TTLCache(max_size=32, ttl_seconds=settings.analytics_dashboard_cache_seconds)
+
+
+class AnalyticsService:
+    """Queries behind the /api/analytics reports"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def overview(self, days: int = 30) -> Dict:
+        """Totals over the last days (from the hourly rollups: the window starts at the top of the hour)"""
+        start_date = bucket_start(datetime.utcnow() - timedelta(days=days), "hour")
+        in_window = and_(
+            AnalyticsRollup.granularity == "hour",
+            AnalyticsRollup.bucket_start >= start_date
+        )
+
+        totals = self.db.query(
+            func.coalesce(func.sum(AnalyticsRollup.questions), 0).label('questions'),
+            func.coalesce(func.sum(AnalyticsRollup.no_context_questions), 0).label('no_context_questions'),
+            func.coalesce(func.sum(AnalyticsRollup.cached_questions), 0).label('cached_questions'),
+            func.coalesce(func.sum(AnalyticsRollup.response_time_sum_ms), 0).label('response_time_sum_ms'),
+            func.coalesce(func.sum(AnalyticsRollup.response_time_count), 0).label('response_time_count'),
+            func.coalesce(func.sum(AnalyticsRollup.cached_response_time_sum_ms), 0).label('cached_response_time_sum_ms'),
+            func.coalesce(func.sum(AnalyticsRollup.cached_response_time_count), 0).label('cached_response_time_count'),
+            func.coalesce(func.sum(AnalyticsRollup.prompt_tokens_sum), 0).label('prompt_tokens_sum'),
+            func.coalesce(func.sum(AnalyticsRollup.context_tokens_sum), 0).label('context_tokens_sum'),
+            func.coalesce(func.sum(AnalyticsRollup.prompt_tokens_count), 0).label('prompt_tokens_count'),
+            func.max(AnalyticsRollup.prompt_tokens_max).label('prompt_tokens_max')
+        ).filter(in_window).one()
+
+        total_questions = totals.questions
+
+        # Active users (users who asked at least one question)
+        active_users = self.db.query(func.count(func.distinct(UserActivityRollup.user_id))).filter(
+            UserActivityRollup.granularity == "hour",
+            UserActivityRollup.bucket_start >= start_date
+        ).scalar() or 0
+
+        # Average questions per user
+        avg_questions_per_user = total_questions / active_users if active_users > 0 else 0
+
+        # Total users and knowledge entries
+        total_users = self.db.query(func.count(User.id)).scalar()
+        total_documents = self.db.query(func.count(KnowledgeEntry.id)).scalar()
+
+        # Response time histogram
+        response_time_histogram = histogram([])
+        for le, count in self.db.query(LatencyRollup.le, func.sum(LatencyRollup.count)).filter(
+            LatencyRollup.granularity == "hour",
+            LatencyRollup.bucket_start >= start_date
+        ).group_by(LatencyRollup.le).all():
+            if le in response_time_histogram:
+                response_time_histogram[le] = count
+
+        def average(total, count, digits=2):
+            return round(total / count, digits) if count else 0
+
+        return {
+            "total_questions": total_questions,
+            "active_users": active_users,
+            "total_users": total_users,
+            "avg_questions_per_user": round(avg_questions_per_user, 2),
+            "questions_no_context": totals.no_context_questions,
+            "total_documents": total_documents,
+            "avg_response_time_ms": average(totals.response_time_sum_ms, totals.response_time_count),
+            "response_time_histogram": response_time_histogram,
+            "cached_questions": totals.cached_questions,
+            "cache_hit_rate": round(totals.cached_questions / total_questions, 4) if total_questions > 0 else 0,
+            "avg_cached_response_time_ms": average(
+                totals.cached_response_time_sum_ms, totals.cached_response_time_count
+            ),
+            "avg_prompt_tokens": average(totals.prompt_tokens_sum, totals.prompt_tokens_count, 1),
+            "avg_context_tokens": average(totals.context_tokens_sum, totals.prompt_tokens_count, 1),
+            "max_prompt_tokens": totals.prompt_tokens_max or 0,
+            "period_days": days
+        }
+
+    def questions_by_day(self, days: int = 7) -> List[Dict]:
+        """Questions per day, including days without questions"""
+        end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        start_date = end_date - timedelta(days=days)
+
+        results = self.db.query(
+            AnalyticsRollup.bucket_start,
+            AnalyticsRollup.questions
+        ).filter(
+            AnalyticsRollup.granularity == "day",
+            AnalyticsRollup.bucket_start >= start_date
+        ).all()
+
+        # Fill in missing days with 0
+        date_dict = {row.bucket_start.strftime('%Y-%m-%d'): row.questions for row in results}
+        filled_results = []
+        current = start_date
+
+        while current <= end_date:
+            date_str = current.strftime('%Y-%m-%d')
+            filled_results.append({
+                "date": date_str,
+                "count": date_dict.get(date_str, 0)
+            })
+            current += timedelta(days=1)
+
+        return filled_results
+
+    def cache_by_day(self, days: int = 7) -> List[Dict]:
+        """Answer cache hits (exact/semantic), generated answers and their latency per day"""
+        start_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+
+        results = self.db.query(AnalyticsRollup).filter(
+            AnalyticsRollup.granularity == "day",
+            AnalyticsRollup.bucket_start >= start_date
+        ).order_by(AnalyticsRollup.bucket_start).all()
+
+        def average(total, count):
+            return round(total / count, 2) if count else 0
+
+        by_day = []
+        for row in results:
+            if not row.questions:
+                continue
+            exact = row.cached_questions - row.semantic_cache_questions
+            by_day.append({
+                "date": row.bucket_start.strftime('%Y-%m-%d'),
+                "total": row.questions,
+                "exact": exact,
+                "exact_avg_response_time_ms": average(
+                    row.cached_response_time_sum_ms - row.semantic_response_time_sum_ms,
+                    row.cached_response_time_count - row.semantic_response_time_count
+                ),
+                "semantic": row.semantic_cache_questions,
+                "semantic_avg_response_time_ms": average(
+                    row.semantic_response_time_sum_ms, row.semantic_response_time_count
+                ),
+                "generated": row.questions - row.cached_questions,
+                "generated_avg_response_time_ms": average(
+                    row.response_time_sum_ms - row.cached_response_time_sum_ms,
+                    row.response_time_count - row.cached_response_time_count
+                ),
+                "hit_rate": round(row.cached_questions / row.questions, 4)
+            })
+        return by_day
+
+    def stage_latency(self, days: int = 7, bucket: str = "day", cached: Optional[bool] = None) -> Dict:
+        """p50/p95 per chat pipeline stage over time, with latency histograms
+
+        Estimated from the stage histograms of the rollups (see
+        timing.histogram_percentile). bucket is "hour" or "day"; cached
+        restricts to cache hits (True) or generated answers (False).
+        """
+        period_format = '%Y-%m-%d %H:00' if bucket == "hour" else '%Y-%m-%d'
+        start_date = bucket_start(datetime.utcnow() - timedelta(days=days), bucket)
+
+        query = self.db.query(
+            StageLatencyRollup.bucket_start,
+            StageLatencyRollup.metric,
+            StageLatencyRollup.le,
+            func.sum(StageLatencyRollup.count)
+        ).filter(
+            StageLatencyRollup.granularity == bucket,
+            StageLatencyRollup.bucket_start >= start_date
+        )
+        if cached is not None:
+            query = query.filter(StageLatencyRollup.cached == cached)
+        results = query.group_by(
+            StageLatencyRollup.bucket_start, StageLatencyRollup.metric, StageLatencyRollup.le
+        ).all()
+
+        overall = {}
+        by_period = {}
+        for start, metric, le, count in results:
+            period = by_period.setdefault(start.strftime(period_format), {})
+            for counts in (overall.setdefault(metric, histogram([])), period.setdefault(metric, histogram([]))):
+                if le in counts:
+                    counts[le] += count
+
+        def summary(counts: Dict[str, int], with_histogram: bool = False) -> Dict:
+            result = {
+                "count": sum(counts.values()),
+                "p50_ms": histogram_percentile(counts, 0.50),
+                "p95_ms": histogram_percentile(counts, 0.95)
+            }
+            if with_histogram:
+                result["p99_ms"] = histogram_percentile(counts, 0.99)
+                result["histogram"] = counts
+            return result
+
+        return {
+            "bucket": bucket,
+            "stages": {metric: summary(counts, with_histogram=True) for metric, counts in overall.items()},
+            "timeline": [
+                {
+                    "period": period,
+                    "stages": {metric: summary(counts) for metric, counts in stages.items()}
+                }
+                for period, stages in sorted(by_period.items())
+            ]
+        }
+
+    def top_questions(self, days: int = 30, limit: int = 10) -> List[Dict]:
+        """Most frequent questions
+
+        Counted in SQLite by normalized question (case, accents, punctuation
+        and whitespace folded), showing one of the original phrasings.
+        """
+        start_date = datetime.utcnow() - timedelta(days=days)
+
+        count = func.count(ChatInteraction.id).label('count')
+        results = self.db.query(
+            ChatInteraction.normalized_question,
+            func.min(ChatInteraction.question).label('question'),
+            count
+        ).filter(
+            ChatInteraction.created_at >= start_date,
+            ChatInteraction.normalized_question != ''  # Also skips rows not backfilled yet (NULL)
+        ).group_by(
+            ChatInteraction.normalized_question
+        ).order_by(
+            desc(count)
+        ).limit(limit).all()
+
+        return [
+            {
+                "question": row.question,
+                "normalized_question": row.normalized_question,
+                "count": row.count
+            }
+            for row in results
+        ]
+
+    def top_documents(self, limit: int = 10) -> List[Dict]:
+        """Most consulted knowledge entries"""
+        results = self.db.query(
+            KnowledgeEntry.id,
+            KnowledgeEntry.title,
+            KnowledgeEntry.source,
+            KnowledgeEntry.url,
+            DocumentUsageStats.times_used,
+            DocumentUsageStats.last_used_at
+        ).select_from(
+            DocumentUsageStats
+        ).join(
+            KnowledgeEntry, KnowledgeEntry.id == DocumentUsageStats.knowledge_entry_id
+        ).order_by(
+            desc(DocumentUsageStats.times_used)
+        ).limit(limit).all()
+
+        return [
+            {
+                "id": row.id,
+                "title": row.title,
+                "source": row.source,
+                "url": row.url,
+                "times_used": row.times_used,
+                "last_used_at": row.last_used_at.isoformat() if row.last_used_at else None
+            }
+            for row in results
+        ]
+
+    def top_users(self, days: int = 30, limit: int = 10) -> List[Dict]:
+        """Users who asked the most questions (from the hourly rollups)"""
+        start_date = bucket_start(datetime.utcnow() - timedelta(days=days), "hour")
+
+        counts = self.db.query(
+            UserActivityRollup.user_id,
+            func.sum(UserActivityRollup.questions).label('question_count')
+        ).filter(
+            UserActivityRollup.granularity == "hour",
+            UserActivityRollup.bucket_start >= start_date
+        ).group_by(
+            UserActivityRollup.user_id
+        ).subquery()
+
+        last_activity = select(
+            func.max(UserActivityRollup.last_question_at)
+        ).where(
+            UserActivityRollup.user_id == User.id,
+            UserActivityRollup.granularity == "day"
+        ).correlate(User).scalar_subquery()
+
+        results = self.db.query(
+            User.id,
+            User.username,
+            User.email,
+            User.role,
+            counts.c.question_count,
+            last_activity.label('last_activity')
+        ).join(
+            counts, counts.c.user_id == User.id
+        ).order_by(
+            desc(counts.c.question_count)
+        ).limit(limit).all()
+
+        return [
+            {
+                "id": row.id,
+                "username": row.username,
+                "email": row.email,
+                "role": row.role or 'user',
+                "question_count": row.question_count,
+                "last_activity": row.last_activity.isoformat() if row.last_activity else None
+            }
+            for row in results
+        ]
+
+    def peak_hours(self, days: int = 30) -> List[Dict]:
+        """Questions per hour of day (UTC), all 24 hours"""
+        start_date = bucket_start(datetime.utcnow() - timedelta(days=days), "hour")
+
+        # SQLite uses strftime('%H', datetime_column) to extract hour
+        results = self.db.query(
+            cast(func.strftime('%H', AnalyticsRollup.bucket_start), Integer).label('hour'),
+            func.sum(AnalyticsRollup.questions).label('count')
+        ).filter(
+            AnalyticsRollup.granularity == "hour",
+            AnalyticsRollup.bucket_start >= start_date
+        ).group_by(
+            func.strftime('%H', AnalyticsRollup.bucket_start)
+        ).all()
+
+        # Fill in all 24 hours
+        hour_dict = {int(row.hour): row.count for row in results}
+        return [{"hour": hour, "count": hour_dict.get(hour, 0)} for hour in range(24)]
+
+    def document_sources(self) -> List[Dict]:
+        """Knowledge entries per source"""
+        results = self.db.query(
+            KnowledgeEntry.source,
+            func.count(KnowledgeEntry.id).label('count')
+        ).group_by(
+            KnowledgeEntry.source
+        ).all()
+
+        return [{"source": source, "count": count} for source, count in results]
+
+    def unused_documents(
+        self,
+        after_id: int = 0,
+        limit: int = 50,
+        not_used_since_days: Optional[int] = None
+    ) -> Dict:
+        """Knowledge entries never used (or, with not_used_since_days, not used lately)
+
+        An anti-join against document_usage_stats, one page at a time: pass
+        the returned next_after_id to get the following page. total is only
+        counted for the first page (None for the following ones).
+        """
+        limit = max(1, min(limit, UNUSED_DOCUMENTS_MAX_LIMIT))
+
+        if not_used_since_days:
+            cutoff = datetime.utcnow() - timedelta(days=not_used_since_days)
+            unused = or_(
+                DocumentUsageStats.knowledge_entry_id.is_(None),
+                DocumentUsageStats.last_used_at.is_(None),
+                DocumentUsageStats.last_used_at < cutoff
+            )
+        else:
+            # Tested on the joined (indexed) column: never-used entries need no stats row lookup
+            unused = DocumentUsageStats.knowledge_entry_id.is_(None)
+
+        def unused_entries(*columns):
+            return self.db.query(*columns).select_from(KnowledgeEntry).outerjoin(
+                DocumentUsageStats, DocumentUsageStats.knowledge_entry_id == KnowledgeEntry.id
+            ).filter(unused)
+
+        results = unused_entries(
+            KnowledgeEntry.id,
+            KnowledgeEntry.title,
+            KnowledgeEntry.source,
+            KnowledgeEntry.created_at,
+            DocumentUsageStats.times_used,
+            DocumentUsageStats.last_used_at
+        ).filter(
+            KnowledgeEntry.id > after_id
+        ).order_by(
+            KnowledgeEntry.id
+        ).limit(limit).all()
+
+        return {
+            "items": [
+                {
+                    "id": row.id,
+                    "title": row.title,
+                    "source": row.source,
+                    "created_at": row.created_at.isoformat() if row.created_at else None,
+                    "times_used": row.times_used or 0,
+                    "last_used_at": row.last_used_at.isoformat() if row.last_used_at else None
+                }
+                for row in results
+            ],
+            "total": unused_entries(func.count(KnowledgeEntry.id)).scalar() if not after_id else None,
+            "next_after_id": results[-1].id if len(results) == limit else None
+        }
+
+    def data_version(self) -> Tuple[int, int]:
+        """(last recorded interaction, knowledge base version): changes whenever a panel may change"""
+        row = self.db.execute(text(
+            "SELECT (SELECT COALESCE(MAX(id), 0) FROM chat_interactions), "
+            "(SELECT COALESCE(MAX(version), 0) FROM corpus_version)"
+        )).one()
+        return row[0], row[1]
+
+    def dashboard(self, days: int = 30, limit: int = 10) -> Dict:
+        """Every panel of the analytics page, cached per (days, limit)
+
+        A cached dashboard is reused for settings.analytics_dashboard_cache_seconds
+        unless an interaction was recorded (by any worker) or the knowledge
+        base changed since it was computed.
+        """
+        version = self.data_version()
+        cached = _dashboard_cache.get((days, limit))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        # Every panel reads the same snapshot (tagged with its own version)
+        with read_snapshot() as snapshot:
+            service = AnalyticsService(snapshot)
+            version = service.data_version()
+            dashboard = {
+                "overview": service.overview(days),
+                "questions_by_day": service.questions_by_day(DASHBOARD_TREND_DAYS),
+                "top_questions": service.top_questions(days, limit),
+                "top_documents": service.top_documents(limit),
+                "top_users": service.top_users(days, limit),
+                "peak_hours": service.peak_hours(days),
+                "document_sources": service.document_sources(),
+                "unused_documents": service.unused_documents(limit=limit),
+                "generated_at": datetime.utcnow().isoformat()
+            }
+
+        _dashboard_cache.set((days, limit), (version, dashboard))
+        return dashboard
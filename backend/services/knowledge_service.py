@@ -1,12 +1,46 @@
 """Knowledge base service"""
 from sqlalchemy.orm import Session
 from typing import List, Dict, Optional
-from database import KnowledgeEntry, ImageEntry
-from vector_store import get_vector_store
+from database import KnowledgeEntry, ImageEntry, bump_corpus_version
+from vector_store import get_vector_store, to_timestamp
+from lexical_index import get_lexical_index
 from scrapers import scrape_zendesk_articles, scrape_url_for_knowledge
 from slugify import slugify
+import hashlib
 import json
 
+# Max values per SQL IN (...) list; SQLite allows 999 bound variables by default
+SQL_IN_BATCH_SIZE = 500
+
+
+def filter_fields(source: Optional[str], metadata: Optional[Dict], source_updated_at: Optional[str]) -> Dict:
+    """Fields of an entry that searches can be filtered by (see vector_store.build_where)"""
+    metadata = metadata or {}
+    return {
+        "source": source or "manual",
+        "locale": str(metadata.get("locale") or "").lower(),
+        "section_id": str(metadata.get("section_id") or ""),
+        "source_updated_at": source_updated_at or ""
+    }
+
+
+def compute_content_hash(
+    title: str,
+    content: str,
+    url: Optional[str] = None,
+    filters: Optional[Dict] = None
+) -> str:
+    """Hash of everything that ends up in the vector store for an entry
+
+    filters are the filterable metadata fields (see filter_fields), so
+    metadata-only edits also reindex the entry.
+    """
+    digest = hashlib.sha256()
+    for part in (title or "", content or "", url or "", json.dumps(filters or {}, sort_keys=True)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
 
 class KnowledgeService:
     """Service for managing knowledge base"""
@@ -33,26 +67,18 @@ class KnowledgeService:
             source=source,
             source_id=source_id or slugify(title),
             created_by=created_by,
-            extra_metadata=json.dumps(metadata) if metadata else None
+            extra_metadata=json.dumps(metadata) if metadata else None,
+            source_updated_at=(metadata or {}).get("updated_at")
         )
+        entry.content_hash = self._content_hash(entry)
         
         self.db.add(entry)
         self.db.commit()
         self.db.refresh(entry)
         
         # Add to vector store
-        doc_id = f"{entry.id}_{slugify(title)}"
-        vector_store = get_vector_store()
-        vector_store.add_documents(
-            documents=[content],
-            ids=[doc_id],
-            metadatas=[{
-                "title": title,
-                "source": source,
-                "entry_id": entry.id,
-                "url": url or ""
-            }]
-        )
+        self._index_entry(entry)
+        bump_corpus_version(self.db)
         
         return entry
     
@@ -61,9 +87,14 @@ class KnowledgeService:
         entry_id: int,
         title: Optional[str] = None,
         content: Optional[str] = None,
-        url: Optional[str] = None
+        url: Optional[str] = None,
+        metadata: Optional[Dict] = None
     ) -> Optional[KnowledgeEntry]:
-        """Update a knowledge entry"""
+        """Update a knowledge entry
+        
+        The entry is only re-embedded when its title, content, url or
+        filterable metadata (locale, section, source updated_at) changed.
+        """
         entry = self.db.query(KnowledgeEntry).filter(KnowledgeEntry.id == entry_id).first()
         
         if not entry:
@@ -75,23 +106,21 @@ class KnowledgeService:
             entry.content = content
         if url is not None:
             entry.url = url
+        if metadata is not None:
+            entry.extra_metadata = json.dumps(metadata) if metadata else None
+            entry.source_updated_at = metadata.get("updated_at")
+        
+        new_hash = self._content_hash(entry)
+        needs_reindex = new_hash != entry.content_hash
+        entry.content_hash = new_hash
         
         self.db.commit()
         self.db.refresh(entry)
         
-        # Update vector store
-        doc_id = f"{entry.id}_{slugify(entry.title)}"
-        vector_store = get_vector_store()
-        vector_store.update_document(
-            document=entry.content,
-            doc_id=doc_id,
-            metadata={
-                "title": entry.title,
-                "source": entry.source,
-                "entry_id": entry.id,
-                "url": entry.url or ""
-            }
-        )
+        if needs_reindex:
+            # Re-chunk and replace the entry's vectors
+            self._index_entry(entry)
+            bump_corpus_version(self.db)
         
         return entry
     
@@ -102,17 +131,63 @@ class KnowledgeService:
         if not entry:
             return False
         
-        # Delete from vector store
-        doc_id = f"{entry.id}_{slugify(entry.title)}"
+        # Delete all chunks from vector store
         vector_store = get_vector_store()
-        vector_store.delete_document(doc_id)
+        vector_store.delete_entry(entry.id)
+        get_lexical_index().remove_entry(entry.id)
         
         # Delete from database
         self.db.delete(entry)
         self.db.commit()
+        bump_corpus_version(self.db)
         
         return True
     
+    @staticmethod
+    def _extra_metadata(entry: KnowledgeEntry) -> Dict:
+        try:
+            return json.loads(entry.extra_metadata) if entry.extra_metadata else {}
+        except ValueError:
+            return {}
+    
+    @classmethod
+    def _content_hash(cls, entry: KnowledgeEntry) -> str:
+        """Hash of the entry's indexed text and filterable metadata"""
+        return compute_content_hash(
+            entry.title,
+            entry.content,
+            entry.url,
+            filter_fields(entry.source, cls._extra_metadata(entry), entry.source_updated_at)
+        )
+    
+    @classmethod
+    def _vector_metadata(cls, entry: KnowledgeEntry) -> Dict:
+        """Metadata stored with every chunk of an entry
+        
+        Besides what sources display, it carries the fields searches can be
+        filtered by (see vector_store.build_where); ChromaDB rejects None.
+        """
+        fields = filter_fields(entry.source, cls._extra_metadata(entry), entry.source_updated_at)
+        return {
+            "title": entry.title,
+            "source": fields["source"],
+            "url": entry.url or "",
+            "locale": fields["locale"],
+            "section_id": fields["section_id"],
+            "updated_ts": to_timestamp(entry.source_updated_at) or to_timestamp(entry.updated_at) or 0
+        }
+    
+    def _index_entry(self, entry: KnowledgeEntry) -> int:
+        """Chunk an entry and (re)index it in the vector store and lexical index"""
+        vector_store = get_vector_store()
+        chunk_count = vector_store.index_entry(
+            entry_id=entry.id,
+            content=entry.content,
+            metadata=self._vector_metadata(entry)
+        )
+        get_lexical_index().index_entry(entry.id, entry.content, entry.updated_at)
+        return chunk_count
+    
     def get_entry(self, entry_id: int) -> Optional[KnowledgeEntry]:
         """Get a knowledge entry by ID"""
         return self.db.query(KnowledgeEntry).filter(KnowledgeEntry.id == entry_id).first()
@@ -144,56 +219,165 @@ class KnowledgeService:
         """Sync knowledge base with Zendesk"""
         try:
             articles = scrape_zendesk_articles()
-            added = 0
-            updated = 0
-            errors = 0
             
+            items = []
             for article in articles:
-                try:
-                    # Check if entry exists
-                    existing = self.db.query(KnowledgeEntry)\
-                        .filter(KnowledgeEntry.source == "zendesk")\
-                        .filter(KnowledgeEntry.source_id == article["source_id"])\
-                        .first()
-                    
-                    if existing:
-                        # Update existing
-                        self.update_entry(
-                            existing.id,
-                            title=article["title"],
-                            content=article["content"],
-                            url=article["url"]
-                        )
-                        updated += 1
-                    else:
-                        # Create new
-                        self.add_entry(
-                            title=article["title"],
-                            content=article["content"],
-                            url=article["url"],
-                            source="zendesk",
-                            source_id=article["source_id"],
-                            created_by=created_by,
-                            metadata=json.loads(article["metadata"]) if article["metadata"] else None
-                        )
-                        added += 1
-                except Exception as e:
-                    print(f"Error processing article {article.get('source_id')}: {e}")
-                    errors += 1
+                items.append({
+                    "title": article["title"],
+                    "content": article["content"],
+                    "url": article["url"],
+                    "source_id": article["source_id"],
+                    "metadata": json.loads(article["metadata"]) if article["metadata"] else None
+                })
             
-            return {
-                "success": True,
-                "added": added,
-                "updated": updated,
-                "errors": errors,
-                "total": len(articles)
-            }
+            result = self.bulk_upsert_entries(items, source="zendesk", created_by=created_by)
+            result.update({"success": True, "total": len(articles)})
+            return result
         except Exception as e:
             return {
                 "success": False,
                 "error": str(e)
             }
     
+    def bulk_upsert_entries(
+        self,
+        items: List[Dict],
+        source: str,
+        created_by: Optional[int] = None
+    ) -> Dict:
+        """Insert or update many entries of one source in bulk
+        
+        Existing rows are prefetched in a single query, all row changes are
+        committed in one transaction and only new or changed entries are
+        re-embedded, with batched vector store upserts.
+        
+        Args:
+            items: Dicts with title, content, url, source_id and optional metadata
+            source: Source of every item (e.g. "zendesk")
+            created_by: User recorded on newly created entries
+        
+        Returns:
+            Dict with added, updated, unchanged and errors counts
+        """
+        added = 0
+        updated = 0
+        unchanged = 0
+        errors = 0
+        
+        # Prefetch existing entries (IN lists kept below SQLite's variable limit)
+        source_ids = list({item["source_id"] for item in items if item.get("source_id")})
+        existing_by_source_id = {}
+        for start in range(0, len(source_ids), SQL_IN_BATCH_SIZE):
+            rows = self.db.query(KnowledgeEntry)\
+                .filter(KnowledgeEntry.source == source)\
+                .filter(KnowledgeEntry.source_id.in_(source_ids[start:start + SQL_IN_BATCH_SIZE]))\
+                .all()
+            for entry in rows:
+                existing_by_source_id[entry.source_id] = entry
+        
+        to_index = {}  # Keyed by object identity, an item may repeat in the feed
+        for item in items:
+            try:
+                metadata = item.get("metadata")
+                source_id = item.get("source_id") or slugify(item["title"])
+                entry = existing_by_source_id.get(source_id)
+                
+                if entry is not None:
+                    if self._is_unchanged(entry, item, metadata):
+                        unchanged += 1
+                        continue
+                    
+                    entry.title = item["title"] or entry.title
+                    entry.content = item["content"] or entry.content
+                    entry.url = item.get("url")
+                    if metadata is not None:
+                        entry.extra_metadata = json.dumps(metadata) if metadata else None
+                        entry.source_updated_at = metadata.get("updated_at")
+                    updated += 1
+                else:
+                    entry = KnowledgeEntry(
+                        title=item["title"],
+                        content=item["content"],
+                        url=item.get("url"),
+                        source=source,
+                        source_id=source_id,
+                        created_by=created_by,
+                        extra_metadata=json.dumps(metadata) if metadata else None,
+                        source_updated_at=(metadata or {}).get("updated_at")
+                    )
+                    self.db.add(entry)
+                    existing_by_source_id[source_id] = entry
+                    added += 1
+                
+                entry.content_hash = self._content_hash(entry)
+                to_index[id(entry)] = entry
+            except Exception as e:
+                print(f"Error processing {source} item {item.get('source_id')}: {e}")
+                errors += 1
+        
+        # Assign ids to new rows and snapshot what needs embedding before the
+        # commit expires every instance (avoids one reload query per entry)
+        self.db.flush()
+        snapshot = [
+            (entry.id, entry.content, self._vector_metadata(entry), entry.updated_at)
+            for entry in to_index.values()
+        ]
+        
+        # One transaction for every row change
+        self.db.commit()
+        
+        if snapshot:
+            vector_store = get_vector_store()
+            result = vector_store.index_entries(
+                (entry_id, content, metadata) for entry_id, content, metadata, _ in snapshot
+            )
+            
+            failed_ids = set(result["failed"])
+            if failed_ids:
+                # Forget the hash so the next sync retries these entries
+                failed_list = list(failed_ids)
+                for start in range(0, len(failed_list), SQL_IN_BATCH_SIZE):
+                    self.db.query(KnowledgeEntry)\
+                        .filter(KnowledgeEntry.id.in_(failed_list[start:start + SQL_IN_BATCH_SIZE]))\
+                        .update({KnowledgeEntry.content_hash: None}, synchronize_session=False)
+                self.db.commit()
+                errors += len(failed_ids)
+            
+            lexical_index = get_lexical_index()
+            for entry_id, content, _, updated_at in snapshot:
+                if entry_id not in failed_ids:
+                    lexical_index.index_entry(entry_id, content, updated_at)
+            
+            bump_corpus_version(self.db)
+        
+        return {
+            "added": added,
+            "updated": updated,
+            "unchanged": unchanged,
+            "errors": errors
+        }
+    
+    def _is_unchanged(self, entry: KnowledgeEntry, article: Dict, metadata: Optional[Dict]) -> bool:
+        """Check whether a synced article matches what is already stored"""
+        if not entry.content_hash:
+            return False  # Never hashed (created before hashes existed)
+        
+        source_updated_at = (metadata or {}).get("updated_at")
+        if source_updated_at and source_updated_at == entry.source_updated_at:
+            return True
+        
+        # updated_at moved (or is missing): compare content and filterable
+        # metadata; a moved updated_at alone changes the updated_ts filter field
+        if metadata is None:
+            # Syncs without metadata keep the stored one
+            metadata, source_updated_at = self._extra_metadata(entry), entry.source_updated_at
+        return compute_content_hash(
+            article["title"],
+            article["content"],
+            article.get("url"),
+            filter_fields(entry.source, metadata, source_updated_at)
+        ) == entry.content_hash
+    
     def add_from_url(
         self,
         url: str,
@@ -0,0 +1,309 @@
+"""Resumable full reindex of the knowledge base into the vector store"""
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from typing import Callable, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from database import SessionLocal, KnowledgeEntry, ReindexJob, bump_corpus_version
+from vector_store import get_vector_store
+from embeddings import BatchEmbedder
+from services.knowledge_service import KnowledgeService
+import json
+import threading
+import time
+
+# Entries read per keyset page; the page is fully read before indexing so no
+# SQLite read lock is held while the checkpoint is written
+REINDEX_PAGE_SIZE = 500
+
+# A "running" job whose checkpoint has not moved for this long was killed
+# (pm2 restart, crash) and can be resumed
+STALE_JOB_AFTER = timedelta(minutes=10)
+
+# Failed entry IDs kept in the job row
+MAX_FAILED_IDS = 1000
+
+
+class ReindexInProgressError(RuntimeError):
+    """Raised when another reindex is already running"""
+
+
+def job_to_dict(job: Optional[ReindexJob]) -> Optional[Dict]:
+    """Serialize a job with progress percentage and ETA"""
+    if job is None:
+        return None
+    remaining = max(0, (job.total or 0) - (job.processed or 0))
+    eta_seconds = None
+    if job.status == "running" and job.docs_per_second:
+        eta_seconds = int(remaining / job.docs_per_second)
+    return {
+        "id": job.id,
+        "status": job.status,
+        "reset": bool(job.reset),
+        "total": job.total or 0,
+        "processed": job.processed or 0,
+        "failed": job.failed or 0,
+        "failed_ids": json.loads(job.failed_ids) if job.failed_ids else [],
+        "last_entry_id": job.last_entry_id or 0,
+        "percent": round(100.0 * (job.processed or 0) / job.total, 1) if job.total else 100.0,
+        "docs_per_second": job.docs_per_second,
+        "eta_seconds": eta_seconds,
+        "error": job.error,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+class ReindexService:
+    """Rebuild the vector store from SQLite in checkpointed keyset batches
+
+    Progress is stored in reindex_jobs after every batch, so an interrupted
+    run (Ctrl+C, restart, crash) continues after the last indexed entry.
+    Entries are re-chunked and replaced in place, so the bot keeps answering
+    while the job runs.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_latest_job(self) -> Optional[ReindexJob]:
+        return self.db.query(ReindexJob).order_by(ReindexJob.id.desc()).first()
+
+    def get_status(self) -> Optional[Dict]:
+        """Get the latest job's progress"""
+        return job_to_dict(self.get_latest_job())
+
+    @staticmethod
+    def _is_alive(job: ReindexJob) -> bool:
+        return job.status == "running" and job.updated_at is not None \
+            and job.updated_at > datetime.utcnow() - STALE_JOB_AFTER
+
+    def start(self, reset: bool = False) -> ReindexJob:
+        """Create a job, or take over the last unfinished one
+
+        Args:
+            reset: Rebuild from scratch into a new collection that replaces
+                the live one when complete (needed after changing the
+                embedding model)
+
+        Raises:
+            ReindexInProgressError: Another process is running a reindex
+        """
+        latest = self.get_latest_job()
+        if latest is not None and self._is_alive(latest):
+            raise ReindexInProgressError(f"Reindex job {latest.id} is already running")
+
+        if latest is not None and latest.status != "completed" and not reset:
+            latest.status = "running"
+            latest.error = None
+            latest.finished_at = None
+            job = latest
+        else:
+            if latest is not None and latest.status != "completed":
+                latest.status = "interrupted"
+                if latest.target_collection:
+                    get_vector_store().drop_collection(latest.target_collection)
+            job = ReindexJob(status="running", reset=reset, last_entry_id=0, processed=0, failed=0)
+            if reset:
+                # Rebuild next to the live collection and switch when done
+                job.target_collection = get_vector_store().create_shadow_collection()
+            self.db.add(job)
+
+        # Remaining entries plus what earlier runs of this job already did
+        remaining = self.db.query(KnowledgeEntry.id).filter(KnowledgeEntry.id > (job.last_entry_id or 0)).count()
+        job.total = (job.processed or 0) + remaining
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+
+    def _load_rows(self, *criteria) -> List[Tuple[int, str, Dict]]:
+        """Read (id, content, metadata) of the entries matching criteria, by ID"""
+        return [
+            (row.id, row.content or "", KnowledgeService._vector_metadata(row))
+            for row in self.db.query(
+                KnowledgeEntry.id,
+                KnowledgeEntry.title,
+                KnowledgeEntry.content,
+                KnowledgeEntry.source,
+                KnowledgeEntry.url,
+                KnowledgeEntry.extra_metadata,
+                KnowledgeEntry.source_updated_at,
+                KnowledgeEntry.updated_at
+            )
+            .filter(*criteria)
+            .order_by(KnowledgeEntry.id)
+            .limit(REINDEX_PAGE_SIZE)
+            .yield_per(100)
+        ]
+
+    def run(
+        self,
+        job: ReindexJob,
+        batch_size: Optional[int] = None,
+        on_progress: Optional[Callable[[Dict], None]] = None
+    ) -> Dict:
+        """Index every entry after the job's checkpoint
+
+        Jobs with a target collection (reset) write only there; the live
+        collection keeps serving until the finished one is activated.
+
+        Args:
+            job: Job returned by start()
+            batch_size: Chunks per vector store upsert (defaults to settings)
+            on_progress: Called with the job status after each batch
+
+        Returns:
+            Final job status
+        """
+        vector_store = get_vector_store()
+        target = job.target_collection
+
+        failed_ids: List[int] = json.loads(job.failed_ids) if job.failed_ids else []
+        run_started = time.perf_counter()
+        run_processed = 0
+
+        try:
+            with BatchEmbedder(vector_store.embedding_provider) as embedder:
+                while True:
+                    rows = self._load_rows(KnowledgeEntry.id > (job.last_entry_id or 0))
+                    if not rows:
+                        break
+
+                    result = vector_store.index_entries(
+                        rows, batch_size=batch_size, embedder=embedder, collection_name=target
+                    )
+                    failed_ids.extend(result["failed"])
+                    run_processed += len(rows)
+                    elapsed = time.perf_counter() - run_started
+
+                    job.last_entry_id = rows[-1][0]
+                    job.processed = (job.processed or 0) + len(rows)
+                    job.failed = (job.failed or 0) + len(result["failed"])
+                    job.failed_ids = json.dumps(failed_ids[-MAX_FAILED_IDS:])
+                    job.docs_per_second = round(run_processed / elapsed, 1) if elapsed > 0 else None
+                    job.updated_at = datetime.utcnow()
+                    self.db.commit()
+
+                    if on_progress is not None:
+                        on_progress(job_to_dict(job))
+
+                if target:
+                    failed_ids = self._catch_up(job, target, failed_ids, batch_size, embedder)
+
+            # Vectors of entries deleted meanwhile (and legacy whole-document ones)
+            valid_ids = [entry_id for (entry_id,) in self.db.query(KnowledgeEntry.id).all()]
+            pruned = vector_store.prune_entries(valid_ids, collection_name=target)
+            if pruned:
+                print(f"✓ Reindex job {job.id}: pruned {pruned} stale vectors")
+
+            if target:
+                if failed_ids:
+                    raise RuntimeError(
+                        f"{len(failed_ids)} entries could not be indexed; "
+                        f"collection {target} was not activated"
+                    )
+                vector_store.activate_collection(target)
+                print(f"✓ Reindex job {job.id}: collection {target} is now active")
+
+            job.status = "completed"
+            job.finished_at = datetime.utcnow()
+            self.db.commit()
+            bump_corpus_version(self.db)
+        except KeyboardInterrupt:
+            self.db.rollback()
+            job.status = "interrupted"
+            self.db.commit()
+            raise
+        except Exception as e:
+            self.db.rollback()
+            job.status = "failed"
+            job.error = str(e)
+            self.db.commit()
+            print(f"❌ Reindex job {job.id} failed: {e}")
+
+        return job_to_dict(job)
+
+    def _catch_up(
+        self,
+        job: ReindexJob,
+        target: str,
+        failed_ids: List[int],
+        batch_size: Optional[int],
+        embedder: BatchEmbedder
+    ) -> List[int]:
+        """Re-index into the shadow collection what changed since the job started
+
+        Entries edited after their page was copied, and entries created
+        after the last page was read, only reached the live collection;
+        failed entries get one more try. Returns the IDs that still failed.
+        """
+        retry_ids = set(failed_ids)
+        changed = [
+            entry_id for (entry_id,) in self.db.query(KnowledgeEntry.id)
+            .filter(or_(
+                KnowledgeEntry.updated_at >= job.started_at,
+                KnowledgeEntry.id > (job.last_entry_id or 0)
+            ))
+            .all()
+        ]
+        pending = sorted(retry_ids.union(changed))
+        created = [entry_id for entry_id in pending if entry_id > (job.last_entry_id or 0)]
+
+        still_failed = []
+        for start in range(0, len(pending), REINDEX_PAGE_SIZE):
+            rows = self._load_rows(KnowledgeEntry.id.in_(pending[start:start + REINDEX_PAGE_SIZE]))
+            if not rows:
+                continue
+            result = get_vector_store().index_entries(
+                rows, batch_size=batch_size, embedder=embedder, collection_name=target
+            )
+            still_failed.extend(result["failed"])
+
+        if pending:
+            print(
+                f"✓ Reindex job {job.id}: caught up {len(pending)} entries changed during the rebuild "
+                f"({len(still_failed)} failed)"
+            )
+        if created:
+            job.last_entry_id = created[-1]
+            job.processed = (job.processed or 0) + len(created)
+            job.total = max(job.total or 0, job.processed)
+        job.failed = len(still_failed)
+        job.failed_ids = json.dumps(still_failed[-MAX_FAILED_IDS:])
+        self.db.commit()
+        return still_failed
+
+    def rollback(self) -> Dict:
+        """Switch back to the collection that was active before the last rebuild"""
+        return get_vector_store().rollback_collection()
+
+
+def run_reindex_in_background(reset: bool = False) -> Dict:
+    """Start (or resume) a reindex in a daemon thread of this worker
+
+    Raises:
+        ReindexInProgressError: Another process is running a reindex
+    """
+    db = SessionLocal()
+    try:
+        job = ReindexService(db).start(reset=reset)
+        status = job_to_dict(job)
+        job_id = job.id
+    finally:
+        db.close()
+
+    def worker():
+        thread_db = SessionLocal()
+        try:
+            service = ReindexService(thread_db)
+            final = service.run(thread_db.get(ReindexJob, job_id))
+            marker = "✓" if final["status"] == "completed" else "⚠"
+            print(
+                f"{marker} Reindex job {job_id} {final['status']}: {final['processed']}/{final['total']} entries, "
+                f"{final['failed']} failed"
+            )
+        finally:
+            thread_db.close()
+
+    threading.Thread(target=worker, name=f"reindex-{job_id}", daemon=True).start()
+    return status
@@ -0,0 +1,73 @@
+"""Tests for the write-behind chat analytics"""
+from datetime import datetime
+import pytest
+import analytics_writer as writer_module
+from analytics_writer import AnalyticsWriter
+from database import ChatInteraction, DocumentUsageStats, AnalyticsRollup
+
+
+@pytest.fixture
+def writer(engine, monkeypatch):
+    """Writer flushing into the test database"""
+    monkeypatch.setattr(writer_module, "engine", engine)
+    return AnalyticsWriter()
+
+
+def interaction(question="¿Cuánto tarda un envío?", user_id=1, created_at=datetime(2026, 3, 2, 10, 15), **values):
+    return dict({
+        "user_id": user_id,
+        "question": question,
+        "response_preview": "Tarda cinco días",
+        "response_time_ms": 800,
+        "context_count": 2,
+        "cache_status": None,
+        "prompt_tokens": 900,
+        "context_tokens": 600,
+        "stage_timings": None,
+        "created_at": created_at
+    }, **values)
+
+
+def test_bad_interaction_is_dropped_without_blocking_the_others(writer, db):
+    writer.record_chat(interaction(question="primera"), [7])
+    writer.record_chat(interaction(question="sin usuario", user_id=None), [7])
+    writer.record_chat(interaction(question="tercera"), [7])
+
+    assert writer.flush() == 2
+    assert len(writer) == 0
+    assert sorted(question for (question,) in db.query(ChatInteraction.question)) == ["primera", "tercera"]
+    assert db.query(DocumentUsageStats.times_used).filter_by(knowledge_entry_id=7).scalar() == 2
+
+
+def test_flush_writes_the_batch_and_adds_up_document_usage(writer, db):
+    writer.record_chat(interaction(question="¿Cuánto tarda un envío?"), [7, 8])
+    writer.record_chat(interaction(question="¿CUANTO tarda un envio", created_at=datetime(2026, 3, 2, 11, 0)), [7])
+    assert writer.flush() == 2
+
+    writer.record_chat(interaction(created_at=datetime(2026, 3, 3, 9, 0)), [7])
+    assert writer.flush() == 1
+
+    usage = dict(db.query(DocumentUsageStats.knowledge_entry_id, DocumentUsageStats.times_used))
+    assert usage == {7: 3, 8: 1}
+    last_used = db.query(DocumentUsageStats.last_used_at).filter_by(knowledge_entry_id=7).scalar()
+    assert last_used == datetime(2026, 3, 3, 9, 0)
+    normalized = {value for (value,) in db.query(ChatInteraction.normalized_question)}
+    assert normalized == {"cuanto tarda un envio"}
+
+
+def test_flush_updates_the_rollups_in_the_same_transaction(writer, db):
+    writer.record_chat(interaction(), [])
+    writer.record_chat(interaction(cache_status="exact", prompt_tokens=None, response_time_ms=20), [])
+    writer.flush()
+
+    day = db.query(AnalyticsRollup).filter_by(granularity="day").one()
+    assert (day.questions, day.cached_questions, day.response_time_sum_ms) == (2, 1, 820)
+    assert day.bucket_start == datetime(2026, 3, 2)
+
+
+def test_full_buffer_drops_new_interactions(writer, monkeypatch):
+    monkeypatch.setattr(writer_module.settings, "analytics_buffer_size", 1)
+
+    assert writer.record_chat(interaction(), []) is True
+    assert writer.record_chat(interaction(), []) is False
+    assert len(writer) == 1
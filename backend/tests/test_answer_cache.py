@@ -0,0 +1,56 @@
+"""Tests for the exact answer cache"""
+import pytest
+from config import settings
+from answer_cache import AnswerCache, MemoryAnswerStore, SQLiteAnswerStore
+
+RESULT = {"response": "Tarda cinco días laborables", "sources": [], "context_count": 1}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "answer_cache_backend", request.param)
+    monkeypatch.setattr(settings, "answer_cache_path", str(tmp_path / "answer_cache.db"))
+    return AnswerCache()
+
+
+def test_answers_are_reused_only_for_the_same_corpus_version(cache):
+    cache.set("¿Cuánto tarda un envío?", 3, RESULT)
+
+    assert cache.get("  ¿cuánto TARDA un   envío? ", 3) == RESULT
+    assert cache.get("¿Cuánto tarda un envío?", 4) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_answers_are_reused_only_with_the_same_filters(cache):
+    cache.set("¿Cuánto tarda un envío?", 3, RESULT, scope='{"locale": "es"}')
+
+    assert cache.get("¿Cuánto tarda un envío?", 3) is None
+    assert cache.get("¿Cuánto tarda un envío?", 3, scope='{"locale": "es"}') == RESULT
+
+
+def test_memory_store_evicts_the_least_recently_used():
+    store = MemoryAnswerStore(max_size=2, ttl_seconds=0)
+    store.set("a", 1, {"response": "a"})
+    store.set("b", 1, {"response": "b"})
+    store.get("a")
+    store.set("c", 1, {"response": "c"})
+
+    assert store.get("b") is None
+    assert store.get("a") == {"response": "a"}
+    assert store.size() == 2
+
+
+def test_sqlite_store_prunes_old_versions_and_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(SQLiteAnswerStore, "PRUNE_EVERY", 4)
+    store = SQLiteAnswerStore(str(tmp_path / "answer_cache.db"), max_size=2, ttl_seconds=0)
+    store.set("old", 1, {"response": "old"})
+    store.set("a", 2, {"response": "a"})
+    store.set("b", 2, {"response": "b"})
+    store.get("a")
+    store.set("c", 2, {"response": "c"})  # Fourth write: prunes
+
+    assert store.get("old") is None
+    assert store.get("b") is None
+    assert store.get("a") == {"response": "a"}
+    assert store.get("c") == {"response": "c"}
@@ -0,0 +1,21 @@
+"""Tests for heading/paragraph-aware chunking"""
+from chunking import chunk_text, merge_chunk_texts
+
+
+def test_long_paragraph_chunks_overlap():
+    paragraph = " ".join(
+        f"La frase número {i} describe el envío del pedido con detalle." for i in range(400)
+    )
+    text = f"Envíos\n\n{paragraph}\n\nOtro párrafo corto."
+
+    chunks = chunk_text(text, chunk_size=1000, chunk_overlap=200)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk["text"] == text[chunk["start"]:chunk["end"]]
+        assert len(chunk["text"]) <= 1000
+        assert chunk["heading"] == "Envíos"
+    for previous, following in zip(chunks, chunks[1:]):
+        overlap = previous["end"] - following["start"]
+        assert 0 < overlap <= 200
+    assert merge_chunk_texts(chunks) == text
@@ -0,0 +1,45 @@
+"""Tests for token-budgeted packing of retrieved documents"""
+import pytest
+from config import settings
+from context_packer import pack_context
+
+
+@pytest.fixture(autouse=True)
+def chars_per_token(monkeypatch):
+    monkeypatch.setattr(settings, "context_chars_per_token", 4.0)
+
+
+def paragraph(topic, words=40):
+    return " ".join(f"{topic}{i}" for i in range(words)) + "."
+
+
+def test_stays_within_budget_and_gives_every_document_its_best_passage():
+    first = "\n\n".join([paragraph("relleno"), "Los envíos a Canarias tardan cinco días.", paragraph("otro")])
+    second = "\n\n".join([paragraph("varios"), "Canarias tiene tasas de aduana en los envíos."])
+
+    packed = pack_context("envíos Canarias", [first, second], max_tokens=40)
+
+    assert packed["context_tokens"] <= 40
+    assert packed["documents"] == [
+        "Los envíos a Canarias tardan cinco días.",
+        "Canarias tiene tasas de aduana en los envíos."
+    ]
+    assert packed["document_ranks"] == [0, 1]
+
+
+def test_duplicate_passages_are_skipped():
+    shared = "Las devoluciones se aceptan durante treinta días naturales desde la entrega del pedido."
+    packed = pack_context("devoluciones pedido", [shared, "Cabecera\n\n" + shared], max_tokens=500)
+
+    assert packed["duplicates_skipped"] == 1
+    assert packed["documents"] == [shared, "Cabecera"]
+
+
+def test_documents_without_passages_are_dropped_and_order_is_kept():
+    first = "\n\n".join(["Uno: envíos urgentes.", paragraph("relleno"), "Dos: envíos estándar."])
+    too_long = paragraph("nada", words=100)
+
+    packed = pack_context("envíos", [first, too_long], max_tokens=30)
+
+    assert packed["document_ranks"] == [0]
+    assert packed["documents"] == ["Uno: envíos urgentes.\n\nDos: envíos estándar."]
@@ -0,0 +1,71 @@
+"""Tests for the BM25 lexical index"""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+import lexical_index
+from database import KnowledgeEntry, bump_corpus_version
+from lexical_index import BM25Index, tokenize
+
+
+@pytest.fixture
+def corpus(engine, db, monkeypatch):
+    """Lexical index reading the test database"""
+    monkeypatch.setattr(lexical_index, "SessionLocal", sessionmaker(bind=engine))
+    def get_corpus_version():
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM corpus_version")).scalar()
+
+    monkeypatch.setattr(lexical_index, "get_corpus_version", get_corpus_version)
+    db.add_all([
+        KnowledgeEntry(title="Envíos", content="Los envíos a Canarias tardan cinco días laborables."),
+        KnowledgeEntry(title="Devoluciones", content="Las devoluciones se aceptan durante treinta días."),
+        KnowledgeEntry(title="Aduanas", content="El pedido ES-4521 está retenido en la aduana de Madrid.")
+    ])
+    db.commit()
+    bump_corpus_version(db)
+    return BM25Index()
+
+
+def test_search_is_vector_only_until_the_background_build_is_done(corpus):
+    assert corpus.search("envíos Canarias") == []
+
+    corpus._refresh_thread.join(timeout=10)
+
+    assert corpus.ready
+    assert corpus.search("envíos Canarias")[0][0].startswith("1#")
+
+
+def test_tokenize_folds_case_accents_stopwords_and_plurals():
+    assert tokenize("Los ENVÍOS a Canarias") == ["envio", "canaria"]
+
+
+def test_tokenize_keeps_codes_whole_and_split():
+    assert tokenize("Pedido ES-4521") == ["pedido", "es-4521", "4521"]
+
+
+@pytest.fixture
+def index(monkeypatch):
+    """Index filled by index_entry only, considered up to date"""
+    monkeypatch.setattr(lexical_index, "get_corpus_version", lambda: 0)
+    index = BM25Index()
+    index._corpus_version = 0
+    return index
+
+
+def test_bm25_ranks_rarer_and_denser_matches_first(index):
+    index.index_entry(1, "Plazos de envío a Canarias y Baleares.")
+    index.index_entry(2, "Envío estándar a la península. Envío urgente en 24 horas.")
+    index.index_entry(3, "Devoluciones y reembolsos.")
+
+    hits = index.search("envío Canarias")
+
+    assert [chunk_id for chunk_id, _ in hits] == ["1#0", "2#0"]
+    assert hits[0][1] > hits[1][1] > 0
+
+
+def test_removed_entries_are_not_found(index):
+    index.index_entry(1, "Plazos de envío a Canarias.")
+    index.remove_entry(1)
+
+    assert index.search("Canarias") == []
+    assert index.stats()["terms"] == 0
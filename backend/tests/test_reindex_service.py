@@ -0,0 +1,133 @@
+"""Tests for the resumable reindex into the vector store"""
+import pytest
+from database import KnowledgeEntry
+from services import reindex_service
+from services.reindex_service import ReindexService, ReindexInProgressError
+
+
+class FakeVectorStore:
+    """Records what the reindex writes, per collection"""
+
+    embedding_provider = None
+
+    def __init__(self):
+        self.collections = {}
+        self.active = None
+        self.calls = []
+        self.interrupt_at_call = None
+
+    def create_shadow_collection(self):
+        self.collections["shadow"] = {}
+        return "shadow"
+
+    def drop_collection(self, name):
+        self.collections.pop(name, None)
+
+    def index_entries(self, rows, batch_size=None, embedder=None, collection_name=None):
+        self.calls.append([entry_id for entry_id, _, _ in rows])
+        if len(self.calls) == self.interrupt_at_call:
+            raise KeyboardInterrupt
+        collection = self.collections.setdefault(collection_name, {})
+        for entry_id, content, metadata in rows:
+            collection[entry_id] = content
+        return {"failed": []}
+
+    def prune_entries(self, valid_ids, collection_name=None):
+        return 0
+
+    def activate_collection(self, name):
+        self.active = name
+
+
+@pytest.fixture(autouse=True)
+def small_pages(monkeypatch):
+    monkeypatch.setattr(reindex_service, "REINDEX_PAGE_SIZE", 2)
+
+
+@pytest.fixture
+def vector_store(monkeypatch):
+    store = FakeVectorStore()
+    monkeypatch.setattr(reindex_service, "get_vector_store", lambda: store)
+    return store
+
+
+def add_entries(db, count):
+    entries = [KnowledgeEntry(title=f"Artículo {i}", content=f"Contenido {i}") for i in range(count)]
+    db.add_all(entries)
+    db.commit()
+    return [entry.id for entry in entries]
+
+
+def test_catch_up_indexes_entries_created_after_the_last_page(db, vector_store):
+    ids = add_entries(db, 3)
+    service = ReindexService(db)
+    load_rows = service._load_rows
+    created = []
+
+    def load_rows_then_create(*criteria):
+        rows = load_rows(*criteria)
+        if not rows and not created:
+            # Saved by the bot once the keyset loop had read its last page
+            created.extend(add_entries(db, 1))
+        return rows
+
+    service._load_rows = load_rows_then_create
+    final = service.run(service.start(reset=True))
+
+    assert final["status"] == "completed"
+    assert vector_store.active == "shadow"
+    assert sorted(vector_store.collections["shadow"]) == ids + created
+    assert final["last_entry_id"] == created[0]
+
+
+def test_interrupted_job_resumes_after_its_checkpoint(db, vector_store):
+    ids = add_entries(db, 5)
+    vector_store.interrupt_at_call = 2
+
+    service = ReindexService(db)
+    job = service.start()
+    with pytest.raises(KeyboardInterrupt):
+        service.run(job)
+
+    assert service.get_status()["status"] == "interrupted"
+    assert service.get_status()["last_entry_id"] == ids[1]
+
+    resumed = service.start()
+    assert resumed.id == job.id
+    final = service.run(resumed)
+
+    assert final["status"] == "completed"
+    assert final["processed"] == final["total"] == 5
+    assert vector_store.calls[2:] == [ids[2:4], ids[4:]]
+    assert sorted(vector_store.collections[None]) == ids
+
+
+def test_only_one_job_runs_at_a_time(db, vector_store):
+    add_entries(db, 1)
+    service = ReindexService(db)
+    service.start()
+
+    with pytest.raises(ReindexInProgressError):
+        service.start()
+
+
+def test_catch_up_reindexes_entries_edited_during_the_rebuild(db, vector_store):
+    ids = add_entries(db, 3)
+    service = ReindexService(db)
+    job = service.start(reset=True)
+    index_entries = vector_store.index_entries
+
+    def edit_first_entry(rows, **kwargs):
+        result = index_entries(rows, **kwargs)
+        if len(vector_store.calls) == 2:
+            # Edited by an admin after its page was copied to the shadow collection
+            entry = db.get(KnowledgeEntry, ids[0])
+            entry.content = "Contenido editado"
+            db.commit()
+        return result
+
+    vector_store.index_entries = edit_first_entry
+    service.run(job)
+
+    assert vector_store.collections["shadow"][ids[0]] == "Contenido editado"
+    assert vector_store.active == "shadow"
@@ -0,0 +1,43 @@
+"""Tests for the relevance gate in front of Gemini"""
+import pytest
+from config import settings
+from rag_service import RAGService
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(settings, "relevance_gate_enabled", True)
+    monkeypatch.setattr(settings, "relevance_max_distance", 0.65)
+    monkeypatch.setattr(settings, "relevance_min_term_coverage", 0.6)
+    # The gate needs no Gemini model
+    return RAGService.__new__(RAGService)
+
+
+def result(document, distance, lexical_rank=None):
+    return {"document": document, "metadata": {}, "distance": distance, "lexical_rank": lexical_rank}
+
+
+def test_close_results_pass(service):
+    results = [result("Plazos de envío a Canarias", 0.30), result("Devoluciones", 0.70)]
+
+    assert service._relevance_gate("plazos de envío", results) == results
+
+
+def test_weak_lexical_hit_does_not_pass_far_results(service):
+    # Only "código" is shared with the question: not enough to call Gemini
+    results = [
+        result("Introduce el código de descuento en el carrito", 0.82, lexical_rank=0),
+        result("Política de devoluciones", 0.85),
+        result("Horario del almacén", 0.88),
+        result("Tarifas de transporte", 0.90),
+        result("Cambio de dirección de envío", 0.91)
+    ]
+
+    assert service._relevance_gate("receta de tortilla con código", results) == []
+
+
+def test_strong_lexical_hit_passes_far_results(service):
+    matched = result("El pedido ES-4521 está retenido en aduana", 0.80, lexical_rank=0)
+    results = [matched, result("Horario del almacén", 0.85, lexical_rank=3), result("Tarifas", 0.9)]
+
+    assert service._relevance_gate("pedido ES-4521 retenido", results) == [matched]
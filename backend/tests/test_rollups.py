@@ -0,0 +1,76 @@
+"""Tests for the hourly and daily analytics rollups"""
+import json
+from datetime import datetime
+import rollups
+from database import ChatInteraction, AnalyticsRollup, UserActivityRollup, LatencyRollup, StageLatencyRollup
+from rollups import aggregate, rebuild
+
+
+def interaction(created_at, user_id=1, **values):
+    return dict({
+        "user_id": user_id,
+        "question": "¿Cuánto tarda un envío?",
+        "response_time_ms": 800,
+        "context_count": 2,
+        "cache_status": None,
+        "prompt_tokens": 900,
+        "context_tokens": 600,
+        "stage_timings": None,
+        "created_at": created_at
+    }, **values)
+
+
+def test_aggregate_sums_per_hour_and_day():
+    totals, users, latency, stage_latency = aggregate([
+        interaction(datetime(2026, 3, 2, 10, 5)),
+        interaction(datetime(2026, 3, 2, 10, 40), user_id=2, cache_status="semantic",
+                    response_time_ms=30, prompt_tokens=None, context_count=0),
+        interaction(datetime(2026, 3, 2, 11, 0), prompt_tokens=1500)
+    ])
+
+    day = totals[("day", datetime(2026, 3, 2))]
+    assert day["questions"] == 3
+    assert day["cached_questions"] == day["semantic_cache_questions"] == 1
+    assert day["no_context_questions"] == 1
+    assert day["response_time_sum_ms"] == 1630
+    assert (day["prompt_tokens_sum"], day["prompt_tokens_count"], day["prompt_tokens_max"]) == (2400, 2, 1500)
+    assert totals[("hour", datetime(2026, 3, 2, 10))]["questions"] == 2
+    assert totals[("hour", datetime(2026, 3, 2, 11))]["questions"] == 1
+
+    assert users[("day", datetime(2026, 3, 2), 1)] == [2, datetime(2026, 3, 2, 11, 0)]
+    assert latency[("day", datetime(2026, 3, 2), "<=1000")] == 2
+    assert latency[("day", datetime(2026, 3, 2), "<=50")] == 1
+    assert not stage_latency
+
+
+def test_aggregate_buckets_sampled_stage_timings():
+    timings = json.dumps({"search_ms": 40, "generation_ms": 700, "total_ms": 760})
+    _, _, _, stage_latency = aggregate([interaction(datetime(2026, 3, 2, 10, 5), stage_timings=timings)])
+
+    assert stage_latency[("day", datetime(2026, 3, 2), False, "search_ms", "<=50")] == 1
+    assert stage_latency[("day", datetime(2026, 3, 2), False, "generation_ms", "<=1000")] == 1
+    assert stage_latency[("hour", datetime(2026, 3, 2, 10), False, "total_ms", "<=1000")] == 1
+
+
+def test_rebuild_matches_the_incremental_rollups(engine, db, monkeypatch):
+    monkeypatch.setattr(rollups, "engine", engine)
+    rows = [interaction(datetime(2026, 3, day, hour)) for day in (1, 2) for hour in (9, 15)]
+    with engine.begin() as conn:
+        conn.execute(ChatInteraction.__table__.insert(), rows)
+        rollups.add_to_rollups(conn, rows)
+
+    def snapshot():
+        return {
+            model.__tablename__: sorted(
+                tuple(getattr(row, column.name) for column in model.__table__.columns
+                      if column.name not in ("id", "updated_at"))
+                for row in db.query(model)
+            )
+            for model in (AnalyticsRollup, UserActivityRollup, LatencyRollup, StageLatencyRollup)
+        }
+
+    incremental = snapshot()
+    db.expire_all()
+    assert rebuild(batch_size=3) == 4
+    assert snapshot() == incremental
+    assert db.query(AnalyticsRollup).filter_by(granularity="day").count() == 2
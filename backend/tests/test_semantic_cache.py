@@ -0,0 +1,46 @@
+"""Tests for the semantic (near-duplicate question) answer cache"""
+import math
+from answer_cache import SemanticAnswerCache
+
+RESULT = {"response": "Tarda cinco días laborables", "sources": [], "context_count": 1}
+
+
+def at_angle(degrees):
+    """Unit vector whose cosine distance to [1, 0] is 1 - cos(degrees)"""
+    radians = math.radians(degrees)
+    return [math.cos(radians), math.sin(radians)]
+
+
+def cache(threshold=0.08):
+    semantic = SemanticAnswerCache(max_size=10, ttl_seconds=0, threshold=threshold)
+    semantic.add("¿Cuánto tarda un envío?", [1.0, 0.0], 3, RESULT)
+    return semantic
+
+
+def test_questions_within_the_threshold_reuse_the_answer():
+    cached = cache().lookup(at_angle(20), 3)  # Distance 0.06
+
+    assert cached["response"] == RESULT["response"]
+    assert cached["matched_question"] == "¿Cuánto tarda un envío?"
+    assert 0.05 < cached["semantic_distance"] < 0.07
+
+
+def test_questions_beyond_the_threshold_miss():
+    semantic = cache()
+
+    assert semantic.lookup(at_angle(30), 3) is None  # Distance 0.13
+    assert semantic.stats()["misses"] == 1
+
+
+def test_other_corpus_versions_and_filters_miss():
+    semantic = cache()
+
+    assert semantic.lookup([1.0, 0.0], 4) is None
+    assert semantic.lookup([1.0, 0.0], 3, scope='{"locale": "es"}') is None
+
+
+def test_adding_under_a_new_corpus_version_drops_older_answers():
+    semantic = cache()
+    semantic.add("¿Dónde está mi pedido?", [0.0, 1.0], 4, RESULT)
+
+    assert semantic.stats()["size"] == 1
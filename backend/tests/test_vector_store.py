@@ -0,0 +1,54 @@
+"""Tests for hybrid result fusion in the vector store"""
+import pytest
+from config import settings
+from vector_store import VectorStore
+
+
+class FakeCollection:
+    """Answers collection.get() for chunks only the lexical search found"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def get(self, ids, where=None, include=None):
+        found = [chunk_id for chunk_id in ids if chunk_id in self.chunks]
+        return {
+            "ids": found,
+            "documents": [self.chunks[chunk_id]["document"] for chunk_id in found],
+            "metadatas": [self.chunks[chunk_id]["metadata"] for chunk_id in found],
+            "embeddings": [self.chunks[chunk_id]["embedding"] for chunk_id in found]
+        }
+
+
+def hit(chunk_id, distance):
+    return {"id": chunk_id, "document": chunk_id, "metadata": {"entry_id": int(chunk_id.split("#")[0])}, "distance": distance}
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(settings, "rrf_k", 60)
+    # No ChromaDB: the active collection is a fake one
+    monkeypatch.setattr(VectorStore, "collection", FakeCollection({
+        "9#0": {"document": "Pedido ES-4521", "metadata": {"entry_id": 9}, "embedding": [0.0, 1.0]}
+    }))
+    return VectorStore.__new__(VectorStore)
+
+
+def test_rrf_favours_chunks_found_by_both_rankings(store):
+    dense = [hit("1#0", 0.2), hit("2#0", 0.3), hit("3#0", 0.4)]
+    lexical = [("3#0", 9.0), ("1#0", 4.0)]
+
+    fused = store._fuse_hits(dense, lexical, [1.0, 0.0], n_chunks=3)
+
+    assert [item["id"] for item in fused] == ["1#0", "3#0", "2#0"]
+    assert fused[0]["rrf_score"] == round(1 / 61 + 1 / 62, 6)
+    assert [item["lexical_rank"] for item in fused] == [1, 0, None]
+
+
+def test_lexical_only_chunks_are_fetched_with_their_real_distance(store):
+    fused = store._fuse_hits([hit("1#0", 0.2)], [("9#0", 7.5)], [1.0, 0.0], n_chunks=2)
+
+    fetched = next(item for item in fused if item["id"] == "9#0")
+    assert fetched["document"] == "Pedido ES-4521"
+    assert fetched["distance"] == pytest.approx(1.0)
+    assert fetched["lexical_rank"] == 0
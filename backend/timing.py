@@ -0,0 +1,107 @@
+"""Per-stage timing of a chat request"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Stages of the chat pipeline, in order:
+# - queue: waiting for a chat slot (see RAGService.chat_slot)
+# - cache: answer cache lookup and store
+# - embedding: embedding the question (cache misses of the query embedding cache)
+# - search: vector and BM25 search, fusion and collapsing
+# - prompt: context extraction and token-budgeted packing
+# - generation: Gemini (or the canned no-context answer)
+# - record: queueing the analytics writes (see analytics_writer.py)
+STAGES = ("queue", "cache", "embedding", "search", "prompt", "generation", "record")
+
+# Keys of a request's timing (see StageTimer.as_dict) reported by the stage latency analytics
+STAGE_METRICS = tuple(f"{stage}_ms" for stage in STAGES) + ("first_token_ms", "total_ms")
+
+
+class StageTimer:
+    """Accumulate exclusive wall-clock milliseconds per stage of one request
+
+    Stages may nest: time spent in an inner stage (e.g. embedding while
+    looking up the semantic cache) counts only for the inner one, so the
+    stages add up to the total. A request's stages run one after another,
+    even when they hop to the thread pool, so one stack is enough.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self._stack: List[List[float]] = []  # [start, time spent in nested stages]
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        frame = [time.perf_counter(), 0.0]
+        with self._lock:
+            self._stack.append(frame)
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - frame[0]) * 1000
+            with self._lock:
+                self._stack.remove(frame)
+                if self._stack:
+                    self._stack[-1][1] += elapsed
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed - frame[1]
+
+    def add(self, name: str, milliseconds: float):
+        """Record time measured elsewhere"""
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + milliseconds
+
+    def elapsed_ms(self) -> int:
+        return int((time.perf_counter() - self.started) * 1000)
+
+    def as_dict(self, extra: Optional[Dict] = None) -> Dict[str, int]:
+        """Milliseconds per stage ("<stage>_ms") plus "total_ms" since creation"""
+        timing = {f"{name}_ms": int(round(self.stages[name])) for name in STAGES if name in self.stages}
+        timing.update(extra or {})
+        timing["total_ms"] = self.elapsed_ms()
+        return timing
+
+
+# Upper bounds (ms) of the latency histogram buckets; slower samples go to "+Inf"
+HISTOGRAM_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+def histogram_bucket(value: float) -> str:
+    """Key of the HISTOGRAM_BUCKETS_MS bucket a value falls in ("<=bound" or "+Inf")"""
+    for bound in HISTOGRAM_BUCKETS_MS:
+        if value <= bound:
+            return f"<={bound}"
+    return "+Inf"
+
+
+def histogram_percentile(counts: Dict[str, int], fraction: float) -> Optional[float]:
+    """Estimate a percentile from histogram() counts (None without values)
+
+    Interpolates linearly inside the bucket holding the nearest rank, like
+    Prometheus' histogram_quantile; ranks in "+Inf" get the largest bound.
+    """
+    total = sum(counts.values())
+    if not total:
+        return None
+    rank = max(1, math.ceil(fraction * total))
+    seen = 0
+    lower = 0
+    for bound in HISTOGRAM_BUCKETS_MS:
+        count = counts.get(f"<={bound}", 0)
+        if seen + count >= rank:
+            return round(lower + (bound - lower) * (rank - seen) / count, 1)
+        seen += count
+        lower = bound
+    return float(HISTOGRAM_BUCKETS_MS[-1])
+
+
+def histogram(values: List[float]) -> Dict[str, int]:
+    """Count values per HISTOGRAM_BUCKETS_MS bucket ("<=bound" keys, plus "+Inf")"""
+    counts = {f"<={bound}": 0 for bound in HISTOGRAM_BUCKETS_MS}
+    counts["+Inf"] = 0
+    for value in values:
+        counts[histogram_bucket(value)] += 1
+    return counts
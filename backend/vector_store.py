@@ -2,9 +2,22 @@
 # Patch SQLite antes de importar chromadb
 import sqlite_patch
 import chromadb
-from typing import List, Dict, Optional
-import json
+from typing import List, Dict, Optional, Iterable, Tuple
+import re
+import threading
+import time
+import calendar
+from datetime import datetime, timezone
 from config import settings
+from chunking import chunk_text, merge_chunk_texts
+from cache import TTLCache
+from embeddings import BatchEmbedder, DEFAULT_EMBEDDING_MODEL_ID, get_embedding_provider
+from lexical_index import get_lexical_index
+from timing import StageTimer
+from metrics import metrics
+from database import SessionLocal, get_active_collection, set_active_collection, bump_corpus_version
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import os
 
 # Check ChromaDB version to use appropriate API
@@ -15,6 +28,88 @@ try:
 except (ImportError, AttributeError):
     CHROMADB_NEW_API = False
 
+# Per-chunk metadata keys, stripped when hits are collapsed back to entries
+CHUNK_METADATA_KEYS = ("chunk_index", "chunk_count", "start_offset", "end_offset", "heading")
+
+
+# Live collection when no rebuild has ever switched the active collection;
+# rebuilt collections are named "<this>_<timestamp>"
+DEFAULT_COLLECTION_NAME = "knowledge_base"
+
+
+# Runs the lexical half of hybrid searches concurrently with ChromaDB
+_search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical-search")
+
+
+# Chunk metadata fields searches can be narrowed by (values stored as strings)
+FILTER_FIELDS = ("source", "locale", "section_id")
+
+
+def hnsw_metadata(
+    m: Optional[int] = None,
+    construction_ef: Optional[int] = None,
+    search_ef: Optional[int] = None
+) -> Dict:
+    """ChromaDB collection metadata for cosine HNSW with the given (or configured) parameters"""
+    return {
+        "hnsw:space": "cosine",
+        "hnsw:M": m or settings.hnsw_m,
+        "hnsw:construction_ef": construction_ef or settings.hnsw_construction_ef,
+        "hnsw:search_ef": search_ef or settings.hnsw_search_ef
+    }
+
+
+# Collection metadata keys holding HNSW parameters
+HNSW_METADATA_KEYS = ("hnsw:M", "hnsw:construction_ef", "hnsw:search_ef")
+
+
+def to_timestamp(value) -> Optional[int]:
+    """Epoch seconds (UTC) of a datetime, ISO-8601 string or number"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return calendar.timegm(value.timetuple())
+
+
+def build_where(filters: Optional[Dict]) -> Optional[Dict]:
+    """Translate search filters into a ChromaDB where clause
+    
+    Supported keys: source, locale and section_id (a value or a list of
+    values) and updated_since (datetime, ISO string or epoch seconds).
+    """
+    if not filters:
+        return None
+    
+    clauses = []
+    for field in FILTER_FIELDS:
+        value = filters.get(field)
+        if value is None or value == "" or value == []:
+            continue
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        values = [str(item).strip().lower() if field == "locale" else str(item).strip() for item in values]
+        clauses.append({field: values[0]} if len(values) == 1 else {field: {"$in": values}})
+    
+    updated_since = to_timestamp(filters.get("updated_since"))
+    if updated_since is not None:
+        clauses.append({"updated_ts": {"$gte": updated_since}})
+    
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for embedding and cache lookups (case and whitespace)"""
+    return re.sub(r'\s+', ' ', query or "").strip().lower()
+
 
 class VectorStore:
     """Vector store wrapper for ChromaDB"""
@@ -32,11 +127,201 @@ class VectorStore:
             )
         )
         
-        self.collection = self.client.get_or_create_collection(
-            name="knowledge_base",
-            metadata={"hnsw:space": "cosine"}
+        # Documents and queries are embedded by the configured provider; the
+        # collection records its model so a mismatch is detected at startup
+        self.embedding_provider = get_embedding_provider()
+        self.embedding_function = self.embedding_provider
+        
+        # Searches follow the active collection pointer in SQLite, so a
+        # rebuild finished by any process is picked up by every worker
+        self._collection_lock = threading.Lock()
+        self._collection = None
+        self.collection_name = None
+        self._pointer_checked_at = 0.0
+        self._use_collection(self._read_active_collection_name())
+        
+        self.query_embedding_cache = TTLCache(
+            max_size=settings.query_embedding_cache_size,
+            ttl_seconds=settings.query_embedding_cache_ttl_seconds
         )
     
+    def _read_active_collection_name(self) -> str:
+        try:
+            name, _ = get_active_collection()
+        except Exception:
+            name = None  # Table not created yet (init_db not run)
+        return name or DEFAULT_COLLECTION_NAME
+    
+    def _open_collection(self, name: str, create: bool = True):
+        if not create:
+            return self.client.get_collection(name=name, embedding_function=self.embedding_function)
+        try:
+            return self.client.get_or_create_collection(
+                name=name,
+                metadata=self._collection_metadata(),
+                embedding_function=self.embedding_function
+            )
+        except (TypeError, AttributeError):
+            # Old API doesn't support metadata in get_or_create_collection
+            return self.client.get_or_create_collection(
+                name=name,
+                embedding_function=self.embedding_function
+            )
+    
+    def _use_collection(self, name: str):
+        with self._collection_lock:
+            self._collection = self._open_collection(name)
+            self.collection_name = name
+            self.collection_embedding_model = self._check_embedding_model()
+    
+    @property
+    def collection(self):
+        """Active collection, re-resolved from the pointer at most every few seconds"""
+        now = time.monotonic()
+        if now - self._pointer_checked_at >= settings.collection_pointer_check_seconds:
+            self._pointer_checked_at = now
+            name = self._read_active_collection_name()
+            if name != self.collection_name:
+                print(f"ℹ Switching vector store collection: {self.collection_name} -> {name}")
+                self._use_collection(name)
+        return self._collection
+    
+    def get_collection(self, name: Optional[str] = None):
+        """Get a collection by name (the active one if None)"""
+        if name is None or name == self.collection_name:
+            return self.collection
+        return self._open_collection(name, create=False)
+    
+    def create_shadow_collection(self) -> str:
+        """Create an empty collection to rebuild into while the active one serves"""
+        name = f"{DEFAULT_COLLECTION_NAME}_{datetime.utcnow():%Y%m%d%H%M%S}"
+        self._open_collection(name)
+        return name
+    
+    def drop_collection(self, name: str):
+        """Delete an abandoned shadow collection (never the active or rollback one)"""
+        current, previous = get_active_collection()
+        if name in (current or DEFAULT_COLLECTION_NAME, previous):
+            return
+        try:
+            self.client.delete_collection(name=name)
+        except Exception:
+            pass  # Already gone
+    
+    def activate_collection(self, name: str) -> Dict:
+        """Atomically point every worker at another collection
+        
+        The replaced collection is kept for rollback; the one kept for
+        rollback before it is deleted.
+        """
+        self._open_collection(name, create=False)  # Must exist
+        current, previous = get_active_collection()
+        current = current or DEFAULT_COLLECTION_NAME
+        if name == current:
+            return {"active": current, "previous": previous}
+        
+        db = SessionLocal()
+        try:
+            set_active_collection(db, name, current)
+            # Answers cached against the old collection must not be reused
+            bump_corpus_version(db)
+        finally:
+            db.close()
+        
+        self._use_collection(name)
+        self._pointer_checked_at = time.monotonic()
+        
+        if previous and previous not in (name, current):
+            try:
+                self.client.delete_collection(name=previous)
+            except Exception as e:
+                print(f"⚠ Could not delete old collection {previous}: {e}")
+        
+        return {"active": name, "previous": current}
+    
+    def rollback_collection(self) -> Dict:
+        """Switch back to the collection that was active before the last swap"""
+        _, previous = get_active_collection()
+        if not previous:
+            raise ValueError("No previous collection to roll back to")
+        try:
+            self._open_collection(previous, create=False)
+        except Exception:
+            raise ValueError(f"Previous collection {previous} no longer exists")
+        return self.activate_collection(previous)
+    
+    def get_collection_info(self) -> Dict:
+        """Get the active and rollback collection names"""
+        current, previous = get_active_collection()
+        return {
+            "active": current or DEFAULT_COLLECTION_NAME,
+            "previous": previous,
+            "count": self.collection.count(),
+            "hnsw": self.get_hnsw_info()
+        }
+    
+    def _collection_metadata(self) -> Dict:
+        return dict(hnsw_metadata(), embedding_model=self.embedding_provider.model_id)
+    
+    def get_hnsw_info(self) -> Dict:
+        """Get the active collection's HNSW parameters and the configured ones
+        
+        Collections keep the parameters they were created with; "pending" is
+        True when a rebuild (reindex --reset) would apply different ones.
+        """
+        metadata = self.collection.metadata or {}
+        configured = hnsw_metadata()
+        # Collections created before the parameters were configurable use ChromaDB's defaults
+        defaults = {"hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 10}
+        current = {key: metadata.get(key, defaults[key]) for key in HNSW_METADATA_KEYS}
+        return {
+            "current": {key.split(":", 1)[1]: value for key, value in current.items()},
+            "configured": {key.split(":", 1)[1]: configured[key] for key in HNSW_METADATA_KEYS},
+            "pending": any(current[key] != configured[key] for key in HNSW_METADATA_KEYS)
+        }
+    
+    def _check_embedding_model(self) -> str:
+        """Compare the collection's recorded embedding model with the configured one
+        
+        Returns the collection's model id. Collections from before the model
+        was recorded get it stamped when empty or built with the default model.
+        """
+        metadata = dict(self._collection.metadata or {})
+        stored = metadata.get("embedding_model")
+        expected = self.embedding_provider.model_id
+        
+        if stored is None:
+            if self._collection.count() == 0 or expected == DEFAULT_EMBEDDING_MODEL_ID:
+                try:
+                    # Only the model is stamped: HNSW parameters of an existing index cannot change
+                    metadata.setdefault("hnsw:space", "cosine")
+                    metadata["embedding_model"] = expected
+                    self._collection.modify(metadata=metadata)
+                except Exception as e:
+                    print(f"⚠ Could not record embedding model in collection metadata: {e}")
+                return expected
+            stored = DEFAULT_EMBEDDING_MODEL_ID
+        
+        if stored != expected:
+            print(
+                f"⚠ Embedding model mismatch: collection was built with '{stored}' but "
+                f"'{expected}' is configured. Search results will be wrong until a full reindex."
+            )
+        return stored
+    
+    @property
+    def embedding_model_mismatch(self) -> bool:
+        return self.collection_embedding_model != self.embedding_provider.model_id
+    
+    def get_embedding_info(self) -> Dict:
+        """Get the configured and indexed embedding models"""
+        return {
+            "provider": self.embedding_provider.name,
+            "model": self.embedding_provider.model_id,
+            "collection_model": self.collection_embedding_model,
+            "mismatch": self.embedding_model_mismatch
+        }
+    
     def add_documents(
         self, 
         documents: List[str], 
@@ -71,25 +356,385 @@ class VectorStore:
         except Exception:
             pass  # Document might not exist
     
-    def search(self, query: str, n_results: int = 5) -> List[Dict]:
-        """Search for similar documents"""
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
+    def _build_chunks(self, entry_id: int, content: str, metadata: Optional[Dict] = None) -> Tuple[List[str], List[str], List[Dict]]:
+        """Chunk an entry into parallel lists of ids, documents and metadatas"""
+        chunks = chunk_text(content)
+        
+        ids = []
+        documents = []
+        metadatas = []
+        for chunk in chunks:
+            chunk_metadata = dict(metadata or {})
+            chunk_metadata.update({
+                "entry_id": entry_id,
+                "chunk_index": chunk["index"],
+                "chunk_count": len(chunks),
+                "start_offset": chunk["start"],
+                "end_offset": chunk["end"],
+                "heading": chunk["heading"]
+            })
+            ids.append(f"{entry_id}#{chunk['index']}")
+            documents.append(chunk["text"])
+            metadatas.append(chunk_metadata)
+        
+        return ids, documents, metadatas
+    
+    def index_entry(self, entry_id: int, content: str, metadata: Optional[Dict] = None) -> int:
+        """Chunk a knowledge entry and replace all of its vectors
+        
+        Returns the number of chunks indexed.
+        """
+        ids, documents, metadatas = self._build_chunks(entry_id, content, metadata)
+        
+        # Drop previous chunks (and legacy whole-document vectors) of this entry
+        self.delete_entry(entry_id)
+        
+        if not ids:
+            return 0
+        
+        self.add_documents(documents=documents, ids=ids, metadatas=metadatas)
+        return len(ids)
+    
+    def index_entries(
+        self,
+        entries: Iterable[Tuple[int, str, Optional[Dict]]],
+        batch_size: Optional[int] = None,
+        embedder: Optional[BatchEmbedder] = None,
+        collection_name: Optional[str] = None
+    ) -> Dict:
+        """Chunk and (re)index many entries with batched upserts
+        
+        Entries are grouped so every upsert carries about batch_size chunks.
+        Chunks are embedded up front by a BatchEmbedder, which spreads large
+        groups over a process pool. A failing group does not stop the others.
+        
+        Args:
+            entries: (entry_id, content, metadata) tuples
+            batch_size: Chunks per upsert call (defaults to settings)
+            embedder: BatchEmbedder to reuse across calls (long jobs keep
+                one so its process pool is only started once)
+            collection_name: Collection to write to (the active one if None),
+                e.g. a shadow collection being rebuilt
+        
+        Returns:
+            Dict with "entries" and "chunks" written and the "failed" entry ids
+        """
+        batch_size = batch_size or settings.vector_upsert_batch_size
+        result = {"entries": 0, "chunks": 0, "failed": []}
+        pending = []
+        pending_chunks = 0
+        collection = self.get_collection(collection_name)
+        
+        def write(group):
+            entry_ids = [item[0] for item in group]
+            try:
+                self.delete_entries(entry_ids, collection=collection)
+                ids = [chunk_id for item in group for chunk_id in item[1]]
+                documents = [document for item in group for document in item[2]]
+                metadatas = [chunk_metadata for item in group for chunk_metadata in item[3]]
+                embeddings = embedder.embed(documents)
+                for start in range(0, len(ids), batch_size):
+                    collection.upsert(
+                        ids=ids[start:start + batch_size],
+                        documents=documents[start:start + batch_size],
+                        metadatas=metadatas[start:start + batch_size],
+                        embeddings=embeddings[start:start + batch_size]
+                    )
+                result["entries"] += len(group)
+                result["chunks"] += len(ids)
+            except Exception as e:
+                print(f"⚠ Error indexing batch of {len(group)} entries: {e}")
+                result["failed"].extend(entry_ids)
+        
+        own_embedder = embedder is None
+        if own_embedder:
+            embedder = BatchEmbedder(self.embedding_provider)
+        
+        try:
+            for entry_id, content, metadata in entries:
+                ids, documents, metadatas = self._build_chunks(entry_id, content, metadata)
+                pending.append((entry_id, ids, documents, metadatas))
+                pending_chunks += len(ids)
+                if pending_chunks >= batch_size:
+                    write(pending)
+                    pending = []
+                    pending_chunks = 0
+            
+            if pending:
+                write(pending)
+        finally:
+            if own_embedder:
+                embedder.close()
+        
+        return result
+    
+    def prune_entries(
+        self,
+        valid_entry_ids: Iterable[int],
+        page_size: int = 5000,
+        collection_name: Optional[str] = None
+    ) -> int:
+        """Delete vectors of entries that no longer exist and legacy whole-document vectors
+        
+        Returns the number of vectors deleted.
+        """
+        collection = self.get_collection(collection_name)
+        valid = set(valid_entry_ids)
+        stale_ids = []
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            for i, chunk_id in enumerate(page["ids"]):
+                metadata = (page["metadatas"][i] if page["metadatas"] else None) or {}
+                if "entry_id" not in metadata or metadata["entry_id"] not in valid:
+                    stale_ids.append(chunk_id)
+            offset += len(page["ids"])
+        
+        for start in range(0, len(stale_ids), page_size):
+            collection.delete(ids=stale_ids[start:start + page_size])
+        return len(stale_ids)
+    
+    def delete_entry(self, entry_id: int, collection=None):
+        """Delete every chunk of a knowledge entry"""
+        if collection is None:
+            collection = self.collection
+        try:
+            collection.delete(where={"entry_id": entry_id})
+        except Exception:
+            pass  # Entry might not be indexed
+    
+    def delete_entries(self, entry_ids: List[int], collection=None):
+        """Delete every chunk of several knowledge entries in one call"""
+        if not entry_ids:
+            return
+        if collection is None:
+            collection = self.collection
+        if len(entry_ids) == 1:
+            self.delete_entry(entry_ids[0], collection=collection)
+            return
+        try:
+            collection.delete(where={"entry_id": {"$in": list(entry_ids)}})
+        except Exception:
+            # Older ChromaDB without $in support
+            for entry_id in entry_ids:
+                self.delete_entry(entry_id, collection=collection)
+    
+    def search(
+        self,
+        query: str,
+        n_results: int = 5,
+        filters: Optional[Dict] = None,
+        timer: Optional[StageTimer] = None
+    ) -> List[Dict]:
+        """Search for similar entries
+        
+        Chunks are retrieved and collapsed back to one result per entry; the
+        result's document holds the best-matching passages of that entry.
+        With hybrid search enabled, BM25 hits are fused in by reciprocal rank.
+        Filters (see build_where) are applied by ChromaDB to both rankings.
+        Embedding the query is timed as its own stage on the given timer.
+        """
+        with metrics.time("vector_search_duration_seconds"):
+            return self._search(query, n_results, filters, timer or StageTimer())
+    
+    def _search(self, query: str, n_results: int, filters: Optional[Dict], timer: StageTimer) -> List[Dict]:
+        n_chunks = n_results * max(1, settings.search_chunk_oversample)
+        where = build_where(filters)
+        with timer.stage("embedding"):
+            query_embedding = self.embed_query(query)
+        
+        # The lexical search runs in a worker thread while ChromaDB is queried
+        lexical_future = None
+        if settings.hybrid_search_enabled:
+            # Filtered-out chunks are dropped after the lexical search, so ask for more
+            lexical_n = n_chunks * 3 if where else n_chunks
+            lexical_future = _search_executor.submit(get_lexical_index().search, query, lexical_n)
+        
+        hits = self._dense_search(query_embedding, n_chunks, where)
+        
+        if lexical_future is not None:
+            try:
+                lexical_hits = lexical_future.result()
+            except Exception as e:
+                print(f"⚠ Lexical search failed, using vector results only: {e}")
+                lexical_hits = []
+            if lexical_hits:
+                hits = self._fuse_hits(hits, lexical_hits, query_embedding, n_chunks, where)
+        
+        return self._collapse_hits(hits, n_results)
+    
+    def _dense_search(self, query_embedding: List[float], n_chunks: int, where: Optional[Dict] = None) -> List[Dict]:
+        """Nearest-neighbour chunk search in ChromaDB"""
+        try:
+            if where:
+                results = self.collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=n_chunks,
+                    where=where
+                )
+            else:
+                results = self.collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=n_chunks
+                )
+        except RuntimeError as e:
+            if not where:
+                raise
+            # hnswlib can fail on very selective filters ("Cannot return the
+            # results in a contigious 2D array"); the subset is small, scan it
+            print(f"⚠ Filtered vector query failed, scanning matching chunks: {e}")
+            fetched = self.collection.get(where=where, include=["documents", "metadatas", "embeddings"])
+            hits = self._hits_from_get(fetched, query_embedding)
+            return sorted(hits, key=lambda hit: hit["distance"])[:n_chunks]
         
         if not results["documents"] or not results["documents"][0]:
             return []
         
-        formatted_results = []
+        hits = []
         for i, doc in enumerate(results["documents"][0]):
-            formatted_results.append({
+            hits.append({
                 "document": doc,
-                "metadata": results["metadatas"][0][i] if results["metadatas"] else {},
+                "metadata": (results["metadatas"][0][i] if results["metadatas"] else None) or {},
                 "distance": results["distances"][0][i] if results["distances"] else 0.0,
                 "id": results["ids"][0][i] if results["ids"] else None
             })
         
+        return hits
+    
+    @staticmethod
+    def _hits_from_get(fetched: Dict, query_embedding: List[float]) -> List[Dict]:
+        """Turn a collection.get() result with embeddings into hits with cosine distances"""
+        hits = []
+        if not fetched["ids"]:
+            return hits
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query_vector) or 1.0
+        for i, chunk_id in enumerate(fetched["ids"]):
+            vector = np.asarray(fetched["embeddings"][i], dtype=np.float32)
+            similarity = float(vector @ query_vector) / ((np.linalg.norm(vector) or 1.0) * query_norm)
+            hits.append({
+                "document": fetched["documents"][i],
+                "metadata": (fetched["metadatas"][i] if fetched["metadatas"] else None) or {},
+                "distance": 1.0 - similarity,
+                "id": chunk_id
+            })
+        return hits
+    
+    def _fuse_hits(
+        self,
+        dense_hits: List[Dict],
+        lexical_hits: List[Tuple[str, float]],
+        query_embedding: List[float],
+        n_chunks: int,
+        where: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Merge dense and BM25 rankings with reciprocal rank fusion
+        
+        Chunks BM25 found keep their lexical rank (0 is best) in "lexical_rank".
+        """
+        hits_by_id = {hit["id"]: hit for hit in dense_hits}
+        
+        # Chunks only found lexically: fetch them (through the filter, if any)
+        # and compute their real distance
+        missing = [chunk_id for chunk_id, _ in lexical_hits if chunk_id not in hits_by_id]
+        if where:
+            if missing:
+                fetched = self.collection.get(
+                    ids=missing, where=where, include=["documents", "metadatas", "embeddings"]
+                )
+                for hit in self._hits_from_get(fetched, query_embedding):
+                    hits_by_id[hit["id"]] = hit
+            # Lexical hits outside the filter must not take part in the ranking
+            lexical_hits = [(chunk_id, score) for chunk_id, score in lexical_hits if chunk_id in hits_by_id]
+        
+        k = settings.rrf_k
+        scores = {}
+        for rank, hit in enumerate(dense_hits):
+            scores[hit["id"]] = scores.get(hit["id"], 0.0) + 1.0 / (k + rank + 1)
+        for rank, (chunk_id, _) in enumerate(lexical_hits):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+        
+        lexical_ranks = {chunk_id: rank for rank, (chunk_id, _) in enumerate(lexical_hits)}
+        fused_ids = sorted(scores, key=scores.get, reverse=True)[:n_chunks]
+        
+        missing = [chunk_id for chunk_id in fused_ids if chunk_id not in hits_by_id]
+        if missing:
+            fetched = self.collection.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+            for hit in self._hits_from_get(fetched, query_embedding):
+                hits_by_id[hit["id"]] = hit
+        
+        fused = []
+        for chunk_id in fused_ids:
+            hit = hits_by_id.get(chunk_id)
+            if hit is not None:  # Lexical ids may not be indexed yet
+                fused.append(dict(
+                    hit,
+                    rrf_score=round(scores[chunk_id], 6),
+                    lexical_rank=lexical_ranks.get(chunk_id)
+                ))
+        return fused
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query, reusing cached vectors for repeated questions"""
+        key = normalize_query(query)
+        embedding = self.query_embedding_cache.get(key)
+        metrics.inc("cache_requests_total", {"cache": "query_embedding", "result": "miss" if embedding is None else "hit"})
+        if embedding is None:
+            embedding = self.embedding_provider.embed_query(key)
+            self.query_embedding_cache.set(key, embedding)
+        return embedding
+    
+    def get_cache_stats(self) -> Dict:
+        """Get hit/miss counters of the query embedding cache"""
+        return self.query_embedding_cache.stats()
+    
+    def _collapse_hits(self, hits: List[Dict], n_results: int) -> List[Dict]:
+        """Group chunk hits by entry, keeping the entries' best-first order
+        
+        An entry's lexical_rank is the best BM25 rank among its chunks (None
+        when only the vector search found it).
+        """
+        grouped = {}
+        for hit in hits:
+            key = hit["metadata"].get("entry_id", hit["id"])
+            grouped.setdefault(key, []).append(hit)
+        
+        formatted_results = []
+        for entry_hits in list(grouped.values())[:n_results]:
+            best = entry_hits[0]
+            selected = entry_hits[:max(1, settings.search_max_chunks_per_entry)]
+            
+            if all("start_offset" in hit["metadata"] for hit in selected):
+                document = merge_chunk_texts([
+                    {
+                        "text": hit["document"],
+                        "start": hit["metadata"]["start_offset"],
+                        "end": hit["metadata"]["end_offset"],
+                        "index": hit["metadata"].get("chunk_index")
+                    }
+                    for hit in selected
+                ])
+            else:
+                # Legacy whole-document vector
+                document = best["document"]
+            
+            formatted_results.append({
+                "document": document,
+                "metadata": {
+                    key: value for key, value in best["metadata"].items()
+                    if key not in CHUNK_METADATA_KEYS
+                },
+                "distance": best["distance"],
+                "lexical_rank": min(
+                    (hit["lexical_rank"] for hit in entry_hits if hit.get("lexical_rank") is not None),
+                    default=None
+                ),
+                "id": best["id"],
+                "chunk_ids": [hit["id"] for hit in selected]
+            })
+        
         return formatted_results
     
     def get_by_id(self, doc_id: str) -> Optional[Dict]:
@@ -107,18 +752,11 @@ class VectorStore:
         return None
     
     def clear_all(self):
-        """Clear all documents (use with caution)"""
-        self.client.delete_collection(name="knowledge_base")
-        try:
-            self.collection = self.client.get_or_create_collection(
-                name="knowledge_base",
-                metadata={"hnsw:space": "cosine"}
-            )
-        except (TypeError, AttributeError):
-            # Old API doesn't support metadata in get_or_create_collection
-            self.collection = self.client.get_or_create_collection(
-                name="knowledge_base"
-            )
+        """Clear all documents (use with caution)
+        
+        Switches to a new empty collection; the old one is kept for rollback.
+        """
+        self.activate_collection(self.create_shadow_collection())
 
 
 # Global vector store instance (lazy initialization)
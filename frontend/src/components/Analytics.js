@@ -12,6 +12,7 @@ const Analytics = () => {
   const [peakHours, setPeakHours] = useState([]);
   const [documentSources, setDocumentSources] = useState([]);
   const [unusedDocuments, setUnusedDocuments] = useState([]);
+  const [unusedTotal, setUnusedTotal] = useState(0);
   const [selectedDays, setSelectedDays] = useState(30);
   const [activeTab, setActiveTab] = useState('overview');
 
@@ -22,25 +23,17 @@ const Analytics = () => {
   const fetchAllData = async () => {
     setLoading(true);
     try {
-      const [overviewRes, questionsByDayRes, topQuestionsRes, topDocumentsRes, topUsersRes, peakHoursRes, sourcesRes, unusedRes] = await Promise.all([
-        axios.get(`/api/analytics/overview?days=${selectedDays}`),
-        axios.get(`/api/analytics/questions-by-day?days=7`),
-        axios.get(`/api/analytics/top-questions?days=${selectedDays}&limit=10`),
-        axios.get(`/api/analytics/top-documents?limit=10`),
-        axios.get(`/api/analytics/top-users?days=${selectedDays}&limit=10`),
-        axios.get(`/api/analytics/peak-hours?days=${selectedDays}`),
-        axios.get(`/api/analytics/document-sources`),
-        axios.get(`/api/analytics/unused-documents`)
-      ]);
+      const { data } = await axios.get(`/api/analytics/dashboard?days=${selectedDays}&limit=10`);
 
-      setOverview(overviewRes.data);
-      setQuestionsByDay(questionsByDayRes.data);
-      setTopQuestions(topQuestionsRes.data);
-      setTopDocuments(topDocumentsRes.data);
-      setTopUsers(topUsersRes.data);
-      setPeakHours(peakHoursRes.data);
-      setDocumentSources(sourcesRes.data);
-      setUnusedDocuments(unusedRes.data);
+      setOverview(data.overview);
+      setQuestionsByDay(data.questions_by_day);
+      setTopQuestions(data.top_questions);
+      setTopDocuments(data.top_documents);
+      setTopUsers(data.top_users);
+      setPeakHours(data.peak_hours);
+      setDocumentSources(data.document_sources);
+      setUnusedDocuments(data.unused_documents.items);
+      setUnusedTotal(data.unused_documents.total);
     } catch (error) {
       console.error('Error fetching analytics:', error);
     } finally {
@@ -314,7 +307,7 @@ const Analytics = () => {
               <div className="unused-documents-list">
                 {unusedDocuments.length > 0 ? (
                   <>
-                    <p className="unused-count">Total: {unusedDocuments.length} documentos</p>
+                    <p className="unused-count">Total: {unusedTotal} documentos</p>
                     <div className="documents-list">
                       {unusedDocuments.slice(0, 10).map((doc) => (
                         <div key={doc.id} className="document-item unused">
@@ -330,8 +323,8 @@ const Analytics = () => {
                         </div>
                       ))}
                     </div>
-                    {unusedDocuments.length > 10 && (
-                      <p className="more-items">... y {unusedDocuments.length - 10} más</p>
+                    {unusedTotal > 10 && (
+                      <p className="more-items">... y {unusedTotal - 10} más</p>
                     )}
                   </>
                 ) : (
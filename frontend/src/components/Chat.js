@@ -97,6 +97,82 @@ const Chat = () => {
     inputRef.current?.focus();
   }, []);
 
+  // Read the answer from /api/chat/stream (server-sent events) so text shows
+  // up as Gemini generates it; fall back to the blocking endpoint if needed
+  const streamChat = async (text) => {
+    let response;
+    try {
+      response = await fetch('/api/chat/stream', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          Authorization: axios.defaults.headers.common['Authorization'] || '',
+        },
+        body: JSON.stringify({ message: text }),
+      });
+    } catch (networkError) {
+      response = null;
+    }
+
+    if (!response || !response.ok || !response.body) {
+      const fallback = await axios.post('/api/chat', { message: text });
+      setMessages((prev) => [
+        ...prev,
+        {
+          role: 'assistant',
+          content: fallback.data.response,
+          sources: fallback.data.sources || [],
+          contextCount: fallback.data.context_count || 0,
+        },
+      ]);
+      return;
+    }
+
+    const botId = `bot-${Date.now()}`;
+    const updateBot = (changes) => {
+      setMessages((prev) => {
+        if (!prev.some((m) => m.id === botId)) {
+          const empty = { id: botId, role: 'assistant', content: '', sources: [], contextCount: 0 };
+          return [...prev, { ...empty, ...changes(empty) }];
+        }
+        return prev.map((m) => (m.id === botId ? { ...m, ...changes(m) } : m));
+      });
+    };
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+
+      for (const rawEvent of events) {
+        const eventLine = rawEvent.split('\n').find((line) => line.startsWith('event: '));
+        const dataLine = rawEvent.split('\n').find((line) => line.startsWith('data: '));
+        if (!eventLine || !dataLine) continue;
+
+        const event = eventLine.slice(7);
+        const data = JSON.parse(dataLine.slice(6));
+
+        if (event === 'sources') {
+          setLoading(false);
+          updateBot(() => ({ sources: data.sources || [], contextCount: data.context_count || 0 }));
+        } else if (event === 'token') {
+          updateBot((current) => ({ content: current.content + data.text }));
+        } else if (event === 'done') {
+          updateBot(() => ({ content: data.response }));
+        } else if (event === 'error') {
+          throw new Error(data.detail);
+        }
+      }
+    }
+  };
+
   const handleSend = async (e) => {
     e.preventDefault();
     
@@ -114,18 +190,7 @@ const Chat = () => {
     }, 10);
 
     try {
-      const response = await axios.post('/api/chat', {
-        message: input,
-      });
-
-      const botMessage = {
-        role: 'assistant',
-        content: response.data.response,
-        sources: response.data.sources || [],
-        contextCount: response.data.context_count || 0,
-      };
-
-      setMessages((prev) => [...prev, botMessage]);
+      await streamChat(input);
     } catch (error) {
       const errorMessage = {
         role: 'assistant',
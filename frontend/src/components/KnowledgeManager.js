@@ -78,7 +78,7 @@ const KnowledgeManager = () => {
       const response = await axios.post('/api/knowledge/sync/zendesk');
       setMessage({
         type: 'success',
-        text: `Sincronización completada: ${response.data.added} añadidos, ${response.data.updated} actualizados`,
+        text: `Sincronización completada: ${response.data.added} añadidos, ${response.data.updated} actualizados, ${response.data.unchanged || 0} sin cambios`,
       });
       fetchEntries();
       fetchSources(); // Refresh sources list